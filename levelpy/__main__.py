@@ -0,0 +1,176 @@
+#
+# levelpy/__main__.py
+#
+"""
+Command line tools for levelpy databases.
+
+    python -m levelpy import DB FILE --key FIELD [options]
+    python -m levelpy dump DB FILE [options]
+    python -m levelpy restore DB FILE [options]
+    python -m levelpy serve DB --socket PATH [options]
+"""
+
+import os
+import sys
+import argparse
+
+from .leveldb import LevelDB
+
+
+def open_db(args):
+    """
+    Returns the LevelDB named by the command line arguments, and the sublevel
+    of it (or the LevelDB itself) holding the data.
+    """
+    db = LevelDB(args.db,
+                 args.backend,
+                 value_encoding=args.value_encoding,
+                 create_if_missing=args.create,
+                 profile=args.profile)
+    if args.sublevel:
+        return db, db.sublevel(args.sublevel)
+    return db, db
+
+
+def import_command(args):
+    from .io.importer import IMPORTERS
+
+    fmt = args.format
+    if fmt is None:
+        fmt = os.path.splitext(args.file)[1].lstrip('.') or 'jsonl'
+        fmt = {'json': 'jsonl', 'ndjson': 'jsonl', 'mp': 'msgpack'}.get(fmt,
+                                                                        fmt)
+    if fmt not in IMPORTERS:
+        raise SystemExit("Unknown input format %r" % fmt)
+
+    def progress(stats):
+        if not args.quiet:
+            print("\r%s" % stats, end='', file=sys.stderr, flush=True)
+
+    db, target = open_db(args)
+    stats = IMPORTERS[fmt](target,
+                           args.file,
+                           args.key,
+                           processes=args.processes,
+                           chunk_size=args.chunk_size,
+                           batch_size=args.batch_size,
+                           presort=args.presort,
+                           progress=progress)
+    db.finish_load()
+    if not args.quiet:
+        print("\r%s" % stats, file=sys.stderr)
+
+
+def dump_command(args):
+    db, target = open_db(args)
+    compress = None if args.compress == 'none' else args.compress
+    with _binary_file(args.file, 'wb') as fileobj:
+        count = target.dump(fileobj, compress=compress)
+    print("dumped %d records" % count, file=sys.stderr)
+
+
+def restore_command(args):
+    db = LevelDB(args.db,
+                 args.backend,
+                 create_if_missing=args.create,
+                 profile=args.profile)
+    with _binary_file(args.file, 'rb') as fileobj:
+        count = db.restore(fileobj)
+    print("restored %d records" % count, file=sys.stderr)
+
+
+def serve_command(args):
+    from .server import serve
+    db = LevelDB(args.db,
+                 args.backend,
+                 create_if_missing=args.create,
+                 profile=args.profile)
+    print("serving %s on %s" % (args.db, args.socket), file=sys.stderr)
+    try:
+        serve(db, args.socket, args.chunk_size)
+    except KeyboardInterrupt:
+        pass
+
+
+def _binary_file(path, mode):
+    if path == '-':
+        stream = sys.stdout if 'w' in mode else sys.stdin
+        return open(stream.fileno(), mode, closefd=False)
+    return open(path, mode)
+
+
+def add_db_arguments(parser):
+    parser.add_argument('db', help="path to the database directory")
+    parser.add_argument('--backend', default='leveldb.LevelDB',
+                        help="full class name of the leveldb backend")
+    parser.add_argument('--sublevel', help="sublevel holding the data")
+    parser.add_argument('--value-encoding', default='json',
+                        help="Serializer codec of the values")
+    parser.add_argument('--create', action='store_true',
+                        help="create the database if it does not exist")
+    parser.add_argument('--profile', choices=sorted(LevelDB.profiles),
+                        help="open options profile")
+
+
+def make_parser():
+    description = __doc__.strip().split('\n')[0]
+    parser = argparse.ArgumentParser(prog='python -m levelpy',
+                                     description=description)
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    imp = commands.add_parser('import', help="bulk import a jsonl/csv/msgpack"
+                                             " file")
+    add_db_arguments(imp)
+    imp.add_argument('file', help="file to import ('-' for standard input)")
+    imp.add_argument('--key', required=True,
+                     help="name of the record field holding the key")
+    imp.add_argument('--format', choices=['jsonl', 'csv', 'msgpack'],
+                     help="input format (default: from the file extension)")
+    imp.add_argument('--processes', type=int, default=os.cpu_count(),
+                     help="number of encoding processes (0 to encode in"
+                          " this process)")
+    imp.add_argument('--chunk-size', type=int, default=1000,
+                     help="records encoded per task")
+    imp.add_argument('--batch-size', type=int, default=10000,
+                     help="records written per WriteBatch")
+    imp.add_argument('--presort', action='store_true',
+                     help="sort each batch by key before writing")
+    imp.add_argument('--quiet', action='store_true',
+                     help="do not report progress")
+    imp.set_defaults(run=import_command)
+
+    dmp = commands.add_parser('dump', help="dump a snapshot of the database"
+                                           " (or a sublevel) to a file")
+    add_db_arguments(dmp)
+    dmp.add_argument('file', help="output file ('-' for standard output)")
+    dmp.add_argument('--compress', default='zstd',
+                     choices=['zstd', 'zlib', 'none'],
+                     help="frame compression")
+    dmp.set_defaults(run=dump_command)
+
+    rst = commands.add_parser('restore', help="load a dump into the"
+                                              " database")
+    add_db_arguments(rst)
+    rst.add_argument('file', help="dump file ('-' for standard input)")
+    rst.set_defaults(run=restore_command)
+
+    srv = commands.add_parser('serve', help="serve the database to local"
+                                            " processes")
+    add_db_arguments(srv)
+    srv.add_argument('--socket', required=True,
+                     help="path of the Unix domain socket")
+    srv.add_argument('--chunk-size', type=int, default=1000,
+                     help="maximum number of items per range chunk")
+    srv.set_defaults(run=serve_command)
+
+    return parser
+
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    args.run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+#
+# levelpy/accessor_cache.py
+#
+"""
+Interning of the sublevels and views of a database: with a cache enabled
+(LevelDB.cache_accessors), asking again for the same sublevel or view
+returns the same object instead of building a new one.
+"""
+
+import threading
+import weakref
+from collections import OrderedDict
+
+
+class AccessorCache:
+    """
+    Sublevels and views by (class, prefix, delimiter, encoding). Accessors
+    stay cached while referenced elsewhere; of the others, only the maxsize
+    most recently requested are kept alive.
+    """
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._accessors = weakref.WeakValueDictionary()
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._accessors)
+
+    def get(self, cls, db, prefix, delim, value_encoding):
+        """
+        Returns the cached accessor, or a new cls(db, prefix, delim,
+        value_encoding) sharing this cache. Accessors with an unhashable
+        encoding are not cached.
+        """
+        key = (cls, prefix, cls.byteify(delim), value_encoding)
+        try:
+            hash(key)
+        except TypeError:
+            return self._new(cls, db, prefix, delim, value_encoding)
+
+        with self._lock:
+            accessor = self._accessors.get(key)
+            if accessor is None:
+                accessor = self._new(cls, db, prefix, delim, value_encoding)
+                self._accessors[key] = accessor
+            self._recent[key] = accessor
+            self._recent.move_to_end(key)
+            while len(self._recent) > self.maxsize:
+                self._recent.popitem(last=False)
+        return accessor
+
+    def _new(self, cls, db, prefix, delim, value_encoding):
+        accessor = cls(db, prefix, delim=delim, value_encoding=value_encoding)
+        accessor._accessor_cache = self
+        return accessor
+
+    def clear(self):
+        with self._lock:
+            self._accessors.clear()
+            self._recent.clear()
@@ -0,0 +1,265 @@
+#
+# levelpy/aggregate.py
+#
+"""
+Materialized aggregates of a sublevel: counts and sums of its values,
+optionally per group, kept up to date with each write.
+
+The changes of each batch are accumulated in memory and applied to the
+aggregate once the batch is written; the totals are stored under a reserved
+prefix of the sublevel in the same batch, or - with a flush_interval - at
+most every flush_interval seconds, so frequently written groups are stored
+once per interval rather than once per write. Reads are served from memory,
+or a single Get.
+
+The lock of an aggregate is held from before the previous values of a
+batch are read until it is written, so the batches updating an aggregate
+are written one at a time, see each other's values and store their totals
+in order.
+"""
+
+import json
+import time
+import threading
+from collections import defaultdict
+from operator import itemgetter
+
+from .db_accessors import MISSING, LevelAccessor
+
+# separates the aggregate name from the group in stored keys
+_SEP = b'\x00'
+
+
+def _field_function(field):
+    if field is None or callable(field):
+        return field
+    return itemgetter(field)
+
+
+class Aggregate:
+    """
+    Aggregate 'name' of the values of sublevel.
+
+    :param kind: 'count' counts values, 'sum' sums field of each value.
+
+    :param field: Name of the value field summed, or function of a value
+        returning the number added.
+
+    :param group: Name of the value field, or function of a value, giving the
+        group the value is counted in. Without it all values are counted
+        together; values whose group is None are not counted.
+
+    :param flush_interval: Minimum number of seconds between writes of the
+        totals to the database; with 0 they are written in the batch of every
+        write. Totals not yet flushed are lost if the process exits without
+        calling flush().
+    """
+
+    # contributions of the previous value are subtracted
+    uses_previous = True
+
+    def __init__(self, sublevel, name, kind='count', field=None, group=None,
+                 flush_interval=0):
+        if kind not in ('count', 'sum'):
+            raise ValueError("Unknown aggregate kind %r" % kind)
+        if kind == 'sum' and field is None:
+            raise ValueError("Sum aggregates require a field")
+        self.sublevel = sublevel
+        self.name = name
+        self.kind = kind
+        self.field = _field_function(field)
+        self.group = _field_function(group)
+        self.flush_interval = flush_interval
+        self._prefix = sublevel.reserved_key('aggregate!' + name) + _SEP
+        self._totals = {}
+        self._dirty = set()
+        self._pending = {}
+        # (new totals, whether they are stored, time) of committed batches
+        self._staged = {}
+        # ids of the batches holding the lock
+        self._locking = set()
+        self._last_flush = time.monotonic()
+        self._lock = threading.RLock()
+
+    def _group_key(self, value):
+        if self.group is None:
+            return b''
+        group = self.group(value)
+        return None if group is None else LevelAccessor.byteify(group)
+
+    def _contribution(self, value):
+        if self.kind == 'count':
+            return 1
+        return self.field(value) or 0
+
+    def begin(self, batch):
+        """
+        Takes the lock for batch, before the previous values of its keys are
+        read; it is held until the batch is written or aborted.
+        """
+        if id(batch) not in self._locking:
+            self._lock.acquire()
+            self._locking.add(id(batch))
+
+    def _release(self, batch):
+        if id(batch) in self._locking:
+            self._locking.remove(id(batch))
+            self._lock.release()
+
+    def update(self, batch, key, old_value, new_value):
+        """
+        Accumulates the change from old_value to new_value for batch.
+        """
+        deltas = self._pending.setdefault(id(batch), defaultdict(int))
+        if old_value is not MISSING:
+            group = self._group_key(old_value)
+            if group is not None:
+                deltas[group] -= self._contribution(old_value)
+        if new_value is not MISSING:
+            group = self._group_key(new_value)
+            if group is not None:
+                deltas[group] += self._contribution(new_value)
+
+    def commit(self, batch):
+        """
+        Computes the totals changed by batch, adding them (and those not yet
+        stored) to batch if they are due to be flushed.
+        """
+        deltas = self._pending.pop(id(batch), {})
+        self.begin(batch)
+        try:
+            totals = {group: self._load(group) + delta
+                      for group, delta in deltas.items() if delta}
+            now = time.monotonic()
+            stored = (bool(self._dirty or totals)
+                      and now - self._last_flush >= self.flush_interval)
+            if stored:
+                self._put_totals(batch, self._dirty | set(totals),
+                                 {**self._totals, **totals})
+            self._staged[id(batch)] = (totals, stored, now)
+        except BaseException:
+            self._release(batch)
+            raise
+
+    def written(self, batch):
+        """
+        Applies the totals of the written batch.
+        """
+        try:
+            totals, stored, now = self._staged.pop(id(batch))
+        except KeyError:
+            self._release(batch)
+            return
+        try:
+            self._totals.update(totals)
+            if stored:
+                self._dirty = set()
+                self._last_flush = now
+            else:
+                self._dirty |= set(totals)
+        finally:
+            self._release(batch)
+
+    def abort(self, batch):
+        """
+        Discards the changes accumulated for batch.
+        """
+        self._pending.pop(id(batch), None)
+        self._staged.pop(id(batch), None)
+        self._release(batch)
+
+    def _put_totals(self, batch, groups, totals):
+        for group in groups:
+            batch.Put(self._prefix + group,
+                      json.dumps(totals[group]).encode())
+
+    def _load(self, group):
+        """
+        Returns the total of group, reading it from the database the first
+        time.
+        """
+        try:
+            return self._totals[group]
+        except KeyError:
+            pass
+        try:
+            stored = self.sublevel._reserved_get(self._prefix + group)
+            total = json.loads(bytes(stored))
+        except KeyError:
+            total = 0
+        self._totals[group] = total
+        return total
+
+    def flush(self):
+        """
+        Writes the totals not yet stored to the database.
+        """
+        with self._lock:
+            if not self._dirty:
+                return
+            batch = self.sublevel.WriteBatch()
+            self._put_totals(batch, self._dirty, self._totals)
+            self.sublevel.Write(batch)
+            self._dirty = set()
+            self._last_flush = time.monotonic()
+
+    def reset(self):
+        """
+        Forgets the totals held in memory, e.g. after the stored totals were
+        deleted.
+        """
+        with self._lock:
+            self._totals = {}
+            self._dirty = set()
+
+    def value(self, group=None):
+        """
+        Returns the total of group (of every value, if the aggregate has no
+        group function).
+        """
+        group = b'' if group is None else LevelAccessor.byteify(group)
+        with self._lock:
+            return self._load(group)
+
+    __getitem__ = value
+
+    def groups(self):
+        """
+        Returns a dict of the total of each group.
+        """
+        skip = len(self._prefix)
+        stop = self._prefix[:-1] + b'\x01'
+        with self._lock:
+            for key in self.sublevel._reserved_range(key_from=self._prefix,
+                                                     key_to=stop,
+                                                     include_value=False):
+                if key < stop:
+                    self._load(bytes(key[skip:]))
+            return {group: total for group, total in self._totals.items()
+                    if total}
+
+    def rebuild(self):
+        """
+        Recomputes the totals from every value of the sublevel, e.g. after
+        adding the aggregate to a sublevel holding data. Writes made while
+        rebuilding are not counted correctly.
+        """
+        sub = self.sublevel
+        totals = defaultdict(int)
+        for key, value in sub.items():
+            group = self._group_key(value)
+            if group is not None:
+                totals[group] += self._contribution(value)
+
+        batch = sub.WriteBatch()
+        stop = self._prefix[:-1] + b'\x01'
+        for key in sub._reserved_range(key_from=self._prefix,
+                                       key_to=stop,
+                                       include_value=False):
+            if key < stop:
+                batch.Delete(bytes(key))
+        with self._lock:
+            self._put_totals(batch, totals, totals)
+            sub.Write(batch)
+            self._totals = dict(totals)
+            self._dirty = set()
@@ -2,13 +2,141 @@
 # levelpy/batch_context.py
 #
 
+from bisect import bisect_left, bisect_right
+
 from .db_accessors import (
+    MISSING,
     LevelAccessor,
     LevelReader,
     LevelWriter,
+    write_derived,
 )
 
 
+class PendingWrites:
+    """
+    The puts and deletes of a batch context: forwarded to its WriteBatch and
+    kept in memory, so reads within the context see them. The keys are only
+    sorted when a range is read.
+    """
+
+    def __init__(self, batch):
+        self.batch = batch
+        self.values = {}
+        self._sorted = []
+
+    @property
+    def keys(self):
+        """
+        The written keys, in key order.
+        """
+        # keys are never removed, so the sorted keys are stale if fewer
+        if len(self._sorted) != len(self.values):
+            self._sorted = sorted(self.values)
+        return self._sorted
+
+    def Put(self, key, value):
+        self.batch.Put(key, value)
+        self._record(key, value)
+
+    def Delete(self, key):
+        self.batch.Delete(key)
+        self._record(key, MISSING)
+
+    def _record(self, key, value):
+        if isinstance(key, bytearray):
+            key = bytes(key)
+        self.values[key] = value
+
+    def get(self, key, get):
+        """
+        Returns the pending value of key, or get(key) if it was not written.
+        Raises KeyError if it was deleted.
+        """
+        if isinstance(key, bytearray):
+            key = bytes(key)
+        try:
+            value = self.values[key]
+        except KeyError:
+            return get(key)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def range(self, range_iter, key_from=None, key_to=None,
+              include_value=True, reverse=False):
+        """
+        Merges the pending writes from key_from to key_to (inclusive) into
+        range_iter, a RangeIter of the same range.
+        """
+        keys = self.keys
+        start = 0 if key_from is None else bisect_left(keys, key_from)
+        stop = len(keys) if key_to is None else bisect_right(keys, key_to)
+        keys = keys[start:stop]
+        if reverse:
+            keys.reverse()
+        pending = iter(keys)
+        next_key = next(pending, None)
+
+        def before(a, b):
+            return a > b if reverse else a < b
+
+        for item in range_iter:
+            key = item[0] if include_value else item
+            while next_key is not None and before(next_key, key):
+                yield from self._item(next_key, include_value)
+                next_key = next(pending, None)
+            if next_key is not None and next_key == key:
+                yield from self._item(next_key, include_value)
+                next_key = next(pending, None)
+                continue
+            yield item
+        while next_key is not None:
+            yield from self._item(next_key, include_value)
+            next_key = next(pending, None)
+
+    def _item(self, key, include_value):
+        value = self.values[key]
+        if value is MISSING:
+            return
+        yield (key, value) if include_value else key
+
+
+class OperationLog:
+    """
+    The batch of a nested batch context: its puts, deletes and updates of
+    derived objects, replayed into the enclosing batch if the nested context
+    succeeds.
+    """
+
+    PUT, DELETE, DERIVED = range(3)
+
+    def __init__(self):
+        self.ops = []
+
+    def Put(self, key, value):
+        self.ops.append((self.PUT, key, value))
+
+    def Delete(self, key):
+        self.ops.append((self.DELETE, key, None))
+
+    def update_derived(self, keys, values):
+        self.ops.append((self.DERIVED, list(keys), list(values)))
+
+    def replay(self, db):
+        """
+        Applies the operations, in order, to the batch of the accessor db.
+        """
+        batch = db.WriteBatch()
+        for op, key, value in self.ops:
+            if op == self.PUT:
+                batch.Put(key, value)
+            elif op == self.DELETE:
+                batch.Delete(key)
+            else:
+                db._update_derived(batch, key, value)
+
+
 class BatchContext:
     """
     A python wrapper around LevelDB's WriteBatch functionality.
@@ -16,50 +144,128 @@ class BatchContext:
     Using python's with statement, you can guarantee that the put and delete
     operations applied to the BatchContext will be executed together, or if
     an error occurs, not at all.
+
+    Batch contexts may be nested, like savepoints: the writes of a context
+    created within another are merged into the enclosing batch when it
+    exits, or discarded if it raised; only the outermost context writes.
     """
 
     def __init__(self, db, sync=False):
         self._db = db
-        self.batch = db.WriteBatch()
+        self.nested = isinstance(db, BatchContext.BatchDB)
+        self.batch = OperationLog() if self.nested else db.WriteBatch()
+        self.pending = PendingWrites(self.batch)
         self.write_sync = sync
+        self._batch_db = None
 
     def __enter__(self):
         """
         Copies the database, overwritting the Put and Delete methods,
         to be that of the batch object.
         """
-        db = self.BatchDB(self._db, self.batch)
+        db = self.BatchDB(self._db, self.pending)
+        self._batch_db = db
         return db
 
     def __exit__(self, exc_type, exc_value, exc_tb):
         """
         If there was no exception, write to the database.
         """
-        if exc_type is None:
-            self._db.Write(self.batch, self.write_sync)
+        # hooks may have been added to the batch accessor
+        db = self._db if self._batch_db is None else self._batch_db
+        if self.nested:
+            if exc_type is None:
+                self.batch.replay(self._db)
+        elif exc_type is None:
+            write_derived(self, db._derived, self.pending, self.write_sync)
+        else:
+            for derived in db._derived:
+                derived.abort(self.pending)
+
+    def Write(self, pending, sync=False):
+        """
+        Writes the batch of the pending writes to the database
+        """
+        self._db.Write(self.batch, sync)
 
     class BatchDB(LevelWriter, LevelReader):
         """
         Intermediate database class overloading LevelWriter's Put and Delete
-        methods with a LevelDB batch context
+        methods with a LevelDB batch context. Reads see the pending writes
+        of the context.
         """
 
+        # the derived objects of the accessor when the context was entered,
+        # and those added to this accessor
+        _derived = ()
+
         def __init__(self, db, ctx):
             LevelAccessor.__init__(self,
                                    db.prefix,
                                    db.delim,
-                                   (db.encode, db.decode))
+                                   (db.encode, db.decode,
+                                    db.encode_many, db.decode_many))
             self._db = db
             self._context = ctx
+            self._derived = db._derived
             # self.Put = self._context.Put
             # self.Delete = self._context.Delete
 
+        def _add_derived(self, derived, **names):
+            self._derived = self._derived + (derived, )
+
+        def Get(self, key):
+            return self._context.get(key, self._db.Get)
+
+        def _get_raw_many(self, keys):
+            return [self.Get(key) for key in keys]
+
+        def RangeIter(self, key_from=None, key_to=None, include_value=True,
+                      reverse=False, **kwargs):
+            range_iter = self._db.RangeIter(key_from=key_from,
+                                            key_to=key_to,
+                                            include_value=include_value,
+                                            reverse=reverse,
+                                            **kwargs)
+            return self._context.range(range_iter, key_from, key_to,
+                                       include_value, reverse)
+
         def Put(self, key, value):
             return self._context.Put(key, value)
 
         def Delete(self, key):
             return self._context.Delete(key)
 
+        def WriteBatch(self):
+            """
+            Writes made in batches go into the batch of the context
+            """
+            return self._context
+
+        def Write(self, batch, sync=False):
+            """
+            The batch of the context is written when the context exits
+            """
+
+        def _write_batch(self, batch, sync=False):
+            """
+            Derived objects are committed when the context exits
+            """
+
+        def _update_derived(self, batch, keys, values):
+            """
+            In a nested context, derived objects are updated when its writes
+            are merged into the enclosing batch. They abort the batch when
+            the context exits with an error.
+            """
+            log = self._context.batch
+            if isinstance(log, OperationLog):
+                log.update_derived(keys, values)
+            else:
+                self._add_derived_updates(batch, keys, values)
+
         def write_batch(self):
-            raise RuntimeError("Cannot create a batch context while in a"
-                               "batch context.")
+            """
+            Returns a batch context nested in this one.
+            """
+            return BatchContext(self)
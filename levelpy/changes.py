@@ -0,0 +1,289 @@
+#
+# levelpy/changes.py
+#
+"""
+Change feeds: write hooks receiving the records of each written batch, and
+a durable change log which consumers tail with cursors.
+"""
+
+import struct
+import threading
+from collections import namedtuple
+
+from .db_accessors import MISSING
+
+PUT = 'put'
+DELETE = 'delete'
+
+# a record of the change log
+Change = namedtuple('Change', ['sequence', 'op', 'key', 'value'])
+
+_OPS = {PUT: b'P', DELETE: b'D'}
+_OP_NAMES = {v[0]: k for k, v in _OPS.items()}
+_KEY_LENGTH = struct.Struct('>I')
+
+
+class ChangeRecorder:
+    """
+    Base of derived objects collecting the (op, key, value) records of each
+    batch.
+    """
+
+    uses_previous = False
+
+    def __init__(self):
+        self._pending = {}
+
+    def update(self, batch, key, old_value, new_value):
+        if new_value is MISSING:
+            record = (DELETE, key, None)
+        else:
+            record = (PUT, key, new_value)
+        self._pending.setdefault(id(batch), []).append(record)
+
+    def commit(self, batch):
+        pass
+
+    def written(self, batch):
+        pass
+
+    def abort(self, batch):
+        self._pending.pop(id(batch), None)
+
+
+class WriteHook(ChangeRecorder):
+    """
+    Calls fn with the records of each batch, before it is written if pre is
+    true, otherwise after.
+    """
+
+    notify_last = True
+
+    def __init__(self, fn, pre=False):
+        super().__init__()
+        self.fn = fn
+        self.pre = pre
+
+    def commit(self, batch):
+        if self.pre:
+            records = self._pending.pop(id(batch), None)
+            if records:
+                self.fn(records)
+
+    def written(self, batch):
+        if not self.pre:
+            records = self._pending.pop(id(batch), None)
+            if records:
+                self.fn(records)
+
+
+class Sequences:
+    """
+    The last sequence number of a change log, shared by every ChangeLog of
+    the log. The lock is held from the commit of a batch until it is written
+    (or aborted), so the changes are written in sequence order.
+    """
+
+    def __init__(self, last_sequence):
+        self.last_sequence = last_sequence
+        self.lock = threading.RLock()
+        self.written = threading.Condition()
+
+
+class ChangeLog(ChangeRecorder):
+    """
+    Stores the records of each batch written by writer in the sublevel log,
+    in the same batch, under consecutive sequence numbers (starting at 1).
+    Values are stored encoded by the writer.
+    """
+
+    # width of the zero-padded sequence numbers in log keys
+    sequence_width = 20
+
+    def __init__(self, writer, log):
+        super().__init__()
+        self.writer = writer
+        self.log = log
+        # last sequence number before each committed batch
+        self._staged = {}
+        self._last_sequence_key = log.reserved_key('last-sequence')
+        self.sequences = log._derived_registry().shared(
+            ('change-log', log._key_prefix),
+            lambda: Sequences(self._read_last_sequence()))
+
+    @property
+    def last_sequence(self):
+        return self.sequences.last_sequence
+
+    def _read_last_sequence(self):
+        # the stored number outlives trimmed records; logs written before it
+        # was stored only have their records
+        try:
+            last = int(self.log._reserved_get(self._last_sequence_key))
+        except KeyError:
+            last = 0
+        for key in self.log.RangeIter(key_from=self.log.range_begin,
+                                      key_to=self.log.range_end,
+                                      include_value=False,
+                                      reverse=True):
+            return max(last, int(self.log.strip_prefix(bytes(key))))
+        return last
+
+    def log_key(self, sequence):
+        return self.log.key_transform('%0*d' % (self.sequence_width,
+                                                 sequence))
+
+    def commit(self, batch):
+        records = self._pending.pop(id(batch), None)
+        if not records:
+            return
+        sequences = self.sequences
+        sequences.lock.acquire()
+        start = self._staged[id(batch)] = sequences.last_sequence
+        try:
+            for sequence, (op, key, value) in enumerate(records, start + 1):
+                batch.Put(self.log_key(sequence), self.pack(op, key, value))
+            batch.Put(self._last_sequence_key, b'%d' % sequence)
+        except BaseException:
+            self._staged.pop(id(batch))
+            sequences.lock.release()
+            raise
+        sequences.last_sequence = start + len(records)
+
+    def written(self, batch):
+        if self._staged.pop(id(batch), None) is not None:
+            self.sequences.lock.release()
+        with self.sequences.written:
+            self.sequences.written.notify_all()
+
+    def abort(self, batch):
+        super().abort(batch)
+        start = self._staged.pop(id(batch), None)
+        if start is not None:
+            # the numbers of the discarded batch are given out again
+            self.sequences.last_sequence = start
+            self.sequences.lock.release()
+
+    def pack(self, op, key, value):
+        """
+        Returns the bytes stored for a record: the op, the key length and
+        key, then the encoded value.
+        """
+        encoded = b'' if op == DELETE else self.writer.value_encode(value)
+        return b''.join((_OPS[op], _KEY_LENGTH.pack(len(key)), key, encoded))
+
+    def unpack(self, sequence, data):
+        """
+        Returns the Change stored as data.
+        """
+        data = bytes(data)
+        op = _OP_NAMES[data[0]]
+        end = 1 + _KEY_LENGTH.size
+        length, = _KEY_LENGTH.unpack(data[1:end])
+        key = data[end:end + length]
+        value = None
+        if op == PUT:
+            value = self.writer.value_decode(data[end + length:])
+        return Change(sequence, op, key, value)
+
+    def read(self, position=0, limit=1000):
+        """
+        Returns a list of at most limit changes with sequence numbers
+        greater than position.
+        """
+        changes = []
+        for key, value in self.log.RangeIter(
+                key_from=self.log_key(position + 1),
+                key_to=self.log.range_end,
+                include_value=True):
+            sequence = int(self.log.strip_prefix(bytes(key)))
+            changes.append(self.unpack(sequence, value))
+            if len(changes) == limit:
+                break
+        return changes
+
+    def cursor(self, position=0, name=None):
+        """
+        Returns a ChangeCursor reading changes after position. A named
+        cursor starts from the position it last saved.
+        """
+        return ChangeCursor(self, position, name)
+
+    def wait(self, timeout):
+        """
+        Waits for a batch to be written through a change log of the log, at
+        most timeout seconds.
+        """
+        with self.sequences.written:
+            self.sequences.written.wait(timeout)
+
+    def trim(self, position):
+        """
+        Deletes the changes with sequence numbers up to position.
+        """
+        batch = self.log.WriteBatch()
+        stop = self.log_key(position)
+        for key in self.log.RangeIter(key_from=self.log.range_begin,
+                                      key_to=stop,
+                                      include_value=False):
+            batch.Delete(bytes(key))
+        self.log.Write(batch)
+
+
+class ChangeCursor:
+    """
+    Position in a ChangeLog, advanced by reading changes. Iterating yields
+    the changes written so far; tail() keeps waiting for new ones.
+    """
+
+    def __init__(self, change_log, position=0, name=None):
+        self.change_log = change_log
+        self.name = name
+        self.position = position
+        if name is not None:
+            try:
+                log = change_log.log
+                self.position = int(log._reserved_get(self._state_key))
+            except KeyError:
+                pass
+
+    @property
+    def _state_key(self):
+        return self.change_log.log.reserved_key('cursor!' + self.name)
+
+    def read(self, limit=1000):
+        """
+        Returns the next (at most limit) changes, advancing the cursor.
+        """
+        changes = self.change_log.read(self.position, limit)
+        if changes:
+            self.position = changes[-1].sequence
+        return changes
+
+    def save(self):
+        """
+        Stores the position of a named cursor.
+        """
+        if self.name is None:
+            raise ValueError("Only named cursors may be saved")
+        self.change_log.log.Put(self._state_key, b'%d' % self.position)
+
+    def __iter__(self):
+        while True:
+            changes = self.read()
+            if not changes:
+                return
+            yield from changes
+
+    def tail(self, poll_interval=1.0, stop=None):
+        """
+        Yields changes as they are written, waking up when a batch is
+        written through the change log or every poll_interval seconds (for
+        writes made elsewhere), until the function stop returns true.
+        """
+        while stop is None or not stop():
+            changes = self.read()
+            if changes:
+                yield from changes
+            else:
+                self.change_log.wait(poll_interval)
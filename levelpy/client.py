@@ -0,0 +1,266 @@
+#
+# levelpy/client.py
+#
+"""
+Client of levelpy.server: RemoteLevelDB is a LevelDB whose backend sends
+raw reads and writes to the server owning the database, so sublevels, views
+and iteration work as they do locally while several processes share it.
+"""
+
+import socket
+import threading
+from collections import deque
+from contextlib import contextmanager
+from itertools import count
+
+from . import protocol
+from .iterviews import chunked
+from .leveldb import LevelDB
+
+
+class RemoteError(Exception):
+    """
+    An error raised by the server handling a request.
+    """
+
+
+class Connection:
+    """
+    A connection to the server. Requests may be pipelined: sent ahead of
+    their responses, which are read in order.
+    """
+
+    # bytes of requests sent ahead of the responses read, so that requests
+    # fit in the socket buffers while the server blocks writing responses
+    max_pending = 65536
+
+    def __init__(self, socket_path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(socket_path)
+        self.rfile = self.sock.makefile('rb')
+        self._ids = count(1)
+
+    def close(self):
+        self.rfile.close()
+        self.sock.close()
+
+    def pipeline(self, requests):
+        """
+        Sends the (op, fields) requests and returns the list of their
+        (status, fields) responses. Up to max_pending bytes of requests are
+        sent before reading the responses of the first ones.
+        """
+        responses = []
+        pending = deque()
+        pending_size = 0
+        unsent = []
+        for op, fields in requests:
+            request_id = next(self._ids) & 0xffffffff
+            frame = protocol.pack_frame(request_id, op, fields)
+            while pending and pending_size + len(frame) > self.max_pending:
+                if unsent:
+                    self.sock.sendall(b''.join(unsent))
+                    unsent = []
+                sent_id, size = pending.popleft()
+                responses.append(self._receive(sent_id))
+                pending_size -= size
+            unsent.append(frame)
+            pending.append((request_id, len(frame)))
+            pending_size += len(frame)
+        if unsent:
+            self.sock.sendall(b''.join(unsent))
+        responses.extend(self._receive(sent_id) for sent_id, _ in pending)
+        return responses
+
+    def call(self, op, *fields):
+        """
+        Sends a request, returning the fields of its response; raises
+        KeyError or RemoteError if it failed.
+        """
+        status, fields = self.pipeline([(op, fields)])[0]
+        return check(status, fields)
+
+    def _receive(self, request_id):
+        frame = protocol.read_frame(self.rfile)
+        if frame is None:
+            raise ConnectionError("levelpy server closed the connection")
+        response_id, status, fields = frame
+        if response_id != request_id:
+            raise ConnectionError("Response %d to request %d"
+                                  % (response_id, request_id))
+        return status, fields
+
+
+def check(status, fields):
+    if status == protocol.NOT_FOUND:
+        raise KeyError
+    if status == protocol.ERROR:
+        raise RemoteError(fields[0].decode())
+    return fields
+
+
+class RemoteWriteBatch:
+    """
+    Collects the puts and deletes of a batch, sent in one request by
+    RemoteBackend.Write.
+    """
+
+    def __init__(self):
+        self.ops = []
+
+    def Put(self, key, value):
+        self.ops.extend((protocol.BATCH_PUT, key, value))
+
+    def Delete(self, key):
+        self.ops.extend((protocol.BATCH_DELETE, key, None))
+
+
+class RemoteBackend:
+    """
+    Backend with the interface of py-leveldb's LevelDB, forwarding each call
+    to the server at socket_path through a pool of up to pool_size idle
+    connections (more are opened while every pooled one is busy).
+    """
+
+    def __init__(self, socket_path, pool_size=8, chunk_size=1000):
+        self.socket_path = socket_path
+        self.pool_size = pool_size
+        self.chunk_size = chunk_size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrows a connection from the pool; connections are discarded if an
+        error (other than a missing key, or the close of a generator between
+        requests) interrupts their use.
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        if conn is None:
+            conn = Connection(self.socket_path)
+        try:
+            yield conn
+        except (KeyError, RemoteError, GeneratorExit):
+            self._release(conn)
+            raise
+        except BaseException:
+            conn.close()
+            raise
+        self._release(conn)
+
+    def _release(self, conn):
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """
+        Closes the idle connections.
+        """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def call(self, op, *fields):
+        with self.connection() as conn:
+            return conn.call(op, *fields)
+
+    def Get(self, key, **kwargs):
+        return self.call(protocol.GET, key)[0]
+
+    def Put(self, key, value, sync=False):
+        self.call(protocol.PUT, key, value, b'1' if sync else b'0')
+
+    def Delete(self, key, sync=False):
+        self.call(protocol.DELETE, key, b'1' if sync else b'0')
+
+    def GetMany(self, keys):
+        """
+        Returns the values of keys, requested chunk_size keys per request,
+        with all requests pipelined. Raises KeyError for a missing key.
+        """
+        requests = [(protocol.GET_MANY, chunk)
+                    for chunk in chunked(keys, self.chunk_size)]
+        with self.connection() as conn:
+            responses = conn.pipeline(requests)
+        values = []
+        for (_, keys), (status, fields) in zip(requests, responses):
+            for key, value in zip(keys, check(status, fields)):
+                if value is None:
+                    raise KeyError(key)
+                values.append(value)
+        return values
+
+    def WriteBatch(self):
+        return RemoteWriteBatch()
+
+    def Write(self, batch, sync=False):
+        self.call(protocol.WRITE, b'1' if sync else b'0', *batch.ops)
+
+    def RangeIter(self, key_from=None, key_to=None, include_value=True,
+                  reverse=False, **kwargs):
+        """
+        Iterates over the range, streamed from the server chunk_size items
+        at a time on one connection, borrowed until the range is exhausted
+        or closed.
+        """
+        with self.connection() as conn:
+            fields = conn.call(protocol.RANGE_OPEN,
+                               key_from,
+                               key_to,
+                               b'1' if include_value else b'0',
+                               b'1' if reverse else b'0',
+                               protocol.pack_int(self.chunk_size))
+            width = 2 if include_value else 1
+            cursor_id = fields[0]
+            try:
+                while True:
+                    items = fields[1:]
+                    for i in range(0, len(items), width):
+                        if include_value:
+                            yield items[i], items[i + 1]
+                        else:
+                            yield items[i]
+                    if cursor_id is None:
+                        return
+                    fields = conn.call(protocol.RANGE_NEXT, cursor_id)
+                    cursor_id = fields[0]
+            finally:
+                if cursor_id is not None:
+                    conn.call(protocol.RANGE_CLOSE, cursor_id)
+
+    def GetStats(self):
+        return self.call(protocol.STATS)[0].decode()
+
+    def CompactRange(self, start=None, stop=None):
+        self.call(protocol.COMPACT, start, stop)
+
+
+class RemoteLevelDB(LevelDB):
+    """
+    A LevelDB served by a levelpy.server at socket_path. Snapshots (and so
+    dump) are not available remotely.
+    """
+
+    def __init__(self, socket_path, value_encoding='utf-8', pool_size=8,
+                 chunk_size=1000):
+        super().__init__(RemoteBackend(socket_path, pool_size, chunk_size),
+                         value_encoding=value_encoding)
+        self.path = socket_path
+
+    def __copy__(self):
+        """
+        Copy sharing the connection pool
+        """
+        db = LevelDB.__new__(type(self))
+        LevelDB.__init__(db, self._db, value_encoding=self._get_encoding(None))
+        db.path = self.path
+        return db
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,138 @@
+#
+# levelpy/columns.py
+#
+"""
+Bulk export of a key range into NumPy columns (requires numpy, and pandas
+for DataFrames).
+
+The range is read in chunks, values are decoded with the accessor's
+decode_many function, and each chunk is appended to preallocated column
+arrays which grow geometrically and are trimmed in place at the end, so
+peak memory stays close to the size of the final columns.
+"""
+
+import numpy as np
+
+from .iterviews import chunked
+
+# named key codecs - functions applied to each key (without prefix)
+KEY_CODECS = {
+    'bytes': bytes,
+    'utf8': lambda key: key.decode('utf8'),
+    'int': int,
+}
+
+
+class Column:
+    """
+    A growable numpy array. The dtype is taken from the dtype argument or
+    inferred from the first chunk appended; later chunks which do not fit
+    the dtype (e.g. floats after ints) promote the column. Inferred string
+    columns are stored as python objects so they are never truncated.
+    """
+
+    def __init__(self, dtype=None, capacity=1024):
+        self.dtype = None if dtype is None else np.dtype(dtype)
+        self.fixed = dtype is not None
+        self.capacity = capacity
+        self.size = 0
+        self.data = None
+
+    def extend(self, values):
+        chunk = np.asarray(values, dtype=self.dtype if self.fixed else None)
+        if chunk.ndim != 1 or (chunk.dtype.kind in 'US' and not self.fixed):
+            chunk = np.fromiter(values, dtype=object, count=len(values))
+
+        if self.data is None:
+            self.dtype = chunk.dtype
+            self.data = np.empty(max(self.capacity, len(chunk)), self.dtype)
+        elif chunk.dtype != self.dtype:
+            self.dtype = np.result_type(self.dtype, chunk.dtype)
+            self.data = self.data.astype(self.dtype)
+
+        end = self.size + len(chunk)
+        if end > len(self.data):
+            self.data.resize(max(end, 2 * len(self.data)), refcheck=False)
+        self.data[self.size:end] = chunk
+        self.size = end
+
+    def finish(self):
+        """
+        Returns the column data, trimmed to its size.
+        """
+        if self.data is None:
+            return np.empty(0, self.dtype or object)
+        self.data.resize(self.size, refcheck=False)
+        return self.data
+
+
+def to_arrays(reader,
+              key_codec='bytes',
+              value_fields=None,
+              dtypes=None,
+              key_from=None,
+              key_to=None,
+              size_hint=1024,
+              chunk_size=4096):
+    """
+    Reads the key range of reader (a LevelReader) into a dict of numpy
+    arrays.
+
+    :param key_codec: Name of a function in KEY_CODECS, or a function, which
+        converts each key (bytes without the reader's prefix) to the value
+        stored in the 'key' column. If None, no key column is created.
+
+    :param value_fields: Names of fields extracted from each (dict) value
+        into a column of the same name. If None, whole values are stored in
+        a 'value' column.
+
+    :param dtypes: Mapping of column name to dtype; other column dtypes are
+        inferred from the data.
+
+    :param size_hint: Expected number of rows, used to preallocate columns.
+    """
+    key_fn = KEY_CODECS.get(key_codec, key_codec)
+    dtypes = dtypes or {}
+    names = ['value'] if value_fields is None else list(value_fields)
+    columns = {name: Column(dtypes.get(name), size_hint) for name in names}
+    if key_fn is not None:
+        key_column = Column(dtypes.get('key'), size_hint)
+
+    prefix_len = len(reader.range_begin)
+    range_iter = reader.RangeIter(key_from=reader.range_start_key(key_from),
+                                  key_to=reader.range_stop_key(key_to),
+                                  include_value=True)
+
+    for chunk in chunked(range_iter, chunk_size):
+        keys, values = zip(*chunk)
+        values = reader.decode_many(values)
+        if key_fn is not None:
+            key_column.extend([key_fn(bytes(key[prefix_len:]))
+                               for key in keys])
+        if value_fields is None:
+            columns['value'].extend(values)
+            continue
+        for name in names:
+            columns[name].extend([value.get(name) for value in values])
+
+    arrays = {}
+    if key_fn is not None:
+        arrays['key'] = key_column.finish()
+    for name in names:
+        arrays[name] = columns[name].finish()
+    return arrays
+
+
+def to_frame(reader, index='key', **kwargs):
+    """
+    Reads the key range of reader into a pandas DataFrame, using the columns
+    made by to_arrays (which receives the keyword arguments). The 'key'
+    column becomes the index unless index is None.
+    """
+    import pandas
+
+    arrays = to_arrays(reader, **kwargs)
+    frame = pandas.DataFrame(arrays, copy=False)
+    if index is not None and index in arrays:
+        frame = frame.set_index(index)
+    return frame
@@ -0,0 +1,358 @@
+#
+# levelpy/compression.py
+#
+"""
+Value compression wrapping any Serializer codec.
+
+Compressed codecs are named '<encoding>+<method>' (for example 'json+zstd')
+and may be used anywhere a value_encoding string is accepted. Every stored
+value starts with a two byte header - the MAGIC byte, then the method - so a
+sublevel may hold a mix of compressed and uncompressed values. With a text
+or msgpack encoding, it may also hold (during migration) header-less values
+written before compression was enabled, which never start with MAGIC.
+
+The zlib method is always available; zstd and lz4 require the 'zstandard'
+and 'lz4' packages. Sublevels using zstd may train a dictionary from a sample
+of their own values, which greatly improves the compression of small values.
+Dictionaries are registered process-wide by their zstd dictionary id, and
+loaded automatically by the sublevels and views using a zstd encoding; the
+codec of each database, prefix and encoding is loaded once and shared.
+"""
+
+import zlib
+import threading
+from itertools import islice
+
+from .serializer import Serializer
+
+try:
+    import zstandard
+except ImportError:                                       # pragma: no cover
+    zstandard = None
+
+try:
+    import lz4.block
+except ImportError:                                       # pragma: no cover
+    lz4 = None
+
+
+# first byte of every compressed codec value: 0xc1 is never used by msgpack
+# and never appears in utf-8 text, so it cannot start a header-less value of
+# those encodings
+MAGIC = 0xc1
+
+# method bytes, following MAGIC
+RAW = 0
+ZLIB = 1
+ZSTD = 2
+LZ4 = 3
+ZSTD_DICT = 4
+
+_MAGIC = bytes([MAGIC])
+
+# encodings whose header-less values (written before compression was
+# enabled) can be told apart from compressed ones; with any other encoding
+# every value must have a header
+LEGACY_ENCODINGS = {'json', 'stdjson', 'fastjson', 'utf8', 'utf-8', 'msgpack'}
+
+# reserved key (of the sublevel) storing a trained zstd dictionary
+DICTIONARY_KEY = b'zstd-dictionary'
+
+# trained zstd dictionaries loaded by this process, by dictionary id
+_dictionaries = {}
+
+
+def header(method):
+    """
+    Returns the header of values stored with method (RAW, ZLIB...).
+    """
+    return bytes([MAGIC, method])
+
+
+def register_dictionary(dictionary):
+    """
+    Makes the zstd dictionary (bytes) available to every compressed codec of
+    this process for decoding, returning its dictionary id.
+    """
+    dict_id = _zstd().ZstdCompressionDict(dictionary).dict_id()
+    _dictionaries[dict_id] = dictionary
+    return dict_id
+
+
+def dictionaries():
+    """
+    Returns the zstd dictionaries registered in this process.
+    """
+    return list(_dictionaries.values())
+
+
+def register_dictionaries(dictionaries):
+    for dictionary in dictionaries:
+        register_dictionary(dictionary)
+
+
+def _zstd():
+    if zstandard is None:
+        raise ImportError("zstd compression requires the zstandard package")
+    return zstandard
+
+
+def _lz4():
+    if lz4 is None:
+        raise ImportError("lz4 compression requires the lz4 package")
+    return lz4.block
+
+
+def available_methods():
+    """
+    Returns the names of the compression methods which may be used.
+    """
+    methods = ['zlib']
+    if zstandard is not None:
+        methods.append('zstd')
+    if lz4 is not None:
+        methods.append('lz4')
+    return methods
+
+
+class CompressedCodec:
+    """
+    Wraps the Serializer codec 'encoding', compressing the encoded bytes with
+    the given method ('zlib', 'zstd' or 'lz4').
+
+    Encoded values shorter than min_size are stored uncompressed, behind the
+    RAW header. Decoding accepts values written by any available method, so
+    the method of a sublevel may be changed without rewriting its values, and
+    values compressed with any registered zstd dictionary.
+
+    Zstd (de)compressor objects are not thread safe, so they are kept per
+    thread.
+    """
+
+    def __init__(self, encoding, method='zlib', level=None, min_size=32,
+                 dictionary=None):
+        if method not in ('zlib', 'zstd', 'lz4'):
+            raise ValueError("Unknown compression method %r" % method)
+        if dictionary is not None and method != 'zstd':
+            raise ValueError("Compression dictionaries require zstd")
+
+        self.encoding = encoding
+        self.method = method
+        self.level = level
+        self.min_size = min_size
+        self.dictionary = dictionary
+
+        self.base_encode_many = Serializer.encode_many[encoding]
+        self.base_decode_many = Serializer.decode_many[encoding]
+        self.base_encode = Serializer.encode[encoding]
+        self.base_decode = Serializer.decode[encoding]
+        self.legacy = encoding in LEGACY_ENCODINGS
+        self._local = threading.local()
+
+        if method == 'zlib':
+            level = -1 if level is None else level
+            self._header = header(ZLIB)
+            self._compress = lambda data: zlib.compress(data, level)
+        elif method == 'lz4':
+            self._header = header(LZ4)
+            self._compress = _lz4().compress
+        else:
+            _zstd()
+            self._header = header(ZSTD if dictionary is None else ZSTD_DICT)
+            self._compress = self._zstd_compress
+        if dictionary is not None:
+            register_dictionary(dictionary)
+
+        self._decompressors = {RAW: bytes, ZLIB: zlib.decompress}
+        if zstandard is not None:
+            self._decompressors[ZSTD] = self._zstd_decompress
+            self._decompressors[ZSTD_DICT] = self._zstd_dict_decompress
+        if lz4 is not None:
+            self._decompressors[LZ4] = lz4.block.decompress
+
+    def with_dictionary(self, dictionary):
+        """
+        Returns a copy of this (zstd) codec compressing with dictionary, the
+        bytes of a trained zstd dictionary.
+        """
+        return type(self)(self.encoding,
+                          'zstd',
+                          level=self.level,
+                          min_size=min(self.min_size, 8),
+                          dictionary=dictionary)
+
+    @property
+    def codec(self):
+        """
+        The (encode, decode, encode_many, decode_many) tuple of this codec,
+        usable as a value_encoding.
+        """
+        return self.encode, self.decode, self.encode_many, self.decode_many
+
+    def compress(self, data):
+        if len(data) < self.min_size:
+            return header(RAW) + data
+        return self._header + self._compress(data)
+
+    def decompress(self, byte_str):
+        if byte_str[:1] != _MAGIC:
+            if not self.legacy:
+                raise ValueError("Value has no compression header")
+            # a value stored before compression was enabled
+            return byte_str
+        try:
+            decompress = self._decompressors[byte_str[1]]
+        except (IndexError, KeyError):
+            raise ValueError("Unknown compression header %r" % byte_str[:2])
+        return decompress(memoryview(byte_str)[2:])
+
+    def encode(self, obj):
+        return self.compress(self.base_encode(obj))
+
+    def decode(self, byte_str):
+        return self.base_decode(self.decompress(byte_str))
+
+    def encode_many(self, objs):
+        return list(map(self.compress, self.base_encode_many(objs)))
+
+    def decode_many(self, byte_strs):
+        return self.base_decode_many(list(map(self.decompress, byte_strs)))
+
+    def _zstd_compress(self, data):
+        return self._zstd_compressor().compress(data)
+
+    def _zstd_compressor(self):
+        try:
+            return self._local.compressor
+        except AttributeError:
+            level = 3 if self.level is None else self.level
+            if self.dictionary is None:
+                compressor = zstandard.ZstdCompressor(level=level)
+            else:
+                dictionary = zstandard.ZstdCompressionDict(self.dictionary)
+                compressor = zstandard.ZstdCompressor(level=level,
+                                                      dict_data=dictionary)
+            self._local.compressor = compressor
+            return compressor
+
+    def _zstd_decompress(self, data):
+        try:
+            decompressor = self._local.decompressor
+        except AttributeError:
+            decompressor = zstandard.ZstdDecompressor()
+            self._local.decompressor = decompressor
+        return decompressor.decompress(data)
+
+    def _zstd_dict_decompress(self, data):
+        dict_id = zstandard.get_frame_parameters(data).dict_id
+        try:
+            decompressors = self._local.dict_decompressors
+        except AttributeError:
+            decompressors = self._local.dict_decompressors = {}
+        try:
+            decompressor = decompressors[dict_id]
+        except KeyError:
+            try:
+                dictionary = _dictionaries[dict_id]
+            except KeyError:
+                raise ValueError("Value was compressed with an unknown zstd"
+                                 " dictionary; load the sublevel's dictionary"
+                                 " first.") from None
+            dictionary = zstandard.ZstdCompressionDict(dictionary)
+            decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+            decompressors[dict_id] = decompressor
+        return decompressor.decompress(data)
+
+
+def register_compressed(name):
+    """
+    Registers the compressed codec 'name' ('<encoding>+<method>') with the
+    Serializer, returning the CompressedCodec.
+    """
+    encoding, _, method = name.rpartition('+')
+    if encoding not in Serializer.transform_dict:
+        if encoding not in Serializer.plugins:
+            raise KeyError(name)
+        Serializer.codec(encoding)
+    codec = CompressedCodec(encoding, method)
+    Serializer.register(name, *codec.codec)
+    return codec
+
+
+def _compressed_codec(accessor):
+    name = accessor.value_encoding_str
+    if name is None or '+' not in name:
+        raise ValueError("Sublevel does not use a compressed value_encoding")
+    encoding, _, method = name.rpartition('+')
+    if method != 'zstd':
+        raise ValueError("Compression dictionaries require zstd")
+    return CompressedCodec(encoding, method)
+
+
+def train_dictionary(accessor, sample_size=1000, dict_size=16 * 1024):
+    """
+    Trains a zstd dictionary from (at most) sample_size values of accessor,
+    stores it in the accessor's reserved dictionary key and switches the
+    accessor to compressing with it. Returns the dictionary bytes.
+    """
+    codec = _compressed_codec(accessor)
+    values = list(islice(iter(accessor.values()), sample_size))
+    samples = [bytes(data) for data in codec.base_encode_many(values)]
+    dictionary = _zstd().train_dictionary(dict_size, samples).as_bytes()
+    accessor._db.Put(accessor.reserved_key(DICTIONARY_KEY), dictionary)
+    codec = codec.with_dictionary(dictionary)
+    _dictionary_codecs(accessor)[accessor.value_encoding_str] = codec
+    _use_codec(accessor, codec)
+    return dictionary
+
+
+def load_dictionary(accessor):
+    """
+    Loads the dictionary stored by train_dictionary, if there is one, so
+    accessor can read and write dictionary compressed values. Returns
+    whether a dictionary was found.
+    """
+    codec = _compressed_codec(accessor)
+    try:
+        dictionary = accessor._db.Get(accessor.reserved_key(DICTIONARY_KEY))
+    except KeyError:
+        dictionary = None
+    if dictionary is not None:
+        codec = codec.with_dictionary(bytes(dictionary))
+    else:
+        codec = None
+    _dictionary_codecs(accessor)[accessor.value_encoding_str] = codec
+    if codec is None:
+        return False
+    _use_codec(accessor, codec)
+    return True
+
+
+def load_shared_dictionary(accessor):
+    """
+    Like load_dictionary, but reuses the codec already loaded (or trained)
+    by another accessor of the same database, prefix and encoding.
+    """
+    try:
+        codec = _dictionary_codecs(accessor)[accessor.value_encoding_str]
+    except KeyError:
+        return load_dictionary(accessor)
+    if codec is None:
+        return False
+    _use_codec(accessor, codec)
+    return True
+
+
+def _dictionary_codecs(accessor):
+    """
+    The dictionary codecs (None without a dictionary) of the prefix of
+    accessor by value_encoding, shared by the accessors of its database.
+    """
+    from .derived import registry_of
+    return registry_of(accessor._db).shared(
+        ('compression', accessor._key_prefix), dict)
+
+
+def _use_codec(accessor, codec):
+    (accessor.encode, accessor.decode,
+     accessor.encode_many, accessor.decode_many) = codec.codec
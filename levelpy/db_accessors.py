@@ -5,36 +5,101 @@
 import sys
 from copy import copy
 from numbers import Number
-from .serializer import Serializer
+from collections.abc import Mapping
+from .serializer import Serializer, each
+from .leveldb_module_shims import BackendWrite, BackendWriteBatch
 from .iterviews import (
     LevelItems,
     LevelKeys,
     LevelValues,
+    chunked,
 )
 
 
+# marks the value of a missing (or deleted) key
+MISSING = object()
+
+
+def write_derived(writer, derived_objects, batch, sync=False):
+    """
+    Commits the derived objects into batch, writes it with writer and
+    notifies them; if a commit or the write fails the batch is aborted.
+    Every derived object is notified, those with a true notify_last
+    attribute (user callbacks) after the others, even if some raise; the
+    first error is raised afterwards.
+    """
+    try:
+        for derived in derived_objects:
+            derived.commit(batch)
+        writer.Write(batch, sync)
+    except BaseException:
+        for derived in derived_objects:
+            derived.abort(batch)
+        raise
+    errors = []
+    for last in (False, True):
+        for derived in derived_objects:
+            if getattr(derived, 'notify_last', False) is not last:
+                continue
+            try:
+                derived.written(batch)
+            except BaseException as error:
+                errors.append(error)
+    if errors:
+        raise errors[0]
+
+
 class LevelAccessor:
     """
     A simple class with a method for transforming strings or bytes into keys,
     and a _key_prefix member which will be prepended to the outgoing key bytes.
     """
 
-    _prefix = b''
-    _delim = b''
+    __slots__ = (
+        '_prefix',
+        '_delim',
+        'encode',
+        'decode',
+        'encode_many',
+        'decode_many',
+        'value_encoding_str',
+        '_accessor_cache',
+        '_registry',
+        '_derived_cache',
+        # levelpy.handles.Handle of the backend (None if not opened by path),
+        # keeping it open while the accessor is in use
+        '_handle',
+        '__weakref__',
+    )
+
+    # first byte of keys reserved for levelpy metadata, sorting after the
+    # '~' which ends iteration ranges
+    _reserved = b'\xff'
 
     def __init__(self, prefix, delim, value_encoding='utf8'):
+        self._registry = None
+        self._derived_cache = None
         self.prefix = prefix
         self.delim = delim
+        self._accessor_cache = None
 
         if isinstance(value_encoding, str):
-            self.encode = Serializer.encode[value_encoding]
-            self.decode = Serializer.decode[value_encoding]
+            (self.encode, self.decode,
+             self.encode_many, self.decode_many) = \
+                Serializer.codec(value_encoding)
             self.value_encoding_str = value_encoding
 
+        # (encode, decode) with optional (encode_many, decode_many)
         elif isinstance(value_encoding, (tuple, list)):
             if not all(map(callable, value_encoding)):
                 raise TypeError
-            self.encode, self.decode = value_encoding
+            if len(value_encoding) == 4:
+                (self.encode, self.decode,
+                 self.encode_many, self.decode_many) = value_encoding
+            else:
+                self.encode, self.decode = value_encoding
+                self.encode_many = each(self.encode)
+                self.decode_many = each(self.decode)
             self.value_encoding_str = None
 
         # Assume this is a protocol buffer
@@ -46,6 +111,8 @@ class LevelAccessor:
                 return obj
             self.decode = decode_protocol_buffer
             self.encode = value_encoding.SerializeToString
+            self.encode_many = each(self.encode)
+            self.decode_many = each(self.decode)
             self.value_encoding_str = None
 
         else:
@@ -72,6 +139,13 @@ class LevelAccessor:
             return None
         return self.key_transform(key)
 
+    def reserved_key(self, name):
+        """
+        Returns the key used to store levelpy metadata 'name' belonging to
+        this accessor. These keys are never included in iteration.
+        """
+        return self._key_prefix + self._reserved + self.byteify(name)
+
     @property
     def _key_prefix(self):
         return self._prefix + self._delim
@@ -83,6 +157,7 @@ class LevelAccessor:
     @prefix.setter
     def prefix(self, value):
         self._prefix = self.byteify(value)
+        self._derived_cache = None
 
     @property
     def delim(self):
@@ -91,6 +166,7 @@ class LevelAccessor:
     @delim.setter
     def delim(self, value):
         self._delim = self.byteify(value)
+        self._derived_cache = None
 
     def join(self, *keys):
         """
@@ -129,6 +205,17 @@ class LevelAccessor:
             else:
                 return bytes(value)
 
+    def _accessor(self, cls, key, delim, value_encoding):
+        """
+        Returns the cls (Sublevel or View) accessor of key, from the accessor
+        cache if one is enabled.
+        """
+        prefix = self.key_transform(key)
+        enc = self._get_encoding(value_encoding)
+        if self._accessor_cache is None:
+            return cls(self._db, prefix, delim=delim, value_encoding=enc)
+        return self._accessor_cache.get(cls, self._db, prefix, delim, enc)
+
     def _get_encoding(self, value_encoding):
         if value_encoding is not None:
             enc = value_encoding
@@ -149,6 +236,8 @@ class LevelReader(LevelAccessor):
     backend server, so no functionality is lost.
     """
 
+    __slots__ = ()
+
     _range_ending = b'~'
 
     @property
@@ -159,6 +248,13 @@ class LevelReader(LevelAccessor):
     def range_end(self):
         return self.subkey(self._range_ending)
 
+    @property
+    def _span_end(self):
+        """
+        Last key of the span of this accessor, including its reserved keys
+        """
+        return self.reserved_key(b'\xff' * 8)
+
     def range_start_key(self, key):
         if key is None:
             return self.range_begin
@@ -174,6 +270,28 @@ class LevelReader(LevelAccessor):
     def value_decode(self, byte_str: bytes):
         return self.decode(byte_str)
 
+    def value_decode_many(self, byte_strs):
+        return self.decode_many(byte_strs)
+
+    def load_compression(self):
+        """
+        Loads the zstd dictionary stored by train_compression (if any), which
+        is required to read values compressed with it. Returns whether a
+        dictionary was found. This is done when the accessor is created.
+        """
+        from .compression import load_dictionary
+        return load_dictionary(self)
+
+    def _load_compression(self):
+        """
+        Loads the zstd dictionary of a '<encoding>+zstd' value_encoding,
+        reading it only for the first accessor of the prefix.
+        """
+        enc = self.value_encoding_str
+        if enc is not None and enc.endswith('+zstd'):
+            from .compression import load_shared_dictionary
+            load_shared_dictionary(self)
+
     def get(self, key):
         """
         Normalizes the key, gets bytes from databse, decodes bytes using the
@@ -183,6 +301,24 @@ class LevelReader(LevelAccessor):
         value_bytes = self.Get(key)
         return self.value_decode(value_bytes)
 
+    def get_many(self, keys):
+        """
+        Returns a list of the values stored at each key, decoded together with
+        the value_decode_many method. Raises KeyError if any key is missing.
+        """
+        keys = [self.key_transform(key) for key in keys]
+        return self.value_decode_many(self._get_raw_many(keys))
+
+    def _get_raw_many(self, keys):
+        """
+        Returns the stored bytes of each (full) key, fetched together if the
+        backend has a GetMany method.
+        """
+        get_many = getattr(self._db, 'GetMany', None)
+        if get_many is not None:
+            return get_many(keys)
+        return [self.Get(key) for key in keys]
+
     def __getitem__(self, key):
         if isinstance(key, slice):
             if key.step is not None:
@@ -304,6 +440,66 @@ class LevelReader(LevelAccessor):
         kwargs['key_to'] = self.range_stop_key(kwargs.get('key_to', None))
         return LevelValues(self, **kwargs)
 
+    def approximate_size(self, start=None, stop=None):
+        """
+        Returns the approximate number of bytes on disk used by the keys from
+        start to stop, by default every key of this accessor (with its
+        reserved keys).
+        """
+        from .leveldb_module_shims import BackendApproximateSize
+        key_from, key_to = self._span(start, stop)
+        return BackendApproximateSize(self._db, key_from, key_to)
+
+    def _span(self, start, stop):
+        """
+        Returns the full keys of the span from start to stop, by default that
+        of every key of this accessor. For the whole database, (None, None).
+        """
+        if start is None and stop is None:
+            if not self._key_prefix:
+                return None, None
+            return self._key_prefix, self._span_end
+        return self.range_start_key(start), self.range_stop_key(stop)
+
+    def to_arrays(self, key_codec='bytes', value_fields=None, **kwargs):
+        """
+        Reads the items of this accessor into a dict of numpy arrays: a 'key'
+        column and either a 'value' column or one column per value field.
+        See levelpy.columns.to_arrays for the keyword arguments.
+        """
+        from .columns import to_arrays
+        return to_arrays(self, key_codec, value_fields, **kwargs)
+
+    def to_frame(self, key_codec='bytes', value_fields=None, **kwargs):
+        """
+        Reads the items of this accessor into a pandas DataFrame indexed by
+        key. See levelpy.columns.to_frame.
+        """
+        from .columns import to_frame
+        return to_frame(self,
+                        key_codec=key_codec,
+                        value_fields=value_fields,
+                        **kwargs)
+
+    def dump(self, fileobj, prefix=None, compress='zstd', **kwargs):
+        """
+        Streams a snapshot of this accessor's keys (or those of its sublevel
+        'prefix') to the binary file object, in the format read by
+        LevelDB.restore. See levelpy.io.dumper.dump for the keyword arguments.
+        """
+        from .io.dumper import dump
+        return dump(self, fileobj, prefix, compress, **kwargs)
+
+    def parallel_scan(self, fn, shards=None, executor='thread', **kwargs):
+        """
+        Splits the items of this accessor into shards, applies fn to the
+        items of each in parallel and returns the partial results (or their
+        combination by the 'reduce' keyword). See
+        levelpy.parallel.parallel_scan for the keyword arguments.
+        """
+        from .parallel import parallel_scan
+        return parallel_scan(self, fn, shards, executor, **kwargs)
+
     def __contains__(self, key):
         """
         Tests whether the key exists in the database.
@@ -360,6 +556,18 @@ class LevelReader(LevelAccessor):
     def RangeIter(self, *args, **kwargs):
         return self._db.RangeIter(*args, **kwargs)
 
+    def _reserved_get(self, key):
+        """
+        Get of a reserved key, whose value derived objects store as is.
+        """
+        return self.Get(key)
+
+    def _reserved_range(self, **kwargs):
+        """
+        RangeIter of reserved keys, whose values are stored as is.
+        """
+        return self.RangeIter(**kwargs)
+
 
 class LevelWriter(LevelAccessor):
     """
@@ -367,30 +575,312 @@ class LevelWriter(LevelAccessor):
     database.
     """
 
+    put_many_chunk_size = 1000
+
+    __slots__ = ()
+
+    @property
+    def _derived(self):
+        """
+        Objects (e.g. indexes) updated in the same batch as each write, with
+        update(batch, key, old_value, new_value) called for each written key,
+        then commit(batch) before the batch is written and written(batch)
+        after, or abort(batch) if it is discarded. Previous values are only
+        read for objects with a true uses_previous attribute, after calling
+        their begin(batch) method if they have one (e.g. to lock out other
+        writers until the batch is written).
+
+        These are the objects registered for the prefix of this accessor,
+        the enclosing ones and those within it, by any accessor of the
+        backend; see levelpy.derived.
+        """
+        cached = self._derived_cache
+        registry = self._derived_registry()
+        if cached is None or cached[0] != registry.version:
+            cached = (registry.version, registry.derived_of(self))
+            self._derived_cache = cached
+        return cached[1]
+
+    def _derived_registry(self):
+        registry = self._registry
+        if registry is None:
+            from .derived import registry_of
+            registry = self._registry = registry_of(self._db)
+        return registry
+
+    def _add_derived(self, derived, **names):
+        """
+        Registers derived for the writes of every accessor of this prefix;
+        names may be the index or aggregate name it is registered as.
+        """
+        self._derived_registry().add(self, derived, **names)
+
     def value_encode(self, obj):
         return self.encode(obj)
 
+    def value_encode_many(self, objs):
+        return self.encode_many(objs)
+
     def put(self, key, value):
         """
         Normalizes the key, encodes the value, and stores in the database.
         """
         key = self.key_transform(key)
+        if self._derived:
+            self._write_encoded([(key, self.value_encode(value))], [value])
+            return
         value = self.value_encode(value)
         self.Put(key, value)
 
+    def put_many(self, items, chunk_size=None):
+        """
+        Stores many key-value pairs (a mapping or an iterable of pairs).
+        Values are encoded chunk_size at a time with the value_encode_many
+        method and each chunk is written with a single WriteBatch.
+
+        Chunks are written independently of each other; use write_batch() if
+        all items must be stored atomically.
+        """
+        if isinstance(items, Mapping):
+            items = items.items()
+        for chunk in chunked(items, chunk_size or self.put_many_chunk_size):
+            keys, values = zip(*chunk)
+            keys = map(self.key_transform, keys)
+            self._write_encoded(zip(keys, self.value_encode_many(values)),
+                                values)
+
+    def _write_encoded(self, pairs, values=None):
+        """
+        Writes already transformed keys and encoded values in one batch.
+        The derived objects of this accessor are updated in the same batch
+        with the decoded values, which are decoded from pairs if not given.
+        """
+        batch = self.WriteBatch()
+        pairs = self._prepare_derived(batch, pairs, values)
+        for key, value in pairs:
+            batch.Put(key, value)
+        self._write_batch(batch)
+
+    def _prepare_derived(self, batch, pairs, values=None):
+        """
+        Adds the updates of the derived objects for writing the encoded
+        pairs to batch, returning the pairs.
+        """
+        if not self._derived:
+            return pairs
+        pairs = list(pairs)
+        keys = [key for key, value in pairs]
+        if values is None:
+            values = self.value_decode_many([v for k, v in pairs])
+        self._update_derived(batch, keys, values)
+        return pairs
+
+    def _write_batch(self, batch, sync=False):
+        """
+        Commits the derived objects into batch and writes it.
+        """
+        write_derived(self, self._derived, batch, sync)
+
+    def _add_deletes(self, batch, keys):
+        """
+        Adds the deletes of keys to batch.
+        """
+        for key in keys:
+            batch.Delete(key)
+
+    def _update_derived(self, batch, keys, values):
+        """
+        Adds the updates of each derived object for the new values of keys
+        (MISSING for deleted keys) to batch; if an update fails, the derived
+        objects abort batch.
+        """
+        try:
+            self._add_derived_updates(batch, keys, values)
+        except BaseException:
+            for derived in self._derived:
+                derived.abort(batch)
+            raise
+
+    def _add_derived_updates(self, batch, keys, values):
+        """
+        Passes the new values of keys to each derived object. Derived objects
+        with a scope only receive the keys starting with it, and previous
+        values are read (once) only for those using them, decoded with their
+        decode_many if they have one.
+        """
+        stored = {}
+        for derived in self._derived:
+            scope = getattr(derived, 'scope', None)
+            if scope is None:
+                pairs = list(zip(keys, values))
+            else:
+                pairs = [(key, value) for key, value in zip(keys, values)
+                         if key.startswith(scope)]
+            if not pairs:
+                continue
+            if derived.uses_previous:
+                begin = getattr(derived, 'begin', None)
+                if begin is not None:
+                    begin(batch)
+                unread = [bytes(key) for key, _ in pairs
+                          if bytes(key) not in stored]
+                stored.update(zip(unread, self._stored_values(unread)))
+                decode_many = (getattr(derived, 'decode_many', None)
+                               or self.value_decode_many)
+                olds = self._decoded([stored[bytes(key)] for key, _ in pairs],
+                                     decode_many)
+            else:
+                olds = [MISSING] * len(pairs)
+            for (key, new), old in zip(pairs, olds):
+                derived.update(batch, key, old, new)
+
+    def _stored_values(self, keys):
+        """
+        Returns the values stored at keys, None where there is none.
+        """
+        stored = []
+        for key in keys:
+            try:
+                stored.append(self.Get(key))
+            except KeyError:
+                stored.append(None)
+        return stored
+
+    @staticmethod
+    def _decoded(stored, decode_many):
+        """
+        Returns the stored values decoded with decode_many, MISSING for None.
+        """
+        decoded = iter(decode_many([v for v in stored if v is not None]))
+        return [MISSING if v is None else next(decoded) for v in stored]
+
     def __setitem__(self, key, value):
         self.put(key, value)
 
     def __delitem__(self, key):
         key = self.key_transform(key)
+        if self._derived:
+            batch = self.WriteBatch()
+            self._update_derived(batch, [key], [MISSING])
+            batch.Delete(key)
+            self._write_batch(batch)
+            return
         self.Delete(key)
 
+    def compact(self, start=None, stop=None):
+        """
+        Compacts the storage of the keys from start to stop, by default every
+        key of this accessor (the whole database for a LevelDB).
+        """
+        from .leveldb_module_shims import BackendCompactRange
+        BackendCompactRange(self._db, *self._span(start, stop))
+
+    def delete_range(self, start=None, stop=None, chunk_size=10000,
+                     compact=False, progress=None, background=False,
+                     range_iter=None):
+        """
+        Deletes the keys from start up to (not including) stop - by default
+        every key of this accessor - streaming keys into WriteBatches of
+        chunk_size deletes. Returns the number of keys deleted.
+
+        :param compact: Compact the deleted span afterwards, so its
+            tombstones do not slow later scans.
+
+        :param progress: Function called with the number of keys deleted
+            after each batch.
+
+        :param background: Run in a thread, returning the started
+            levelpy.deletion.RangeDeletion; its wait() method returns the
+            number of keys deleted.
+
+        :param range_iter: The RangeIter function scanning the keys to
+            delete, by default this accessor's.
+        """
+        from .deletion import delete_range, compact_range, RangeDeletion
+
+        key_from = self.range_start_key(start)
+        key_to = self.range_stop_key(stop)
+        inclusive = stop is None
+
+        if background:
+            deletion = RangeDeletion(self, key_from, key_to, compact,
+                                     chunk_size=chunk_size,
+                                     progress=progress,
+                                     range_iter=range_iter,
+                                     stop_inclusive=inclusive)
+            deletion.start()
+            return deletion
+
+        deleted = delete_range(self, key_from, key_to, chunk_size, progress,
+                               range_iter=range_iter,
+                               stop_inclusive=inclusive)
+        if compact:
+            compact_range(self, key_from, key_to)
+        return deleted
+
     def write_batch(self):
         from .batch_context import BatchContext
         return BatchContext(self)
 
+    def group_commit_writer(self, sync=True, max_batch=1000,
+                            max_latency=0.002):
+        """
+        Returns a started GroupCommitWriter, to which threads submit puts and
+        deletes written together in batches. See levelpy.group_commit.
+        """
+        from .group_commit import GroupCommitWriter
+        return GroupCommitWriter(self, sync, max_batch, max_latency)
+
+    def transaction(self, fn=None, retries=10, backoff=0.001, sync=False):
+        """
+        Returns an optimistic transaction: a batch context whose commit
+        fails with TransactionConflict if a value it read was changed
+        meanwhile. Given fn, calls fn(txn) in a transaction instead, retried
+        with backoff on conflict, and returns its result. See
+        levelpy.transaction.
+        """
+        from .transaction import Transaction, run_transaction
+        if fn is None:
+            return Transaction(self, sync)
+        return run_transaction(self, fn, retries, backoff, sync)
+
+    def add_write_hook(self, fn, pre=False):
+        """
+        Calls fn with the list of (op, key, value) records - op is 'put' or
+        'delete' (with value None), keys are full keys - of each batch
+        writing keys of this accessor, through any accessor of the database,
+        after the batch is written or, if pre is true, before. Hooks added
+        to a write_batch() accessor only see the writes of that batch.
+        """
+        from .changes import WriteHook
+        self._add_derived(WriteHook(fn, pre))
+
+    def add_change_log(self, log):
+        """
+        Records the writes of keys of this accessor (through any accessor of
+        the database) in the sublevel log, in the batch of each write, under
+        increasing sequence numbers. Returns
+        the ChangeLog, whose cursors tail the changes (the one already
+        recording them, if any).
+        """
+        from .changes import ChangeLog
+        entry = self._derived_registry().of_prefix(self._key_prefix)
+        for owner, derived in entry.objects:
+            if (isinstance(derived, ChangeLog) and derived.log._db is log._db
+                    and derived.log._key_prefix == log._key_prefix):
+                return derived
+        change_log = ChangeLog(self, log)
+        self._add_derived(change_log)
+        return change_log
+
     def Put(self, key, value):
         return self._db.Put(key, value)
 
     def Delete(self, key):
         return self._db.Delete(key)
+
+    def WriteBatch(self):
+        return BackendWriteBatch(self._db)
+
+    def Write(self, batch, sync=False):
+        return BackendWrite(self._db, batch, sync)
@@ -0,0 +1,114 @@
+#
+# levelpy/deletion.py
+#
+"""
+Range deletes: keys are streamed (without values, unless derived objects
+need them) into large WriteBatches of deletes, optionally followed by a
+compaction of the deleted span so its tombstones do not slow later scans.
+"""
+
+import threading
+
+from .db_accessors import MISSING
+from .iterviews import chunked
+from .leveldb_module_shims import BackendCompactRange
+
+
+def delete_range(writer, start, stop, chunk_size=10000, progress=None,
+                 range_iter=None, stop_inclusive=False, derived=True):
+    """
+    Deletes the keys of writer from the full key start up to stop (exclusive
+    unless stop_inclusive), chunk_size per WriteBatch, returning the number
+    deleted. Derived objects of writer are updated in the same batches.
+
+    :param progress: Function called with the number of keys deleted after
+        each batch.
+
+    :param range_iter: The RangeIter function scanning keys, by default the
+        writer's.
+
+    :param derived: Whether the derived objects of writer are updated; if
+        not, the batches of deletes are written as they are.
+    """
+    range_iter = range_iter or writer.RangeIter
+    keys = (bytes(key) for key in range_iter(key_from=start,
+                                             key_to=stop,
+                                             include_value=False))
+    if not stop_inclusive:
+        keys = (key for key in keys if key != stop)
+
+    deleted = 0
+    for chunk in chunked(keys, chunk_size):
+        batch = writer.WriteBatch()
+        if derived:
+            if writer._derived:
+                writer._update_derived(batch, chunk, [MISSING] * len(chunk))
+            writer._add_deletes(batch, chunk)
+            writer._write_batch(batch)
+        else:
+            for key in chunk:
+                batch.Delete(key)
+            writer.Write(batch)
+        deleted += len(chunk)
+        if progress is not None:
+            progress(deleted)
+    return deleted
+
+
+def compact_range(writer, start, stop):
+    """
+    Compacts the span of the backend database of writer from start to stop.
+    """
+    BackendCompactRange(writer._db, start, stop)
+
+
+class RangeDeletion(threading.Thread):
+    """
+    Thread running delete_range, with the number of keys deleted so far in
+    'deleted' and the total in 'result' once done. Calls on_deleted (if
+    given) once the keys are deleted, then compacts the span if compact is
+    true.
+    """
+
+    def __init__(self, writer, start, stop, compact=False, on_deleted=None,
+                 **kwargs):
+        super().__init__(daemon=True)
+        self.writer = writer
+        self.start_key = start
+        self.stop_key = stop
+        self.compact = compact
+        self.on_deleted = on_deleted
+        self.kwargs = kwargs
+        self.progress = kwargs.pop('progress', None)
+        self.deleted = 0
+        self.result = None
+        self.error = None
+
+    def _report(self, deleted):
+        self.deleted = deleted
+        if self.progress is not None:
+            self.progress(deleted)
+
+    def run(self):
+        try:
+            self.result = delete_range(self.writer,
+                                       self.start_key,
+                                       self.stop_key,
+                                       progress=self._report,
+                                       **self.kwargs)
+            if self.on_deleted is not None:
+                self.on_deleted()
+            if self.compact:
+                compact_range(self.writer, self.start_key, self.stop_key)
+        except Exception as error:
+            self.error = error
+
+    def wait(self, timeout=None):
+        """
+        Waits for the deletion to finish, returning the number of keys
+        deleted (or raising its error).
+        """
+        self.join(timeout)
+        if self.error is not None:
+            raise self.error
+        return self.result
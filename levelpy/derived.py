@@ -0,0 +1,192 @@
+#
+# levelpy/derived.py
+#
+"""
+Registry of the derived objects - indexes, aggregates, write hooks and
+change logs updated in the batch of each write - of a backend database.
+
+Derived objects are registered for the key prefix of the accessor they are
+added through, and maintained by the writes of every accessor of the same
+backend writing keys under that prefix: other objects of the same sublevel,
+copies, and accessors of enclosing prefixes (such as the parent LevelDB).
+Values written through an accessor with another value encoding are
+re-encoded to that of the accessor the derived object was added through.
+"""
+
+import threading
+import weakref
+
+from .db_accessors import MISSING
+
+_lock = threading.Lock()
+
+# id(backend) -> DerivedRegistry, alive while an accessor holds it (and so
+# the backend, which the registry references)
+_registries = weakref.WeakValueDictionary()
+
+
+def registry_of(backend):
+    """
+    Returns the DerivedRegistry of the backend database.
+    """
+    with _lock:
+        registry = _registries.get(id(backend))
+        if registry is None or registry.backend is not backend:
+            registry = _registries[id(backend)] = DerivedRegistry(backend)
+        return registry
+
+
+class PrefixDerived:
+    """
+    The derived objects of one key prefix, with the accessor each was added
+    through, and the indexes and aggregates by name.
+    """
+
+    def __init__(self):
+        self.objects = ()
+        self.indexes = {}
+        self.aggregates = {}
+
+
+class DerivedRegistry:
+    """
+    The derived objects of the accessors of one backend, by key prefix.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.prefixes = {}
+        self._shared = {}
+        # incremented with each change, invalidating the accessors' caches
+        self.version = 0
+        self._lock = threading.Lock()
+
+    def of_prefix(self, prefix):
+        """
+        Returns the PrefixDerived of the key prefix (empty if none were
+        added).
+        """
+        return self.prefixes.get(prefix) or PrefixDerived()
+
+    def add(self, owner, derived, index=None, aggregate=None):
+        """
+        Registers derived for the key prefix of the accessor owner, as the
+        index or aggregate of that name if given (replacing the previous
+        one).
+        """
+        with self._lock:
+            entry = self.prefixes.setdefault(owner._key_prefix,
+                                             PrefixDerived())
+            replaced = None
+            if index is not None:
+                replaced = entry.indexes.get(index)
+                entry.indexes = dict(entry.indexes, **{index: derived})
+            if aggregate is not None:
+                replaced = entry.aggregates.get(aggregate)
+                entry.aggregates = dict(entry.aggregates,
+                                        **{aggregate: derived})
+            entry.objects = tuple(item for item in entry.objects
+                                  if item[1] is not replaced)
+            entry.objects += ((owner, derived), )
+            self.version += 1
+
+    def shared(self, key, factory):
+        """
+        Returns the object shared by every user of key, created by calling
+        factory() the first time.
+        """
+        with self._lock:
+            try:
+                return self._shared[key]
+            except KeyError:
+                obj = self._shared[key] = factory()
+                return obj
+
+    def aggregates_within(self, prefix):
+        """
+        Returns the aggregates of the key prefixes starting with prefix.
+        """
+        return [aggregate
+                for key_prefix, entry in list(self.prefixes.items())
+                if key_prefix.startswith(prefix)
+                for aggregate in entry.aggregates.values()]
+
+    def derived_of(self, writer):
+        """
+        Returns the tuple of derived objects updated by the writes of the
+        accessor writer: those of its prefix and the enclosing ones, and
+        those of the prefixes within its own, which only receive the writes
+        of their keys.
+        """
+        prefix = writer._key_prefix
+        derived = []
+        for key_prefix, entry in list(self.prefixes.items()):
+            if prefix.startswith(key_prefix):
+                scope = None
+            elif key_prefix.startswith(prefix):
+                scope = key_prefix
+            else:
+                continue
+            for owner, obj in entry.objects:
+                same_codec = (owner.encode == writer.encode
+                              and owner.decode == writer.decode)
+                if scope is None and same_codec:
+                    derived.append(obj)
+                else:
+                    convert = None if same_codec else Reencode(writer, owner)
+                    decode_many = None if same_codec else \
+                        owner.value_decode_many
+                    derived.append(Scoped(obj, scope, convert, decode_many))
+        return tuple(derived)
+
+
+class Reencode:
+    """
+    Converts the values decoded by the accessor writer to those the accessor
+    owner would decode.
+    """
+
+    def __init__(self, writer, owner):
+        self.encode = writer.value_encode
+        self.decode = owner.value_decode
+
+    def __call__(self, value):
+        if value is MISSING:
+            return value
+        return self.decode(self.encode(value))
+
+
+class Scoped:
+    """
+    A derived object updated by the writes of an accessor of another prefix:
+    the writer only passes it the keys starting with scope (unless None),
+    with the previous values decoded by decode_many and the new ones
+    converted by convert (unless None).
+    """
+
+    def __init__(self, derived, scope, convert, decode_many=None):
+        self.derived = derived
+        self.scope = scope
+        self.convert = convert
+        self.decode_many = decode_many
+        self.uses_previous = derived.uses_previous
+        self.notify_last = getattr(derived, 'notify_last', False)
+
+    def update(self, batch, key, old_value, new_value):
+        if self.convert is not None:
+            new_value = self.convert(new_value)
+        self.derived.update(batch, key, old_value, new_value)
+
+    def begin(self, batch):
+        begin = getattr(self.derived, 'begin', None)
+        if begin is not None:
+            begin(batch)
+
+    def commit(self, batch):
+        self.derived.commit(batch)
+
+    def written(self, batch):
+        self.derived.written(batch)
+
+    def abort(self, batch):
+        self.derived.abort(batch)
@@ -0,0 +1,151 @@
+#
+# levelpy/group_commit.py
+#
+"""
+Group commit: threads submit puts and deletes to a GroupCommitWriter, whose
+committer thread writes everything submitted since its last write in one
+WriteBatch - so one (synced) write covers the writes of many threads.
+"""
+
+import time
+import queue
+import threading
+from concurrent.futures import Future
+
+from .db_accessors import MISSING
+
+_PUT, _DELETE, _FLUSH, _STOP = range(4)
+
+
+class GroupCommitWriter:
+    """
+    Writes the puts and deletes submitted by any thread to the accessor db
+    in batches of up to max_batch operations. A batch is written as soon as
+    the previous one is, after waiting up to max_latency seconds for more
+    operations if it is not full. Each submission returns a Future resolved
+    once its batch is written (synced to disk if sync is true), or failed
+    with the error of the write.
+
+    When a key is written several times in one batch, only the last write is
+    kept. Operations whose Future is cancelled before their batch is written
+    are dropped.
+    """
+
+    def __init__(self, db, sync=True, max_batch=1000, max_latency=0.002):
+        self.db = db
+        self.sync = sync
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='levelpy-group-commit')
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def _submit(self, op, key=None, value=None):
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("GroupCommitWriter is closed")
+            self._queue.put((op, key, value, future))
+        return future
+
+    def put(self, key, value):
+        """
+        Submits a put, returning its Future.
+        """
+        return self._submit(_PUT, self.db.key_transform(key),
+                            self.db.value_encode(value))
+
+    def delete(self, key):
+        """
+        Submits a delete, returning its Future.
+        """
+        return self._submit(_DELETE, self.db.key_transform(key))
+
+    def flush(self, timeout=None):
+        """
+        Waits until every operation submitted before is written.
+        """
+        self._submit(_FLUSH).result(timeout)
+
+    def close(self):
+        """
+        Writes the pending operations and stops the committer thread.
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put((_STOP, None, None, None))
+        self._thread.join()
+
+    def _run(self):
+        stop = False
+        while not stop:
+            ops = self._gather(self._queue.get())
+            stop = ops[-1][0] == _STOP
+            self._commit([op for op in ops if op[0] != _STOP])
+
+    def _gather(self, first):
+        """
+        Returns the operations of the next batch: first, then those already
+        queued or arriving within max_latency, up to max_batch (or a flush).
+        """
+        ops = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(ops) < self.max_batch and ops[-1][0] not in (_FLUSH, _STOP):
+            try:
+                ops.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                ops.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return ops
+
+    def _commit(self, ops):
+        """
+        Writes the operations in one batch and resolves their futures.
+        """
+        ops = [op for op in ops if op[3].set_running_or_notify_cancel()]
+        latest = {}
+        for op, key, value, future in ops:
+            if op != _FLUSH:
+                latest[key] = MISSING if op == _DELETE else value
+        try:
+            if latest:
+                self._write(latest)
+        except BaseException as error:
+            for op in ops:
+                op[3].set_exception(error)
+            return
+        for op in ops:
+            op[3].set_result(None)
+
+    def _write(self, latest):
+        db = self.db
+        batch = db.WriteBatch()
+        if db._derived:
+            keys = list(latest)
+            values = [MISSING if value is MISSING else db.value_decode(value)
+                      for value in latest.values()]
+            db._update_derived(batch, keys, values)
+        for key, value in latest.items():
+            if value is MISSING:
+                batch.Delete(key)
+            else:
+                batch.Put(key, value)
+        db._write_batch(batch, self.sync)
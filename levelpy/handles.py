@@ -0,0 +1,124 @@
+#
+# levelpy/handles.py
+#
+"""
+Process-wide cache of open backend databases, keyed by the real path of the
+database directory (and the backend class), so every LevelDB opened on a
+path shares one backend. LevelDB directories may only be opened once per
+process, and each open pays for warming up its table cache.
+
+Each open backend has a Handle, referenced by every accessor using it - the
+LevelDBs, and their sublevels and views - and cached while one does. The
+handle counts the LevelDBs opened on it: LevelDB.close() releases one, and
+with the last the backend is closed (if it can be, and dropped from the
+cache; py-leveldb's database is only closed once unreferenced). A backend
+no accessor references anymore is closed and dropped from the cache
+whatever its count, so reopening its path opens the directory again.
+Remaining handles are closed at exit.
+"""
+
+import os
+import atexit
+import logging
+import threading
+import weakref
+
+from .leveldb_module_shims import BackendClose
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+
+# (real path, backend class) -> Handle, while referenced by an accessor
+_handles = weakref.WeakValueDictionary()
+
+# id(backend) -> Handle of the backend, likewise
+_by_backend = weakref.WeakValueDictionary()
+
+
+class Handle:
+    """
+    An open backend, with the number of LevelDBs opened (and not closed) on
+    it. The backend is closed when the handle is garbage collected.
+    """
+
+    __slots__ = ('backend', 'key', 'opens', '_finalizer', '__weakref__')
+
+    def __init__(self, backend, key):
+        self.backend = backend
+        self.key = key
+        self.opens = 0
+        self._finalizer = weakref.finalize(self, BackendClose, backend)
+
+
+def handle_key(path, backend_cls):
+    return os.path.realpath(path), backend_cls
+
+
+def acquire(path, backend_cls, open_backend):
+    """
+    Returns the Handle of the database at path, opened by calling
+    open_backend() unless already open. Open options only apply to the
+    first opening.
+    """
+    key = handle_key(path, backend_cls)
+    with _lock:
+        handle = _handles.get(key)
+        if handle is None:
+            backend = open_backend()
+            handle = _handles[key] = _by_backend[id(backend)] = \
+                Handle(backend, key)
+        else:
+            log.debug('acquire: reusing the open database %s' % (key[0]))
+        handle.opens += 1
+        return handle
+
+
+def handle_of(backend):
+    """
+    Returns the Handle of backend, or None if it was not opened by path.
+    """
+    with _lock:
+        handle = _by_backend.get(id(backend))
+    if handle is not None and handle.backend is backend:
+        return handle
+    return None
+
+
+def release(handle):
+    """
+    Releases a LevelDB's open of handle; the backend is closed with the
+    last, if it can be closed while still referenced.
+    """
+    with _lock:
+        handle.opens -= 1
+        if handle.opens > 0:
+            return
+        if getattr(handle.backend, 'close', None) is None:
+            return
+        if _handles.get(handle.key) is handle:
+            del _handles[handle.key]
+    handle._finalizer()
+
+
+def refcount(path, backend_cls):
+    """
+    Returns the number of LevelDBs opened on the database at path.
+    """
+    with _lock:
+        handle = _handles.get(handle_key(path, backend_cls))
+        return handle.opens if handle else 0
+
+
+def close_all():
+    """
+    Closes every cached backend, whatever its handles.
+    """
+    with _lock:
+        handles = list(_handles.values())
+        _handles.clear()
+    for handle in handles:
+        handle._finalizer()
+
+
+atexit.register(close_all)
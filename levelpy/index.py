@@ -0,0 +1,193 @@
+#
+# levelpy/index.py
+#
+"""
+Secondary indexes of a sublevel.
+
+An index stores one empty entry per (index value, primary key) pair, under a
+reserved prefix of the indexed sublevel, so the entries are never part of
+its iteration. Entries are updated in the same WriteBatch as the write of
+the primary key, removing those of the previous value.
+"""
+
+from .db_accessors import MISSING, LevelAccessor
+
+# separates the index value from the primary key in entry keys
+_SEP = b'\x00'
+
+
+class Index:
+    """
+    Index of the values of sublevel by key_fn(value), which returns an index
+    value, a list (or set) of index values, or None to not index the value.
+    Index values are byteified (strings are utf8 encoded, numbers stored as
+    their string) and should not contain null bytes.
+    """
+
+    # entries of the previous value are removed
+    uses_previous = True
+
+    def __init__(self, sublevel, name, key_fn):
+        self.sublevel = sublevel
+        self.name = name
+        self.key_fn = key_fn
+        self._prefix = sublevel.reserved_key('index!' + name) + _SEP
+        self._state_key = sublevel.reserved_key('index-backfill!' + name)
+
+    def index_values(self, value):
+        """
+        Returns the set of index values (bytes) of a stored value.
+        """
+        if value is MISSING:
+            return set()
+        index_value = self.key_fn(value)
+        if index_value is None:
+            return set()
+        if not isinstance(index_value, (list, tuple, set, frozenset)):
+            index_value = (index_value, )
+        byteify = LevelAccessor.byteify
+        return {byteify(v) for v in index_value if v is not None}
+
+    def entry_key(self, index_value, primary_key):
+        return self._prefix + index_value + _SEP + primary_key
+
+    def update(self, batch, key, old_value, new_value):
+        """
+        Adds the entry changes for the write of new_value at the (full) key
+        to batch.
+        """
+        primary_key = self.sublevel.strip_prefix(key)
+        old = self.index_values(old_value)
+        new = self.index_values(new_value)
+        for index_value in old - new:
+            batch.Delete(self.entry_key(index_value, primary_key))
+        for index_value in new - old:
+            batch.Put(self.entry_key(index_value, primary_key), b'')
+
+    def commit(self, batch):
+        """
+        Entries are added to the batch by update; nothing is left to commit.
+        """
+
+    def written(self, batch):
+        """
+        Nothing is done once the batch is written.
+        """
+
+    def abort(self, batch):
+        """
+        Entries only exist in the discarded batch.
+        """
+
+    def _entries(self, start, stop):
+        """
+        Yields (index value, primary key) of the entries between the full
+        keys start (inclusive) and stop (exclusive).
+        """
+        skip = len(self._prefix)
+        for key in self.sublevel._reserved_range(key_from=start,
+                                                 key_to=stop,
+                                                 include_value=False):
+            if key >= stop:
+                return
+            index_value, _, primary_key = bytes(key[skip:]).partition(_SEP)
+            yield index_value, primary_key
+
+    def keys(self, value):
+        """
+        Returns the list of primary keys with index value 'value'; slices
+        ('a':'m') return those with index values in the range.
+        """
+        if isinstance(value, slice):
+            if value.step is not None:
+                raise ValueError("Step is not available for index slices")
+            start = self._prefix + (LevelAccessor.byteify(value.start) or b'')
+            if value.stop is None:
+                stop = self._prefix[:-1] + b'\x01'
+            else:
+                stop = self._prefix + LevelAccessor.byteify(value.stop)
+        else:
+            start = self._prefix + LevelAccessor.byteify(value) + _SEP
+            stop = start[:-1] + b'\x01'
+        return [primary_key for _, primary_key in self._entries(start, stop)]
+
+    def items(self, value):
+        """
+        Returns the list of (primary key, value) pairs matching value (an
+        index value or slice).
+        """
+        keys = self.keys(value)
+        return list(zip(keys, self.sublevel.get_many(keys)))
+
+    def __getitem__(self, value):
+        """
+        Returns the list of stored values matching value (an index value or
+        slice).
+        """
+        return self.sublevel.get_many(self.keys(value))
+
+    def __contains__(self, value):
+        return bool(self.keys(value))
+
+    @property
+    def backfilled(self):
+        """
+        Whether backfill() has indexed all values stored before the index
+        was added.
+        """
+        try:
+            return self.sublevel._reserved_get(self._state_key) == b''
+        except KeyError:
+            return False
+
+    def backfill(self, chunk_size=1000, progress=None):
+        """
+        Indexes the values already stored in the sublevel, chunk_size at a
+        time, returning the number of values read. Each chunk is written in
+        its own batch with the last key read, so an interrupted backfill
+        resumes where it stopped and writes may continue meanwhile; a value
+        written concurrently by another thread between the read and the
+        write of its chunk can leave a stale entry.
+
+        :param progress: Function called with the number of values read
+            after each chunk.
+        """
+        sub = self.sublevel
+        try:
+            start = bytes(sub._reserved_get(self._state_key)) or None
+        except KeyError:
+            start = sub.range_begin
+        if start is None:
+            return 0
+
+        resumed = start != sub.range_begin
+        count = 0
+        while True:
+            chunk = []
+            for key, value in sub.RangeIter(key_from=start,
+                                            key_to=sub.range_end,
+                                            include_value=True):
+                if resumed and key == start:
+                    continue
+                chunk.append((bytes(key), value))
+                if len(chunk) == chunk_size:
+                    break
+            if not chunk:
+                break
+
+            batch = sub.WriteBatch()
+            keys, values = zip(*chunk)
+            for key, value in zip(keys, sub.value_decode_many(values)):
+                primary_key = sub.strip_prefix(key)
+                for index_value in self.index_values(value):
+                    batch.Put(self.entry_key(index_value, primary_key), b'')
+            start, resumed = keys[-1], True
+            batch.Put(self._state_key, start)
+            sub.Write(batch)
+
+            count += len(chunk)
+            if progress is not None:
+                progress(count)
+
+        sub.Put(self._state_key, b'')
+        return count
@@ -0,0 +1,22 @@
+#
+# levelpy/io/__init__.py
+#
+# flake8: noqa
+#
+"""
+Bulk import and export of levelpy databases.
+"""
+
+from .importer import (
+    ImportStats,
+    import_records,
+    import_jsonl,
+    import_csv,
+    import_msgpack,
+)
+from .dumper import (
+    DumpError,
+    dump,
+    restore,
+    read_dump,
+)
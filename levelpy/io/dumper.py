@@ -0,0 +1,181 @@
+#
+# levelpy/io/dumper.py
+#
+"""
+Streaming dump and restore of raw database contents.
+
+A dump is a header followed by frames, each holding many length-prefixed
+key/value records:
+
+    header:  b'LVPYDUMP' | version (1 byte) | compression (1 byte)
+    frame:   payload length | record count | crc32 of payload  (<III)
+             payload (compressed records)
+    records: key length | value length (<II) | key | value
+
+A frame with zero records ends the dump, its crc field holding the total
+number of records (modulo 2**32) as a truncation check. Keys and values are
+copied as raw bytes - nothing is encoded or decoded - and are read from a
+snapshot, so the dump is consistent even while the database is being
+written. Memory use is bounded by the frame size.
+"""
+
+import zlib
+import struct
+from itertools import takewhile
+
+from ..leveldb_module_shims import BackendSnapshot
+
+MAGIC = b'LVPYDUMP'
+VERSION = 1
+
+FRAME = struct.Struct('<III')
+RECORD = struct.Struct('<II')
+
+# compression byte of the header
+COMPRESSION = {
+    None: 0,
+    'zlib': 1,
+    'zstd': 2,
+}
+
+
+class DumpError(ValueError):
+    """
+    Raised when a dump file is malformed, truncated or corrupted.
+    """
+
+
+def _compressors(compress):
+    if compress is None:
+        return bytes, bytes
+    if compress == 'zlib':
+        return zlib.compress, zlib.decompress
+    if compress == 'zstd':
+        import zstandard
+        return (zstandard.ZstdCompressor().compress,
+                zstandard.ZstdDecompressor().decompress)
+    raise ValueError("Unknown dump compression %r" % compress)
+
+
+def dump_range(range_iter, fileobj, compress='zstd', frame_size=1 << 20):
+    """
+    Writes the (key, value) pairs of range_iter to the binary file object,
+    returning the number of records written.
+    """
+    compress_frame = _compressors(compress)[0]
+    fileobj.write(MAGIC + bytes([VERSION, COMPRESSION[compress]]))
+
+    total = count = 0
+    buffer = bytearray()
+
+    def write_frame():
+        payload = compress_frame(bytes(buffer))
+        fileobj.write(FRAME.pack(len(payload), count, zlib.crc32(payload)))
+        fileobj.write(payload)
+
+    for key, value in range_iter:
+        buffer += RECORD.pack(len(key), len(value))
+        buffer += key
+        buffer += value
+        count += 1
+        if len(buffer) >= frame_size:
+            write_frame()
+            total += count
+            count = 0
+            buffer.clear()
+
+    if count:
+        write_frame()
+        total += count
+    fileobj.write(FRAME.pack(0, 0, total & 0xFFFFFFFF))
+    return total
+
+
+def read_dump(fileobj):
+    """
+    Yields the (key, value) pairs stored in a dump file, verifying the
+    checksum of each frame.
+    """
+    header = fileobj.read(len(MAGIC) + 2)
+    if len(header) != len(MAGIC) + 2 or header[:len(MAGIC)] != MAGIC:
+        raise DumpError("Not a levelpy dump file")
+    if header[-2] != VERSION:
+        raise DumpError("Unsupported dump version %d" % header[-2])
+    try:
+        compress = {v: k for k, v in COMPRESSION.items()}[header[-1]]
+    except KeyError:
+        raise DumpError("Unknown dump compression %d" % header[-1])
+    decompress = _compressors(compress)[1]
+
+    total = 0
+    while True:
+        frame = fileobj.read(FRAME.size)
+        if len(frame) != FRAME.size:
+            raise DumpError("Dump file is truncated")
+        length, count, crc = FRAME.unpack(frame)
+        if count == 0:
+            if crc != total & 0xFFFFFFFF:
+                raise DumpError("Dump file is truncated")
+            return
+        payload = fileobj.read(length)
+        if len(payload) != length or zlib.crc32(payload) != crc:
+            raise DumpError("Dump frame is corrupted")
+
+        data = memoryview(decompress(payload))
+        offset = 0
+        for _ in range(count):
+            key_len, value_len = RECORD.unpack_from(data, offset)
+            offset += RECORD.size
+            key = bytes(data[offset:offset + key_len])
+            offset += key_len
+            yield key, bytes(data[offset:offset + value_len])
+            offset += value_len
+        total += count
+
+
+def dump(accessor, fileobj, prefix=None, compress='zstd', key_from=None,
+         key_to=None, frame_size=1 << 20):
+    """
+    Dumps the keys of accessor (all of them, for a LevelDB) - or of its
+    sublevel 'prefix' - from a snapshot to fileobj. Returns the number of
+    records written.
+
+    The key_from and key_to arguments (inclusive, relative to the dumped
+    accessor) limit the dump to one part of the key space, so several dumps
+    of distinct ranges may be written in parallel. Keys are stored in full,
+    including metadata keys outside the iteration range.
+    """
+    if prefix is not None:
+        accessor = accessor.view(prefix)
+    key_prefix = accessor._key_prefix
+
+    kwargs = {'include_value': True}
+    kwargs['key_from'] = accessor.subkey(key_from) or key_prefix or None
+    kwargs['key_to'] = accessor.subkey(key_to)
+
+    snapshot = BackendSnapshot(accessor._db)
+    range_iter = snapshot.RangeIter(**kwargs)
+    if key_prefix:
+        range_iter = takewhile(lambda item: item[0].startswith(key_prefix),
+                               range_iter)
+    return dump_range(range_iter, fileobj, compress, frame_size)
+
+
+def restore(writer, fileobj, batch_size=1 << 22, sync=False):
+    """
+    Writes the records of a dump file into writer's database with large
+    WriteBatches of about batch_size bytes. Keys are written as stored,
+    ignoring any prefix of writer. Returns the number of records.
+    """
+    batch = writer.WriteBatch()
+    size = total = 0
+    for key, value in read_dump(fileobj):
+        batch.Put(key, value)
+        size += len(key) + len(value)
+        total += 1
+        if size >= batch_size:
+            writer.Write(batch, sync)
+            batch = writer.WriteBatch()
+            size = 0
+    writer.Write(batch, sync)
+    return total
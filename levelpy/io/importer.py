@@ -0,0 +1,219 @@
+#
+# levelpy/io/importer.py
+#
+"""
+Streaming bulk import of JSONL, CSV and msgpack files.
+
+Records are read from the file in chunks, keys are derived with a key
+function (or field name) and values are encoded - optionally in a process
+pool, as encoding is CPU bound - before being written in large WriteBatches.
+Only a bounded number of chunks is in flight at any time, so memory use does
+not depend on the size of the input.
+"""
+
+import csv
+import sys
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain
+from operator import itemgetter
+
+from ..iterviews import chunked
+from ..serializer import Serializer
+
+
+class ImportStats:
+    """
+    Progress of an import: number of rows written, bytes of encoded values
+    and elapsed time.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+        self.batches = 0
+        self.start = time.monotonic()
+        self.end = None
+
+    @property
+    def elapsed(self):
+        return (self.end or time.monotonic()) - self.start
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.rows / elapsed if elapsed else 0.0
+
+    def __str__(self):
+        return "%d rows (%.1f MB) in %.1fs - %.0f rows/s" % (
+            self.rows, self.bytes / 1e6, self.elapsed, self.rows_per_second)
+
+
+# encodings which store json lines as they are read
+JSON_ENCODINGS = ('json', 'stdjson', 'fastjson')
+
+
+def key_function(key):
+    """
+    Returns key if callable, otherwise a function getting the field 'key' of
+    a record. Field getters may be sent to worker processes.
+    """
+    return key if callable(key) else itemgetter(key)
+
+
+def encode_chunk(records, key, encoding, parse=None):
+    """
+    Returns the list of (key, encoded value) pairs of the chunk of records,
+    where encoding is a Serializer codec name or an encode_many function.
+    If parse is 'json', records are raw json lines which are parsed first;
+    when also storing json, the line itself is stored without re-encoding.
+
+    This is the function run by worker processes.
+    """
+    key = key_function(key)
+    if parse == 'json':
+        lines = [line.strip() for line in records]
+        lines = [line for line in lines if line]
+        records = Serializer.decode_many['fastjson'](lines)
+        if encoding in JSON_ENCODINGS:
+            return [(key(record), line)
+                    for record, line in zip(records, lines)]
+    if isinstance(encoding, str):
+        encode_many = Serializer.codec(encoding)[2]
+    else:
+        encode_many = encoding
+    values = encode_many(records)
+    return [(key(record), value) for record, value in zip(records, values)]
+
+
+def import_records(db,
+                   records,
+                   key,
+                   parse=None,
+                   processes=0,
+                   chunk_size=1000,
+                   batch_size=10000,
+                   presort=False,
+                   progress=None):
+    """
+    Writes records into db (a LevelDB or Sublevel), returning an
+    ImportStats.
+
+    :param key: Function of a record returning its key, or the name of the
+        record field holding the key.
+
+    :param processes: Number of worker processes encoding values; if 0,
+        values are encoded in this process. Workers require db to use a
+        value_encoding string and key to be picklable (a field name is).
+
+    :param chunk_size: Number of records encoded per task.
+
+    :param batch_size: Number of records written per WriteBatch.
+
+    :param presort: Sort each batch by key before writing, so the writes
+        arrive in key order (ordering is only within each batch).
+
+    :param progress: Function called with the ImportStats after each batch.
+    """
+    encoding = db.value_encoding_str
+    chunks = chunked(records, chunk_size)
+
+    if processes:
+        if encoding is None:
+            raise ValueError("Encoding values in worker processes requires a"
+                             " value_encoding string")
+        with ProcessPoolExecutor(processes) as executor:
+            encoded = _submit_bounded(executor, chunks, processes * 2,
+                                      key, encoding, parse)
+            return _write_all(db, encoded, batch_size, presort, progress)
+
+    if encoding not in JSON_ENCODINGS:
+        encoding = db.encode_many
+    encoded = (encode_chunk(chunk, key, encoding, parse) for chunk in chunks)
+    return _write_all(db, encoded, batch_size, presort, progress)
+
+
+def _submit_bounded(executor, chunks, window, key, encoding, parse):
+    """
+    Yields encoded chunks in input order, keeping at most window tasks
+    submitted to executor.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(encode_chunk, chunk, key, encoding,
+                                       parse))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _write_all(db, encoded_chunks, batch_size, presort, progress):
+    stats = ImportStats()
+    for batch in chunked(chain.from_iterable(encoded_chunks), batch_size):
+        pairs = [(db.key_transform(k), v) for k, v in batch]
+        if presort:
+            pairs.sort()
+        db._write_encoded(pairs)
+        stats.rows += len(pairs)
+        stats.bytes += sum(len(v) for k, v in pairs)
+        stats.batches += 1
+        if progress is not None:
+            progress(stats)
+    stats.end = time.monotonic()
+    return stats
+
+
+@contextmanager
+def _opened(source, mode, **kwargs):
+    """
+    Opens source if it is a path ('-' is standard input); file objects are
+    used as they are.
+    """
+    if source == '-':
+        yield sys.stdin.buffer if 'b' in mode else sys.stdin
+    elif isinstance(source, (str, bytes)) or hasattr(source, '__fspath__'):
+        with open(source, mode, **kwargs) as fileobj:
+            yield fileobj
+    else:
+        yield source
+
+
+def import_jsonl(db, source, key, **kwargs):
+    """
+    Imports a file (path or binary file object) with one json document per
+    line. Lines are parsed by the encoding workers.
+    """
+    with _opened(source, 'rb') as fileobj:
+        return import_records(db, fileobj, key, parse='json', **kwargs)
+
+
+def import_csv(db, source, key, dialect='excel', **kwargs):
+    """
+    Imports a csv file (path or text file object) with a header row; each
+    row is stored as a dict of strings.
+    """
+    with _opened(source, 'r', newline='') as fileobj:
+        rows = csv.DictReader(fileobj, dialect=dialect)
+        return import_records(db, rows, key, **kwargs)
+
+
+def import_msgpack(db, source, key, **kwargs):
+    """
+    Imports a file (path or binary file object) of concatenated msgpack
+    objects.
+    """
+    import msgpack
+
+    with _opened(source, 'rb') as fileobj:
+        records = msgpack.Unpacker(fileobj, raw=False)
+        return import_records(db, records, key, **kwargs)
+
+
+IMPORTERS = {
+    'jsonl': import_jsonl,
+    'csv': import_csv,
+    'msgpack': import_msgpack,
+}
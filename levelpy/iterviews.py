@@ -3,6 +3,7 @@
 #
 
 from copy import copy
+from itertools import islice
 from collections.abc import (
     ItemsView,
     KeysView,
@@ -11,12 +12,46 @@ from collections.abc import (
 )
 
 
+def chunked(iterable, size):
+    """
+    Yields lists of (at most) size items taken from iterable.
+    """
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def decode_items(db, range_iter, size, key_transform=bytes):
+    """
+    Yields the (key, value) pairs of range_iter, decoding values size at a time
+    with db's decode_many function.
+    """
+    for chunk in chunked(range_iter, size):
+        keys, values = zip(*chunk)
+        yield from zip(map(key_transform, keys), db.decode_many(values))
+
+
+def decode_values(db, range_iter, size):
+    """
+    Yields the values of range_iter, decoded size at a time with db's
+    decode_many function.
+    """
+    for chunk in chunked(range_iter, size):
+        yield from db.decode_many([v for k, v in chunk])
+
+
 class LevelItems(ItemsView):
     __slots__ = [
         '_db',
         '_args',
     ]
 
+    # number of values handed to the decode_many function at once
+    chunk_size = 256
+
     def __init__(self, db, key_from=None, key_to=None, **kwargs):
         self._db = db
         self._args = kwargs
@@ -29,15 +64,19 @@ class LevelItems(ItemsView):
         kwargs = copy(self._args)
         kwargs['reverse'] = False
         kwargs['include_value'] = True
-        for k, v in self._db.RangeIter(**kwargs):
-            yield self.key_transform(k), self._db.decode(v)
+        return decode_items(self._db,
+                            self._db.RangeIter(**kwargs),
+                            self.chunk_size,
+                            self.key_transform)
 
     def __reversed__(self):
         kwargs = copy(self._args)
         kwargs['reverse'] = True
         kwargs['include_value'] = True
-        for k, v in self._db.RangeIter(**kwargs):
-            yield self.key_transform(k), self._db.decode(v)
+        return decode_items(self._db,
+                            self._db.RangeIter(**kwargs),
+                            self.chunk_size,
+                            self.key_transform)
 
     @staticmethod
     def key_transform(key):
@@ -90,6 +129,9 @@ class LevelValues(ValuesView):
         '_args',
     ]
 
+    # number of values handed to the decode_many function at once
+    chunk_size = 256
+
     def __init__(self, db, key_from=None, key_to=None, **kwargs):
         self._db = db
         self._args = kwargs
@@ -102,15 +144,17 @@ class LevelValues(ValuesView):
         kwargs = copy(self._args)
         kwargs['reverse'] = False
         kwargs['include_value'] = True
-        for k, v in self._db.RangeIter(**kwargs):
-            yield self._db.decode(v)
+        return decode_values(self._db,
+                             self._db.RangeIter(**kwargs),
+                             self.chunk_size)
 
     def __reversed__(self):
         kwargs = copy(self._args)
         kwargs['reverse'] = True
         kwargs['include_value'] = True
-        for k, v in self._db.RangeIter(**kwargs):
-            yield self._db.decode(v)
+        return decode_values(self._db,
+                             self._db.RangeIter(**kwargs),
+                             self.chunk_size)
 
     def __repr__(self):                                     # pragma: no cover
         return "<LevelValues @%x>" % id(self)
@@ -2,12 +2,33 @@
 # levelpy/leveldb.py
 #
 
-from .leveldb_module_shims import NormalizeBackend
+from functools import lru_cache
+
+from . import handles
+from .leveldb_module_shims import (
+    NormalizeBackend,
+    BackendOpenOptions,
+    BackendSnapshot,
+)
 from .db_accessors import (LevelAccessor, LevelReader, LevelWriter)
 from .sublevel import Sublevel
 from .view import View
 
 
+@lru_cache()
+def import_backend(leveldb_cls):
+    """
+    Returns the package and class of the backend named by the full class name
+    leveldb_cls, imported once.
+    """
+    # everything before last dot is package, after is class name
+    last_dot = leveldb_cls.rfind('.')
+    pkg = leveldb_cls[:last_dot]
+    db_classname = leveldb_cls[last_dot+1:]
+    leveldb_pkg = __import__(pkg)
+    return leveldb_pkg, getattr(leveldb_pkg, db_classname)
+
+
 class LevelDB(LevelReader, LevelWriter):
     """
     LevelDB interface.
@@ -30,20 +51,54 @@ class LevelDB(LevelReader, LevelWriter):
         creates a new database in the filesystem if none exists
     :type create_if_missing: bool
 
-    :param db_kwargs: keyword arguments passed directly to the database class
-        specified
+    :param profile: Name of a set of open options in LevelDB.profiles, which
+        db_kwargs may override: 'bulk_load' for loading large amounts of
+        data (call finish_load() afterwards), 'serving' for random reads.
+    :type profile: str
+
+    :param db_kwargs: keyword arguments passed to the database class
+        specified. The options of the profiles are translated to the names
+        used by the backend (or dropped if not supported).
+
+    Databases opened by path share one backend per directory (see
+    levelpy.handles); the options of the first opening apply. Call close(),
+    or use the LevelDB as a context manager, to release it. A backend no
+    LevelDB, sublevel or view references anymore is closed.
     """
 
     _db = None
+    # whether this LevelDB opened its backend by path (and must release it)
+    _opened = False
     _leveldb_cls = None
     _leveldb_pkg = None
     path = None
+    profile = None
+    _size_report = None
+
+    # open options of each profile
+    profiles = {
+        # large memtables, fewer compactions while loading
+        'bulk_load': {
+            'write_buffer_size': 256 << 20,
+            'max_open_files': 4096,
+        },
+        # large block cache and bloom filters for random reads
+        'serving': {
+            'block_cache_size': 512 << 20,
+            'bloom_filter_bits': 10,
+            'paranoid_checks': False,
+        },
+    }
+
+    # profiles compacting the database in finish_load()
+    compacting_profiles = ('bulk_load', )
 
     def __init__(self,
                  db,
                  leveldb_cls='leveldb.LevelDB',
                  value_encoding='utf-8',
                  create_if_missing=False,
+                 profile=None,
                  **db_kwargs):
 
         # if db is a string - create the db object from the leveldb_cls param
@@ -52,12 +107,8 @@ class LevelDB(LevelReader, LevelWriter):
 
             # injected class name by string
             if isinstance(leveldb_cls, str):
-                # everything before last dot is package, after is class name
-                last_dot = leveldb_cls.rfind('.')
-                pkg = leveldb_cls[:last_dot]
-                db_classname = leveldb_cls[last_dot+1:]
-                self._leveldb_pkg = __import__(pkg)
-                self._leveldb_cls = getattr(self._leveldb_pkg, db_classname)
+                self._leveldb_pkg, self._leveldb_cls = \
+                    import_backend(leveldb_cls)
 
             # passed the class directly
             elif isinstance(leveldb_cls, type):
@@ -69,10 +120,24 @@ class LevelDB(LevelReader, LevelWriter):
                 self._leveldb_pkg = None
                 self._leveldb_cls = leveldb_cls
 
-            # create the backend
-            self._db = self._leveldb_cls(self.path,
+            if profile is not None:
+                db_kwargs = dict(self.profiles[profile], **db_kwargs)
+                self.profile = profile
+            cls = self._leveldb_cls
+            if isinstance(cls, type):
+                cls = "%s.%s" % (cls.__module__, cls.__name__)
+            db_kwargs = BackendOpenOptions(cls, db_kwargs)
+
+            # create the backend, or share the one already open on the path
+            def open_backend():
+                return self._leveldb_cls(self.path,
                                          create_if_missing=create_if_missing,
                                          **db_kwargs)
+            self._handle = handles.acquire(self.path,
+                                           self._leveldb_cls,
+                                           open_backend)
+            self._db = self._handle.backend
+            self._opened = True
 
             # The backend package was not determined.
             # Provided 'class' was just a factory function - inspect
@@ -84,12 +149,14 @@ class LevelDB(LevelReader, LevelWriter):
         # db was an object - just copy information
         else:
             self._db = db
+            self._handle = handles.handle_of(db)
             self._leveldb_cls = self._db.__class__
             self._leveldb_pkg = self._leveldb_cls.__module__
 
         LevelAccessor.__init__(self, '', '', value_encoding)
 
         NormalizeBackend(self, self._db)
+        self._load_compression()
 
     def __copy__(self):
         """
@@ -97,12 +164,78 @@ class LevelDB(LevelReader, LevelWriter):
         """
         return type(self)(self._db)
 
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """
+        Releases the backend: a database opened by path is closed when every
+        LevelDB sharing it is closed, or (if the backend cannot be closed
+        while in use) once no sublevel or view uses it either. Sublevels and
+        views of this LevelDB must not be used afterwards.
+        """
+        db, self._db = self._db, None
+        if db is None:
+            return
+        self._registry = self._derived_cache = None
+        for name, value in list(vars(self).items()):
+            if getattr(value, '__self__', None) is db:
+                delattr(self, name)
+        handle, self._handle = self._handle, None
+        if self._opened:
+            self._opened = False
+            handles.release(handle)
+
+    def cache_accessors(self, maxsize=1024):
+        """
+        Enables interning of the sublevels and views of this database (and
+        of theirs): requesting the same sublevel (or view) with the same
+        delimiter and encoding returns the same object, kept alive while in
+        use or among the maxsize most recently requested. Returns self.
+        """
+        from .accessor_cache import AccessorCache
+        self._accessor_cache = AccessorCache(maxsize)
+        return self
+
     def batch(self):
         """
         Alias of the write_batch() method - creates a BatchDB object.
         """
         return self.write_batch()
 
+    def restore(self, fileobj, **kwargs):
+        """
+        Bulk loads a file written by dump() into the database, returning the
+        number of records. Keys and values are written as stored, in large
+        WriteBatches, followed by finish_load(). See levelpy.io.dumper.restore
+        for the keyword arguments.
+        """
+        from .io.dumper import restore
+        count = restore(self, fileobj, **kwargs)
+        self.finish_load()
+        return count
+
+    def finish_load(self):
+        """
+        Ends a bulk load, compacting the whole database if it was opened with
+        a profile for loading ('bulk_load'), so reads do not pay for the
+        compactions deferred by its large write buffers.
+        """
+        if self.profile in self.compacting_profiles:
+            self.compact()
+
+    def compact(self, start=None, stop=None, prefix=None):
+        """
+        Compacts the keys from start to stop - by default the whole
+        database - or every key of the sublevel 'prefix'.
+        """
+        if prefix is not None:
+            return self.sublevel(prefix).compact(start, stop)
+        return super().compact(start, stop)
+
     def destroy_db(self):
         raise NotImplementedError
 
@@ -112,31 +245,77 @@ class LevelDB(LevelReader, LevelWriter):
         """
         return self.GetStats()
 
+    def storage_stats(self):
+        """
+        Returns the database stats parsed into a dict: files, size and
+        compaction work of each level, their totals and the read and write
+        amplification. See levelpy.stats.parse_stats.
+        """
+        from .stats import storage_stats
+        return storage_stats(self)
+
+    def sublevel_sizes(self, delim=b'!'):
+        """
+        Returns a dict of the approximate disk usage of each top level
+        sublevel (keys are prefixes).
+        """
+        from .stats import sublevel_sizes
+        return sublevel_sizes(self, delim)
+
+    def top_sublevels(self, n=10, max_age=300):
+        """
+        Returns the n largest sublevels as a list of (prefix, bytes), from
+        sizes computed at most max_age seconds ago.
+        """
+        report = self._sublevel_size_report()
+        report.max_age = max_age
+        return report.top(n)
+
+    def _sublevel_size_report(self):
+        from .stats import SizeReport
+        if self._size_report is None:
+            self._size_report = SizeReport(self)
+        return self._size_report
+
+    def prometheus_metrics(self, labels=None, sizes=True):
+        """
+        Returns the storage stats (and, if sizes is true, the cached sizes of
+        the sublevels) in the Prometheus text format.
+        """
+        from .stats import prometheus_text
+        if sizes:
+            sizes = self._sublevel_size_report().get()
+        return prometheus_text(self.storage_stats(), sizes or None, labels)
+
     def create_snapshot(self):
         """
-        Returns the database stats.
+        Returns a snapshot of the database, with Get and RangeIter methods.
         """
-        return self.CreateSnapshot(self._db)
+        return BackendSnapshot(self._db)
 
     def sublevel(self, key, delim=b'!', value_encoding=None):
         """
         Generate a sublevel with prefix key.
         """
+        return self._accessor(Sublevel, key, delim, value_encoding)
+
+    def ttl_sublevel(self, key, default_ttl=None, delim=b'!',
+                     value_encoding=None):
+        """
+        Generate a sublevel whose values expire default_ttl seconds after
+        they are written (see levelpy.ttl.TTLSublevel).
+        """
+        from .ttl import TTLSublevel
         enc = self._get_encoding(value_encoding)
-        return Sublevel(self._db,
-                        self.key_transform(key),
-                        delim=delim,
-                        value_encoding=enc,
-                        )
+        return TTLSublevel(self._db,
+                           self.key_transform(key),
+                           delim=delim,
+                           value_encoding=enc,
+                           default_ttl=default_ttl,
+                           )
 
     def view(self, key, delim=b'!', value_encoding=None):
         """
         Generate a read-only view of a prefixed part of the database.
         """
-        prefix = self.key_transform(key)
-        enc = self._get_encoding(value_encoding)
-        return View(self._db,
-                    prefix,
-                    delim=delim,
-                    value_encoding=enc,
-                    )
+        return self._accessor(View, key, delim, value_encoding)
@@ -6,6 +6,7 @@ Shims for normalizing modules.
 """
 
 import logging
+from functools import partial
 
 log = logging.getLogger(__name__)
 
@@ -27,6 +28,188 @@ def NormalizeBackend(wrapper, db):
     normalizer(wrapper, db)
 
 
+def BackendWriteBatch(db):
+    """
+    Returns a new WriteBatch for the backend db. The py-leveldb package
+    provides the WriteBatch class at the module level, not as a method, and
+    plyvel batches are wrapped in a PlyvelWriteBatch.
+    """
+    full_classname = "%s.%s" % (db.__class__.__module__, db.__class__.__name__)
+    if full_classname == 'leveldb.LevelDB':
+        import leveldb
+        return leveldb.WriteBatch()
+    if full_classname == 'plyvel._plyvel.DB':
+        return PlyvelWriteBatch(db)
+    return db.WriteBatch()
+
+
+def BackendWrite(db, batch, sync=False):
+    """
+    Writes the batch (from BackendWriteBatch) to the backend db.
+    """
+    full_classname = "%s.%s" % (db.__class__.__module__, db.__class__.__name__)
+    if full_classname == 'plyvel._plyvel.DB':
+        return batch.write(sync)
+    return db.Write(batch, sync)
+
+
+def BackendSnapshot(db):
+    """
+    Returns a snapshot of the backend db, with py-leveldb's Get and RangeIter
+    methods.
+    """
+    full_classname = "%s.%s" % (db.__class__.__module__, db.__class__.__name__)
+    if full_classname == 'plyvel._plyvel.DB':
+        return PlyvelSnapshot(db.snapshot())
+    return db.CreateSnapshot()
+
+
+def plyvel_range_iter(source, key_from=None, key_to=None, include_value=True,
+                      reverse=False, **kwargs):
+    """
+    py-leveldb's RangeIter (including key_to) over the iterator of a plyvel
+    database or snapshot.
+    """
+    return source.iterator(start=key_from,
+                           stop=key_to,
+                           include_stop=True,
+                           include_value=include_value,
+                           reverse=reverse,
+                           **kwargs)
+
+
+class PlyvelWriteBatch:
+    """
+    A plyvel write batch with py-leveldb's Put and Delete methods. Plyvel
+    sets the sync option of a batch when creating it, so synced writes
+    copy the batch into a synced one.
+    """
+
+    __slots__ = ('db', 'batch')
+
+    def __init__(self, db):
+        self.db = db
+        self.batch = db.write_batch()
+
+    def Put(self, key, value):
+        self.batch.put(key, value)
+
+    def Delete(self, key):
+        self.batch.delete(key)
+
+    def write(self, sync=False):
+        batch = self.batch
+        if sync:
+            batch = self.db.write_batch(sync=True)
+            batch.append(self.batch)
+        batch.write()
+
+
+class PlyvelSnapshot:
+    """
+    A plyvel snapshot with py-leveldb's Get and RangeIter methods.
+    """
+
+    __slots__ = ('snapshot', )
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+
+    def Get(self, key, **kwargs):
+        value = self.snapshot.get(key, **kwargs)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def RangeIter(self, *args, **kwargs):
+        return plyvel_range_iter(self.snapshot, *args, **kwargs)
+
+
+def BackendCompactRange(db, start=None, stop=None):
+    """
+    Compacts the keys from start to stop (None for the first and last keys
+    of the database) of the backend db.
+    """
+    full_classname = "%s.%s" % (db.__class__.__module__, db.__class__.__name__)
+    if full_classname == 'plyvel._plyvel.DB':
+        return db.compact_range(start=start, stop=stop)
+    return db.CompactRange(start, stop)
+
+
+def BackendApproximateSize(db, start, stop):
+    """
+    Returns the approximate number of bytes the keys from start to stop use
+    on disk. py-leveldb provides no size estimates, so the sizes of the keys
+    and values in the range (uncompressed) are summed instead, which reads
+    the whole range.
+    """
+    full_classname = "%s.%s" % (db.__class__.__module__, db.__class__.__name__)
+    if full_classname == 'plyvel._plyvel.DB':
+        return db.approximate_size(start, stop)
+    return sum(len(key) + len(value)
+               for key, value in db.RangeIter(key_from=start, key_to=stop))
+
+
+def BackendStats(db):
+    """
+    Returns the stats text of the backend db.
+    """
+    full_classname = "%s.%s" % (db.__class__.__module__, db.__class__.__name__)
+    if full_classname == 'plyvel._plyvel.DB':
+        return db.get_property(b'leveldb.stats').decode()
+    return db.GetStats()
+
+
+def BackendClose(db):
+    """
+    Closes the backend db. py-leveldb has no close method - its database is
+    closed once no reference to it remains.
+    """
+    close = getattr(db, 'close', None)
+    if close is not None:
+        close()
+
+
+# open options understood by levelpy, by backend class: None for options the
+# backend does not support, otherwise the name of its keyword argument
+BACKEND_OPTIONS = {
+    'leveldb.LevelDB': {
+        'write_buffer_size': 'write_buffer_size',
+        'block_cache_size': 'block_cache_size',
+        'block_size': 'block_size',
+        'max_open_files': 'max_open_files',
+        'paranoid_checks': 'paranoid_checks',
+        'bloom_filter_bits': None,
+    },
+    'plyvel._plyvel.DB': {
+        'write_buffer_size': 'write_buffer_size',
+        'block_cache_size': 'lru_cache_size',
+        'block_size': 'block_size',
+        'max_open_files': 'max_open_files',
+        'paranoid_checks': 'paranoid_checks',
+        'bloom_filter_bits': 'bloom_filter_bits',
+    },
+}
+
+
+def BackendOpenOptions(full_classname, options):
+    """
+    Returns the keyword arguments opening a database of the backend class
+    with the levelpy open options; unsupported options are dropped. Options
+    unknown to levelpy are passed through unchanged.
+    """
+    names = BACKEND_OPTIONS.get(full_classname, {})
+    kwargs = {}
+    for option, value in options.items():
+        name = names.get(option, option)
+        if name is None:
+            log.debug('BackendOpenOptions: %s does not support %s'
+                      % (full_classname, option))
+            continue
+        kwargs[name] = value
+    return kwargs
+
+
 def py_leveldb(wrapper, db):
 
     import leveldb
@@ -62,11 +245,9 @@ def plyvel_database(wrapper, db):
     wrapper.Get = db.get
     wrapper.Put = db.put
     wrapper.Delete = db.delete
-    wrapper.Write = None
-    wrapper.RangeIter = not_implemented
+    wrapper.RangeIter = partial(plyvel_range_iter, db)
     wrapper.GetStats = not_implemented
-    wrapper.CreateSnapshot = plyvel.DB.snapshot
+    wrapper.CreateSnapshot = partial(BackendSnapshot, db)
 
     wrapper.DestroyDB = not_implemented
     wrapper.RepairDB = not_implemented
-    wrapper.WriteBatch = plyvel.DB.write_batch
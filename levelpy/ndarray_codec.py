@@ -0,0 +1,110 @@
+#
+# levelpy/ndarray_codec.py
+#
+"""
+NumPy array value codecs (requires numpy).
+
+The 'ndarray' codec stores a compact header - the dtype description and
+shape - followed by the raw array buffer. Decoding is zero-copy: the array
+returned by np.frombuffer shares the memory of the bytes-like object given
+by the backend (read-only for bytes, writable for bytearray values).
+
+The records_codec function creates a codec for a fixed (usually structured)
+dtype known by the sublevel, storing only the raw buffer.
+
+Importing this module registers the 'ndarray' codec with the Serializer,
+which is done automatically the first time the codec is requested.
+"""
+
+import ast
+import struct
+from functools import lru_cache
+
+import numpy as np
+
+from .serializer import Serializer
+
+# ndim, length of dtype description
+HEADER = struct.Struct('<BH')
+
+# the data buffer starts at a multiple of this many bytes
+ALIGNMENT = 16
+
+
+@lru_cache(maxsize=256)
+def descr_to_dtype(descr):
+    """
+    Returns the dtype from its stored description bytes.
+    """
+    descr = descr.decode('ascii')
+    if descr.startswith('['):
+        descr = ast.literal_eval(descr)
+    return np.lib.format.descr_to_dtype(descr)
+
+
+def dtype_to_descr(dtype):
+    """
+    Returns the bytes describing dtype, as stored in the header.
+    """
+    descr = np.lib.format.dtype_to_descr(dtype)
+    if not isinstance(descr, str):
+        descr = repr(descr)
+    return descr.encode('ascii')
+
+
+def ndarray_encode(obj):
+    arr = np.asarray(obj, order='C')
+    if arr.dtype.hasobject:
+        raise TypeError("Cannot store arrays of python objects")
+    descr = dtype_to_descr(arr.dtype)
+    header = HEADER.pack(arr.ndim, len(descr)) + descr
+    header += struct.pack('<%dQ' % arr.ndim, *arr.shape)
+    header += b'\x00' * (-len(header) % ALIGNMENT)
+    return b''.join((header, arr))
+
+
+def ndarray_decode(byte_str):
+    ndim, descr_len = HEADER.unpack_from(byte_str)
+    offset = HEADER.size + descr_len
+    dtype = descr_to_dtype(bytes(byte_str[HEADER.size:offset]))
+    shape = struct.unpack_from('<%dQ' % ndim, byte_str, offset)
+    offset += 8 * ndim
+    offset += -offset % ALIGNMENT
+    arr = np.frombuffer(byte_str, dtype, offset=offset)
+    return arr.reshape(shape)
+
+
+def records_codec(dtype):
+    """
+    Returns an (encode, decode, encode_many, decode_many) value_encoding for
+    one-dimensional arrays of the fixed dtype, typically a structured dtype
+    describing a record. Only the raw buffer is stored.
+
+    Single records (tuples or np.void) are stored as arrays of length one;
+    values are always decoded as arrays. Decoding many values creates one
+    array from the joined buffers and returns views into it.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.hasobject:
+        raise TypeError("Cannot store arrays of python objects")
+
+    def encode(obj):
+        return np.ascontiguousarray(obj, dtype=dtype).reshape(-1).tobytes()
+
+    def decode(byte_str):
+        return np.frombuffer(byte_str, dtype)
+
+    def encode_many(objs):
+        return list(map(encode, objs))
+
+    def decode_many(byte_strs):
+        if not byte_strs:
+            return []
+        data = np.frombuffer(b''.join(byte_strs), dtype)
+        counts = [len(b) // dtype.itemsize for b in byte_strs]
+        return np.split(data, np.cumsum(counts[:-1]))
+
+    return encode, decode, encode_many, decode_many
+
+
+Serializer.register('ndarray', ndarray_encode, ndarray_decode)
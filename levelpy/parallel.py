@@ -0,0 +1,221 @@
+#
+# levelpy/parallel.py
+#
+"""
+Parallel scans of a key range, split into shards scanned independently.
+
+LevelDB allows a single process to open a database, so worker processes can
+not open it themselves. With the 'process' executor each shard is read by a
+thread of this process, which hands chunks of raw values to a process pool
+where they are decoded and mapped; with the 'thread' executor (for backends
+releasing the GIL) each shard is read, decoded and mapped by one thread.
+"""
+
+import os
+import random
+from collections import deque
+from functools import reduce as _reduce
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    ProcessPoolExecutor,
+)
+
+from .iterviews import chunked, decode_items
+from .serializer import Serializer
+
+# number of bytes of the keys used to interpolate split points
+_SPLIT_BYTES = 8
+
+
+def _first_key(reader, reverse=False):
+    kwargs = {
+        'key_from': reader.range_begin,
+        'key_to': reader.range_end,
+        'include_value': False,
+        'reverse': reverse,
+    }
+    for key in reader.RangeIter(**kwargs):
+        return bytes(key)
+    return None
+
+
+def interpolate_splits(first, last, shards):
+    """
+    Returns shards - 1 keys splitting the key space between first and last
+    into ranges of (numerically) equal width.
+    """
+    common = 0
+    for a, b in zip(first, last):
+        if a != b:
+            break
+        common += 1
+    prefix = first[:common]
+
+    def number(key):
+        tail = key[common:common + _SPLIT_BYTES].ljust(_SPLIT_BYTES, b'\0')
+        return int.from_bytes(tail, 'big')
+
+    low, high = number(first), number(last)
+    splits = []
+    for i in range(1, shards):
+        point = low + (high - low) * i // shards
+        split = prefix + point.to_bytes(_SPLIT_BYTES, 'big').rstrip(b'\0')
+        if (not splits or split > splits[-1]) and first < split <= last:
+            splits.append(split)
+    return splits
+
+
+def sample_splits(reader, shards, sample_size=None):
+    """
+    Returns shards - 1 keys splitting the range of reader into ranges with
+    (approximately) the same number of keys, from a uniform sample of the
+    keys. This reads every key - but no values - of the range.
+    """
+    sample_size = sample_size or shards * 32
+    sample = []
+    kwargs = {
+        'key_from': reader.range_begin,
+        'key_to': reader.range_end,
+        'include_value': False,
+    }
+    for n, key in enumerate(reader.RangeIter(**kwargs)):
+        if n < sample_size:
+            sample.append(bytes(key))
+        else:
+            i = random.randint(0, n)
+            if i < sample_size:
+                sample[i] = bytes(key)
+    sample.sort()
+    splits = []
+    for i in range(1, shards):
+        split = sample[len(sample) * i // shards] if sample else None
+        if split is not None and (not splits or split > splits[-1]):
+            splits.append(split)
+    return splits
+
+
+def shard_ranges(reader, shards, method='interpolate'):
+    """
+    Returns a list of (key_from, key_to) full key ranges covering the range
+    of reader, where key_from is inclusive and key_to exclusive (None for the
+    end of the last range).
+
+    :param method: 'interpolate' splits the key space between the first and
+        last keys evenly, at no cost; 'sample' splits by a sample of the keys,
+        which is accurate for skewed keys but reads every key.
+    """
+    if method == 'sample':
+        splits = sample_splits(reader, shards)
+    elif method == 'interpolate':
+        first, last = _first_key(reader), _first_key(reader, reverse=True)
+        if first is None:
+            return []
+        splits = interpolate_splits(first, last, shards)
+    else:
+        raise ValueError("Unknown shard method %r" % method)
+
+    starts = [reader.range_begin] + splits
+    return list(zip(starts, splits + [None]))
+
+
+def _shard_iter(reader, key_from, key_to):
+    """
+    Yields the raw (key, value) pairs with key_from <= key < key_to.
+    """
+    stop = reader.range_end if key_to is None else key_to
+    for key, value in reader.RangeIter(key_from=key_from,
+                                       key_to=stop,
+                                       include_value=True):
+        if key_to is not None and key == key_to:
+            return
+        yield key, value
+
+
+def map_chunk(fn, encoding, chunk):
+    """
+    Decodes the raw (key, value) pairs of chunk with the codec 'encoding'
+    and returns fn of the decoded items. This runs in worker processes.
+    """
+    keys, values = zip(*chunk)
+    values = Serializer.codec(encoding)[3](values)
+    return fn(zip(map(bytes, keys), values))
+
+
+def _map_bounded(executor, chunks, window, fn, encoding):
+    """
+    Yields the results of map_chunk over chunks in input order, keeping at
+    most window chunks submitted to executor.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(map_chunk, fn, encoding, chunk))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def parallel_scan(reader,
+                  fn,
+                  shards=None,
+                  executor='thread',
+                  reduce=None,
+                  method='interpolate',
+                  chunk_size=4096,
+                  max_workers=None):
+    """
+    Applies fn to the decoded (key, value) items of reader's range in
+    parallel, returning the list of partial results, or their combination
+    with reduce(a, b) if given (None for an empty range).
+
+    fn receives an iterator of items and returns a partial result; it must
+    give correct partial results for any part of the range as the 'thread'
+    executor calls it once per shard and the 'process' executor once per
+    chunk of chunk_size items. With processes, fn must be picklable and the
+    reader must use a value_encoding string.
+    """
+    shards = shards or os.cpu_count()
+    ranges = shard_ranges(reader, shards, method)
+
+    if executor == 'thread':
+        def scan(shard):
+            items = decode_items(reader, _shard_iter(reader, *shard),
+                                 chunk_size)
+            return fn(items)
+
+        with ThreadPoolExecutor(max_workers or len(ranges) or 1) as pool:
+            results = list(pool.map(scan, ranges))
+
+    elif executor == 'process':
+        encoding = reader.value_encoding_str
+        if encoding is None:
+            raise ValueError("Process scans require a value_encoding string")
+
+        # workers decode values compressed with the trained zstd
+        # dictionaries loaded by this process
+        init = {}
+        if encoding.endswith('+zstd'):
+            from .compression import dictionaries, register_dictionaries
+            init = {'initializer': register_dictionaries,
+                    'initargs': (dictionaries(),)}
+
+        # chunks submitted at once by each shard's reader, so raw values
+        # are read only slightly ahead of the workers
+        workers = max_workers or os.cpu_count()
+        window = max(2, 2 * workers // (len(ranges) or 1))
+
+        with ProcessPoolExecutor(max_workers, **init) as processes:
+            def scan(shard):
+                chunks = chunked(_shard_iter(reader, *shard), chunk_size)
+                return list(_map_bounded(processes, chunks, window, fn,
+                                         encoding))
+
+            with ThreadPoolExecutor(len(ranges) or 1) as readers:
+                results = [r for shard_results in readers.map(scan, ranges)
+                           for r in shard_results]
+    else:
+        raise ValueError("Unknown executor %r" % executor)
+
+    if reduce is None:
+        return results
+    return _reduce(reduce, results) if results else None
@@ -0,0 +1,371 @@
+#
+# levelpy/partitioned.py
+#
+"""
+A LevelDB for time series data partitioned by time bucket: the keys of each
+hour (or day) are stored in their own database directory, so retention drops
+whole directories instead of deleting (and compacting away) old keys.
+
+Keys start with their timestamp - see timestamp_key - so they sort by time
+within a partition, and partitions hold disjoint, ordered time spans. Range
+scans read only the partitions the range touches, one after the other.
+"""
+
+import os
+import time
+import shutil
+import struct
+import calendar
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import chain
+
+from .leveldb import LevelDB
+
+_TIMESTAMP = struct.Struct('>Q')
+
+# directory name format and duration (seconds) of each kind of bucket
+BUCKETS = {
+    'hour': ('%Y%m%dT%H', 3600),
+    'day': ('%Y%m%d', 86400),
+}
+
+
+def timestamp_key(timestamp, suffix=b''):
+    """
+    Returns the key of timestamp (seconds since the epoch): its milliseconds
+    as 8 big-endian bytes, followed by suffix.
+    """
+    return _TIMESTAMP.pack(int(timestamp * 1000)) + suffix
+
+
+def key_timestamp(key):
+    """
+    Returns the timestamp (seconds) of a key made by timestamp_key.
+    """
+    return _TIMESTAMP.unpack_from(key)[0] / 1000
+
+
+class PartitionWriteBatch:
+    """
+    WriteBatch collecting the operations of each partition in its own batch.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.batches = {}
+
+    def _batch(self, key):
+        bucket = self.backend.bucket(key)
+        try:
+            return self.batches[bucket]
+        except KeyError:
+            batch = self.batches[bucket] = \
+                self.backend.partition(bucket, create=True).WriteBatch()
+            return batch
+
+    def Put(self, key, value):
+        self._batch(key).Put(key, value)
+
+    def Delete(self, key):
+        self._batch(key).Delete(key)
+
+
+class PartitionedBackend:
+    """
+    Backend with the interface of py-leveldb's LevelDB over one database per
+    time bucket in the directory root. At most max_open partitions are kept
+    open, the least recently used being closed first - once no operation
+    holds it. Likewise, the directory of a dropped partition is deleted once
+    no operation holds it.
+    """
+
+    def __init__(self, root, bucket='day', max_open=16,
+                 timestamp_fn=key_timestamp, leveldb_cls='leveldb.LevelDB',
+                 **db_kwargs):
+        self.root = root
+        self.format, self.duration = BUCKETS[bucket]
+        self.max_open = max_open
+        self.timestamp_fn = timestamp_fn
+        self.leveldb_cls = leveldb_cls
+        self.db_kwargs = db_kwargs
+        self._open = OrderedDict()
+        # id(partition) -> [partition, number of operations holding it]
+        self._held = {}
+        # id(partition) -> partition evicted while held, closed on release
+        self._evicted = {}
+        # bucket -> a partition dropped while held, deleted once unheld
+        self._dropped = {}
+        self._lock = threading.RLock()
+        os.makedirs(root, exist_ok=True)
+
+    def bucket(self, key):
+        """
+        Returns the start (seconds since the epoch) of the bucket of key.
+        """
+        timestamp = self.timestamp_fn(bytes(key))
+        return int(timestamp // self.duration * self.duration)
+
+    def bucket_path(self, bucket):
+        name = time.strftime(self.format, time.gmtime(bucket))
+        return os.path.join(self.root, name)
+
+    def partitions(self):
+        """
+        Returns the sorted bucket starts of the partitions on disk, except
+        those dropped.
+        """
+        buckets = []
+        for name in os.listdir(self.root):
+            try:
+                parsed = time.strptime(name, self.format)
+            except ValueError:
+                continue
+            buckets.append(calendar.timegm(parsed))
+        return sorted(b for b in buckets if b not in self._dropped)
+
+    def partition(self, bucket, create=False):
+        """
+        Returns the (LevelDB) partition of bucket, or None if it does not
+        exist and create is false. The partition may be closed when evicted
+        by later calls; use hold() to keep it open while using it. Until its
+        directory is deleted, a dropped partition only receives writes
+        (deleted with it).
+        """
+        with self._lock:
+            if bucket in self._dropped:
+                return self._dropped[bucket] if create else None
+            try:
+                self._open.move_to_end(bucket)
+                return self._open[bucket]
+            except KeyError:
+                pass
+            path = self.bucket_path(bucket)
+            if not create and not os.path.isdir(path):
+                return None
+            db = LevelDB(path,
+                         self.leveldb_cls,
+                         create_if_missing=True,
+                         **self.db_kwargs)
+            self._open[bucket] = db
+            while len(self._open) > self.max_open:
+                self._close(self._open.popitem(last=False)[1])
+            return db
+
+    @contextmanager
+    def hold(self, bucket, create=False):
+        """
+        Context manager returning the partition of bucket like partition(),
+        which is not closed (when evicted or dropped) before the block
+        exits.
+        """
+        with self._lock:
+            db = self.partition(bucket, create)
+            if db is not None:
+                self._held.setdefault(id(db), [db, 0])[1] += 1
+        try:
+            yield db
+        finally:
+            if db is not None:
+                self._release(db)
+
+    def _release(self, db):
+        with self._lock:
+            held = self._held[id(db)]
+            held[1] -= 1
+            if held[1]:
+                return
+            del self._held[id(db)]
+            evicted = self._evicted.pop(id(db), None)
+        if evicted is not None:
+            evicted.close()
+        with self._lock:
+            for bucket in list(self._dropped):
+                if not self._holds(bucket):
+                    shutil.rmtree(self.bucket_path(bucket))
+                    del self._dropped[bucket]
+
+    def _holds(self, bucket):
+        """
+        Returns a partition of bucket held by an operation, or None.
+        """
+        path = self.bucket_path(bucket)
+        for db, _ in self._held.values():
+            if db.path == path:
+                return db
+        return None
+
+    def _close(self, db):
+        """
+        Closes a partition no longer open, or defers it until released.
+        """
+        with self._lock:
+            if id(db) in self._held:
+                self._evicted[id(db)] = db
+                return
+        db.close()
+
+    def _range_partitions(self, key_from, key_to):
+        """
+        Returns the buckets of the partitions holding keys from key_from to
+        key_to; bounds which are not timestamp keys leave the range open.
+        """
+        buckets = self.partitions()
+        try:
+            first = self.bucket(key_from)
+            buckets = [b for b in buckets if b >= first]
+        except (TypeError, ValueError, struct.error):
+            pass
+        try:
+            last = self.bucket(key_to)
+            buckets = [b for b in buckets if b <= last]
+        except (TypeError, ValueError, struct.error):
+            pass
+        return buckets
+
+    def Get(self, key, **kwargs):
+        with self.hold(self.bucket(key)) as db:
+            if db is None:
+                raise KeyError(key)
+            return db.Get(key, **kwargs)
+
+    def Put(self, key, value, sync=False):
+        with self.hold(self.bucket(key), create=True) as db:
+            db.Put(key, value, sync=sync)
+
+    def Delete(self, key, sync=False):
+        with self.hold(self.bucket(key)) as db:
+            if db is not None:
+                db.Delete(key, sync=sync)
+
+    def WriteBatch(self):
+        return PartitionWriteBatch(self)
+
+    def Write(self, batch, sync=False):
+        for bucket, partition_batch in sorted(batch.batches.items()):
+            with self.hold(bucket, create=True) as db:
+                db.Write(partition_batch, sync)
+
+    def RangeIter(self, key_from=None, key_to=None, include_value=True,
+                  reverse=False, **kwargs):
+        buckets = self._range_partitions(key_from, key_to)
+        if reverse:
+            buckets.reverse()
+
+        def scan(bucket):
+            with self.hold(bucket) as db:
+                if db is not None:
+                    yield from db.RangeIter(key_from=key_from,
+                                            key_to=key_to,
+                                            include_value=include_value,
+                                            reverse=reverse,
+                                            **kwargs)
+
+        return chain.from_iterable(map(scan, buckets))
+
+    def CompactRange(self, start=None, stop=None):
+        for bucket in self._range_partitions(start, stop):
+            with self.hold(bucket) as db:
+                if db is not None:
+                    db.compact(start, stop)
+
+    def GetStats(self):
+        stats = []
+        for bucket in self.partitions():
+            with self.hold(bucket) as db:
+                stats.append(db.GetStats())
+        return '\n'.join(stats)
+
+    def drop_before(self, timestamp):
+        """
+        Deletes the directories of the partitions ending at or before
+        timestamp, returning their bucket starts. The directory of a
+        partition held by an operation is deleted when it is released.
+        """
+        dropped = []
+        with self._lock:
+            for bucket in self.partitions():
+                if bucket + self.duration > timestamp:
+                    break
+                if bucket in self._open:
+                    self._close(self._open.pop(bucket))
+                held = self._holds(bucket)
+                if held is None:
+                    shutil.rmtree(self.bucket_path(bucket))
+                else:
+                    self._dropped[bucket] = held
+                dropped.append(bucket)
+        return dropped
+
+    def close(self):
+        with self._lock:
+            while self._open:
+                self._close(self._open.popitem()[1])
+
+
+class PartitionedLevelDB(LevelDB):
+    """
+    A LevelDB partitioned into one database directory (under root) per time
+    bucket of its keys.
+
+    :param bucket: 'hour' or 'day'.
+
+    :param max_open: Number of partitions kept open.
+
+    :param timestamp_fn: Function returning the timestamp (seconds) of a
+        (full) key; by default, that of a key made by timestamp_key. Keys
+        must sort by this timestamp for range scans to be ordered.
+
+    Other keyword arguments are those of LevelDB, used to open each
+    partition. Snapshots (and so dump) are not available.
+    """
+
+    def __init__(self,
+                 root,
+                 bucket='day',
+                 max_open=16,
+                 timestamp_fn=key_timestamp,
+                 leveldb_cls='leveldb.LevelDB',
+                 value_encoding='utf-8',
+                 **db_kwargs):
+        backend = PartitionedBackend(root, bucket, max_open, timestamp_fn,
+                                     leveldb_cls, **db_kwargs)
+        super().__init__(backend, value_encoding=value_encoding)
+        self.path = root
+
+    def __copy__(self):
+        """
+        Copy sharing the open partitions
+        """
+        db = LevelDB.__new__(type(self))
+        LevelDB.__init__(db, self._db, value_encoding=self._get_encoding(None))
+        db.path = self.path
+        return db
+
+    def partitions(self):
+        """
+        Returns the sorted start times (seconds) of the buckets on disk.
+        """
+        return self._db.partitions()
+
+    def drop_before(self, timestamp):
+        """
+        Drops every partition ending at or before timestamp, by deleting its
+        directory. Returns the start times of the dropped buckets.
+        """
+        return self._db.drop_before(timestamp)
+
+    def retain(self, max_age, now=None):
+        """
+        Drops the partitions ending more than max_age seconds ago.
+        """
+        if now is None:
+            now = time.time()
+        return self.drop_before(now - max_age)
+
+    def close(self):
+        """
+        Closes the open partitions.
+        """
+        self._db.close()
@@ -0,0 +1,98 @@
+#
+# levelpy/protocol.py
+#
+"""
+Binary framing of the levelpy server protocol.
+
+Every message is a frame: a header of the payload length (4 bytes), the
+request id (4 bytes) and an op code (requests) or status (responses) byte,
+then a payload of fields. Each field is its length (4 bytes, 0xffffffff for
+None) followed by its bytes. Integers are sent as decimal strings. All
+numbers are big-endian.
+"""
+
+import struct
+
+HEADER = struct.Struct('>IIB')
+LENGTH = struct.Struct('>I')
+NONE = 0xffffffff
+
+# request op codes
+GET = 1
+PUT = 2
+DELETE = 3
+GET_MANY = 4
+WRITE = 5
+RANGE_OPEN = 6
+RANGE_NEXT = 7
+RANGE_CLOSE = 8
+STATS = 9
+COMPACT = 10
+
+# response statuses
+OK = 0
+NOT_FOUND = 1
+ERROR = 2
+
+# ops of WRITE requests
+BATCH_PUT = b'P'
+BATCH_DELETE = b'D'
+
+
+def pack_fields(fields):
+    """
+    Returns the payload of a list of fields (bytes-like or None).
+    """
+    parts = []
+    for field in fields:
+        if field is None:
+            parts.append(LENGTH.pack(NONE))
+        else:
+            parts.append(LENGTH.pack(len(field)))
+            parts.append(bytes(field))
+    return b''.join(parts)
+
+
+def unpack_fields(payload):
+    """
+    Returns the list of fields of a payload.
+    """
+    fields = []
+    pos, end = 0, len(payload)
+    while pos < end:
+        length, = LENGTH.unpack_from(payload, pos)
+        pos += LENGTH.size
+        if length == NONE:
+            fields.append(None)
+        else:
+            fields.append(payload[pos:pos + length])
+            pos += length
+    return fields
+
+
+def pack_frame(request_id, code, fields=()):
+    payload = pack_fields(fields)
+    return HEADER.pack(len(payload), request_id, code) + payload
+
+
+def read_frame(stream):
+    """
+    Reads a frame from the binary file object stream, returning (request id,
+    code, fields), or None at the end of the stream.
+    """
+    header = stream.read(HEADER.size)
+    if len(header) < HEADER.size:
+        return None
+    length, request_id, code = HEADER.unpack(header)
+    payload = stream.read(length)
+    if len(payload) < length:
+        return None
+    return request_id, code, unpack_fields(payload)
+
+
+def pack_int(value):
+    return b'%d' % value
+
+
+def unpack_int(field):
+    return int(field)
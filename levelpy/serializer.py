@@ -1,8 +1,38 @@
 #
 # levelpy/serializer.py
 #
+"""
+Value encoding/decoding functions used by levelpy accessors.
+
+Codecs are (encode, decode) pairs looked up by name in the Serializer class.
+They are built once, at import time. The 'json' codec always uses the
+standard json module, so stored values stay readable whichever libraries
+are installed; 'fastjson' uses the fastest json library available (orjson,
+then ujson), falling back to the json module for the values it rejects.
+
+Each codec also has an (encode_many, decode_many) pair which works on a
+sequence of objects at once. Codecs which cannot do better than a loop get
+a per-item wrapper made by the 'each' function.
+"""
 
 import json
+import threading
+from importlib import import_module
+
+try:
+    import orjson
+except ImportError:                                       # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:                                       # pragma: no cover
+    ujson = None
+
+try:
+    import msgpack
+except ImportError:                                       # pragma: no cover
+    msgpack = None
 
 
 def json_encode(obj):
@@ -10,7 +40,72 @@ def json_encode(obj):
 
 
 def json_decode(byte_str):
-    return json.loads(byte_str.decode())
+    # json.loads accepts bytes directly - no need for an intermediate str
+    return json.loads(byte_str)
+
+
+def orjson_encode(obj):
+    try:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    except TypeError:
+        # integers over 64 bits, among others
+        return json_encode(obj)
+
+
+def orjson_decode(byte_str):
+    try:
+        return orjson.loads(byte_str)
+    except ValueError:
+        # NaN, Infinity and integers over 64 bits written by the json module
+        return json_decode(byte_str)
+
+
+def ujson_encode(obj):
+    try:
+        return ujson.dumps(obj).encode()
+    except (TypeError, OverflowError):
+        return json_encode(obj)
+
+
+def ujson_decode(byte_str):
+    try:
+        return ujson.loads(bytes(byte_str))
+    except ValueError:
+        return json_decode(byte_str)
+
+
+def json_array_decoder(decode):
+    """
+    Returns a decode_many function parsing a sequence of json documents with
+    a single call to decode, by joining them into one json array.
+    """
+    def decode_many(byte_strs):
+        objs = decode(b'[' + b','.join(byte_strs) + b']')
+        return check_count(objs, byte_strs, decode)
+    return decode_many
+
+
+def check_count(objs, byte_strs, decode):
+    """
+    Returns objs, the objects decoded at once from byte_strs, if there is
+    one per byte string. Otherwise some byte string held zero or several
+    objects, which would shift every following one: the byte strings are
+    decoded one at a time instead, so the bad one fails as it would alone.
+    """
+    if len(objs) == len(byte_strs):
+        return objs
+    return list(map(decode, byte_strs))
+
+
+def each(func):
+    """
+    Returns a function which applies func to each item of a sequence,
+    returning a list of the results. This is the default encode_many and
+    decode_many of codecs without a batch implementation.
+    """
+    def func_many(objs):
+        return list(map(func, objs))
+    return func_many
 
 
 def utf8_encode(obj):
@@ -35,25 +130,93 @@ def binary_decode(byte_str):
 
 
 class MsgPackSerializer:
+    """
+    Serializer using the msgpack library.
+
+    A Packer is created by each thread on first use and reused by its
+    following calls; Packers are not thread safe. Decoding uses
+    msgpack.unpackb, which is the fastest path for a single object;
+    streaming Unpacker objects are only worthwhile when many objects are
+    read from one buffer.
+    """
+
+    # the Packer of each thread
+    _local = threading.local()
 
     def __init__(self):
         self.pack, self.unpack = self.encode, self.decode
 
-    @staticmethod
-    def encode(obj):
-        import msgpack
-        return msgpack.packb(obj, use_bin_type=True)
+    @classmethod
+    def encode(cls, obj):
+        try:
+            packer = cls._local.packer
+        except AttributeError:
+            packer = cls._local.packer = cls.new_packer()
+        return packer.pack(obj)
 
     @staticmethod
     def decode(byte_str):
-        import msgpack
-        return msgpack.unpackb(byte_str, encoding='utf-8')
+        return _msgpack().unpackb(byte_str, raw=False)
+
+    @classmethod
+    def encode_many(cls, objs):
+        return list(map(cls.encode, objs))
+
+    @staticmethod
+    def decode_many(byte_strs):
+        """
+        Decodes all objects with one streaming Unpacker over the concatenated
+        byte strings.
+        """
+        unpacker = _msgpack().Unpacker(raw=False)
+        unpacker.feed(b''.join(byte_strs))
+        return check_count(list(unpacker), byte_strs,
+                           MsgPackSerializer.decode)
+
+    @staticmethod
+    def new_packer():
+        return _msgpack().Packer(use_bin_type=True)
+
+
+def _msgpack():
+    if msgpack is None:
+        raise ImportError("The 'msgpack' value encoding requires the msgpack "
+                          "package to be installed.")
+    return msgpack
+
+
+def fastest_json():
+    """
+    Returns the (encode, decode) pair of the fastest json library installed,
+    falling back to the standard library json module. This is the
+    'fastjson' codec; its output is valid json but not byte-identical to
+    that of the 'json' codec.
+    """
+    if orjson is not None:
+        return orjson_encode, orjson_decode
+    if ujson is not None:
+        return ujson_encode, ujson_decode
+    return json_encode, json_decode
+
+
+def batch_codecs(transform_dict, batch_dict):
+    """
+    Builds the encode_many and decode_many dictionaries of every codec in
+    transform_dict, using the entries of batch_dict where available.
+    """
+    encode_many, decode_many = {}, {}
+    for name, (encode, decode) in transform_dict.items():
+        encode_many[name], decode_many[name] = \
+            batch_dict.get(name, (each(encode), each(decode)))
+    return encode_many, decode_many
 
 
 class Serializer:
 
     transform_dict = {
         'json': (json_encode, json_decode),
+        'stdjson': (json_encode, json_decode),
+        'fastjson': fastest_json(),
         'utf8': (utf8_encode, utf8_decode),
         'utf-8': (utf8_encode, utf8_decode),
         'bin': (binary_encode, binary_decode),
@@ -62,13 +225,74 @@ class Serializer:
         'msgpack': (MsgPackSerializer.encode, MsgPackSerializer.decode)
     }
 
+    # (encode_many, decode_many) of codecs with a batch implementation
+    batch_dict = {
+        'json': (each(json_encode), json_array_decoder(json_decode)),
+        'stdjson': (each(json_encode), json_array_decoder(json_decode)),
+        'fastjson': (each(transform_dict['fastjson'][0]),
+                     json_array_decoder(transform_dict['fastjson'][1])),
+        'msgpack': (MsgPackSerializer.encode_many,
+                    MsgPackSerializer.decode_many),
+    }
+
     encode = {k: v[0] for k, v in transform_dict.items()}
     decode = {k: v[1] for k, v in transform_dict.items()}
 
+    encode_many, decode_many = batch_codecs(transform_dict, batch_dict)
+
     def __init__(self, method='utf-8'):
         self.pack, self.unpack = self.transform_dict[method]
+        self.pack_many = self.encode_many[method]
+        self.unpack_many = self.decode_many[method]
+
+    # codecs with optional dependencies, registered by importing a module of
+    # this package when first requested
+    plugins = {
+        'ndarray': '.ndarray_codec',
+    }
+
+    @classmethod
+    def codec(cls, name):
+        """
+        Returns the (encode, decode, encode_many, decode_many) functions of
+        the codec 'name'. Compressed codecs ('<encoding>+<method>', see the
+        compression module) and plugins are registered on first use.
+        """
+        if name not in cls.transform_dict:
+            if name in cls.plugins:
+                import_module(cls.plugins[name], __package__)
+            elif '+' in name:
+                from .compression import register_compressed
+                register_compressed(name)
+        return (cls.encode[name], cls.decode[name],
+                cls.encode_many[name], cls.decode_many[name])
+
+    @classmethod
+    def register(cls, name, encode, decode, encode_many=None,
+                 decode_many=None):
+        """
+        Add (or replace) the codec 'name', making it immediately available as
+        a value_encoding string. The optional encode_many and decode_many
+        functions take a sequence of objects and return a list; if missing,
+        encode and decode are called on each item.
+        """
+        if not (callable(encode) and callable(decode)):
+            raise TypeError("Serializer codec must be a pair of callables")
+        cls.transform_dict[name] = (encode, decode)
+        cls.encode[name] = encode
+        cls.decode[name] = decode
+
+        if encode_many is None and decode_many is None:
+            cls.batch_dict.pop(name, None)
+        else:
+            cls.batch_dict[name] = (encode_many or each(encode),
+                                    decode_many or each(decode))
+        cls.encode_many[name], cls.decode_many[name] = \
+            cls.batch_dict.get(name, (each(encode), each(decode)))
 
     @classmethod
     def update(cls):
         cls.encode = {k: v[0] for k, v in cls.transform_dict.items()}
         cls.decode = {k: v[1] for k, v in cls.transform_dict.items()}
+        cls.encode_many, cls.decode_many = batch_codecs(cls.transform_dict,
+                                                        cls.batch_dict)
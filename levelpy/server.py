@@ -0,0 +1,247 @@
+#
+# levelpy/server.py
+#
+"""
+A server owning a LevelDB database, serving raw (already prefixed and
+encoded) reads and writes to local processes over a Unix domain socket, as
+only one process may open a LevelDB directory. See levelpy.client for the
+matching RemoteLevelDB, and levelpy.protocol for the framing.
+
+    python -m levelpy serve DB --socket /run/levelpy.sock
+"""
+
+import os
+import stat
+import logging
+import threading
+import socketserver
+from itertools import count, islice
+
+from . import protocol
+from .leveldb_module_shims import (
+    BackendWriteBatch,
+    BackendCompactRange,
+    BackendStats,
+)
+
+log = logging.getLogger(__name__)
+
+
+class RangeCursors:
+    """
+    Open range iterators of a connection, by id. A range is continued on the
+    connection which opened it, and its cursor closed with the connection.
+    """
+
+    def __init__(self):
+        self._iterators = {}
+        self._ids = count(1)
+        self._lock = threading.Lock()
+
+    def open(self, iterator):
+        with self._lock:
+            cursor_id = next(self._ids)
+            self._iterators[cursor_id] = iterator
+        return cursor_id
+
+    def get(self, cursor_id):
+        with self._lock:
+            return self._iterators[cursor_id]
+
+    def close(self, cursor_id):
+        with self._lock:
+            self._iterators.pop(cursor_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._iterators.clear()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """
+    Serves the requests of one connection, in order.
+    """
+
+    def setup(self):
+        super().setup()
+        self.cursors = RangeCursors()
+        self.server.cursors.add(self.cursors)
+
+    def finish(self):
+        self.server.cursors.discard(self.cursors)
+        self.cursors.clear()
+        super().finish()
+
+    def handle(self):
+        while True:
+            frame = protocol.read_frame(self.rfile)
+            if frame is None:
+                return
+            request_id, op, fields = frame
+            try:
+                status, result = self.server.dispatch(op, fields,
+                                                      self.cursors)
+            except KeyError:
+                status, result = protocol.NOT_FOUND, []
+            except Exception as error:
+                log.exception("levelpy server: request %d failed" % op)
+                status, result = protocol.ERROR, [repr(error).encode()]
+            self.wfile.write(protocol.pack_frame(request_id, status, result))
+
+
+class LevelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serves db (a LevelDB) on the Unix socket socket_path, one thread per
+    connection. Ranges are streamed chunk_size items (at most) at a time.
+    The socket is only accessible to the user running the server.
+    """
+
+    daemon_threads = True
+
+    # requests whose handler takes the RangeCursors of the connection first
+    cursor_ops = frozenset([
+        protocol.RANGE_OPEN,
+        protocol.RANGE_NEXT,
+        protocol.RANGE_CLOSE,
+    ])
+
+    def __init__(self, db, socket_path, chunk_size=1000):
+        # replace a stale socket, but no other file
+        try:
+            mode = os.lstat(socket_path).st_mode
+        except FileNotFoundError:
+            pass
+        else:
+            if not stat.S_ISSOCK(mode):
+                raise FileExistsError("%s exists and is not a socket"
+                                      % socket_path)
+            os.unlink(socket_path)
+        # the socket is created with mode 0o600
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, RequestHandler)
+        finally:
+            os.umask(umask)
+        self.db = db
+        self.socket_path = socket_path
+        self.chunk_size = chunk_size
+        # the RangeCursors of the open connections
+        self.cursors = set()
+        self.handlers = {
+            protocol.GET: self.get,
+            protocol.PUT: self.put,
+            protocol.DELETE: self.delete,
+            protocol.GET_MANY: self.get_many,
+            protocol.WRITE: self.write,
+            protocol.RANGE_OPEN: self.range_open,
+            protocol.RANGE_NEXT: self.range_next,
+            protocol.RANGE_CLOSE: self.range_close,
+            protocol.STATS: self.stats,
+            protocol.COMPACT: self.compact,
+        }
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def dispatch(self, op, fields, cursors):
+        """
+        Returns the (status, fields) response of a request of the connection
+        whose range iterators are cursors.
+        """
+        if op in self.cursor_ops:
+            return protocol.OK, self.handlers[op](cursors, *fields)
+        return protocol.OK, self.handlers[op](*fields)
+
+    def get(self, key):
+        return [self.db.Get(key)]
+
+    def put(self, key, value, sync=b'0'):
+        self.db.Put(key, value, sync=sync == b'1')
+        return []
+
+    def delete(self, key, sync=b'0'):
+        self.db.Delete(key, sync=sync == b'1')
+        return []
+
+    def get_many(self, *keys):
+        values = []
+        for key in keys:
+            try:
+                values.append(self.db.Get(key))
+            except KeyError:
+                values.append(None)
+        return values
+
+    def write(self, sync, *ops):
+        batch = BackendWriteBatch(self.db._db)
+        for i in range(0, len(ops), 3):
+            op, key, value = ops[i:i + 3]
+            if op == protocol.BATCH_PUT:
+                batch.Put(key, value)
+            else:
+                batch.Delete(key)
+        self.db.Write(batch, sync == b'1')
+        return []
+
+    def range_open(self, cursors, key_from, key_to, include_value, reverse,
+                   chunk_size):
+        include_value = include_value == b'1'
+        iterator = self.db.RangeIter(key_from=key_from,
+                                     key_to=key_to,
+                                     include_value=include_value,
+                                     reverse=reverse == b'1')
+        if not include_value:
+            iterator = ((key, ) for key in iterator)
+        cursor_id = cursors.open((iterator, int(chunk_size)))
+        return self.range_next(cursors, protocol.pack_int(cursor_id))
+
+    def range_next(self, cursors, cursor_id):
+        """
+        Returns the next chunk of the range: the cursor id (None once the
+        range is exhausted) followed by the keys (and values).
+        """
+        cursor_id = protocol.unpack_int(cursor_id)
+        iterator, chunk_size = cursors.get(cursor_id)
+        chunk = list(islice(iterator, min(chunk_size, self.chunk_size)))
+        fields = [protocol.pack_int(cursor_id)]
+        if len(chunk) < min(chunk_size, self.chunk_size):
+            cursors.close(cursor_id)
+            fields = [None]
+        for item in chunk:
+            fields.extend(item)
+        return fields
+
+    def range_close(self, cursors, cursor_id):
+        cursors.close(protocol.unpack_int(cursor_id))
+        return []
+
+    def stats(self):
+        return [BackendStats(self.db._db).encode()]
+
+    def compact(self, start=None, stop=None):
+        BackendCompactRange(self.db._db, start, stop)
+        return []
+
+
+def serve(db, socket_path, chunk_size=1000):
+    """
+    Serves db on socket_path until interrupted.
+    """
+    with LevelServer(db, socket_path, chunk_size) as server:
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+
+
+def start_server(db, socket_path, chunk_size=1000):
+    """
+    Starts serving db in a daemon thread, returning the LevelServer; call
+    its shutdown() and server_close() methods to stop.
+    """
+    server = LevelServer(db, socket_path, chunk_size)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,231 @@
+#
+# levelpy/sharded.py
+#
+"""
+A LevelDB hash-sharded across several database directories, so writes are
+spread over several logs, memtables and compactions.
+
+Each key is routed to a shard by a stable hash (crc32) of the key, or of the
+part of it returned by a shard key function. Multi-key reads and batches are
+split per shard and run concurrently on a thread pool; batches are atomic
+within each shard only. Range scans merge the ordered scans of every shard.
+"""
+
+import heapq
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from .leveldb import LevelDB
+
+
+def key_component(index, delim=b'!'):
+    """
+    Returns a shard key function routing keys by their component index
+    (split by delim), e.g. key_component(1) shards 'tenants!acme!...' keys by
+    tenant. Keys with fewer components are routed by the whole key.
+    """
+    def shard_key(key):
+        parts = key.split(delim)
+        return parts[index] if index < len(parts) else key
+    return shard_key
+
+
+def merge_ranges(range_iters, include_value=True, reverse=False):
+    """
+    Merges the ordered iterators of several shards into one ordered
+    iterator.
+    """
+    key = (lambda item: item[0]) if include_value else None
+    return heapq.merge(*range_iters, key=key, reverse=reverse)
+
+
+class ShardedWriteBatch:
+    """
+    WriteBatch collecting the operations of each shard in its own batch.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.batches = {}
+
+    def _batch(self, key):
+        shard = self.backend.shard_index(key)
+        try:
+            return self.batches[shard]
+        except KeyError:
+            batch = self.batches[shard] = \
+                self.backend.shards[shard].WriteBatch()
+            return batch
+
+    def Put(self, key, value):
+        self._batch(key).Put(key, value)
+
+    def Delete(self, key):
+        self._batch(key).Delete(key)
+
+
+class ShardedSnapshot:
+    """
+    Snapshots of every shard, taken one after the other (so not at a single
+    point in time across shards).
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.snapshots = [shard.CreateSnapshot() for shard in backend.shards]
+
+    def Get(self, key, **kwargs):
+        return self.snapshots[self.backend.shard_index(key)].Get(key, **kwargs)
+
+    def RangeIter(self, key_from=None, key_to=None, include_value=True,
+                  reverse=False, **kwargs):
+        return merge_ranges([s.RangeIter(key_from=key_from,
+                                         key_to=key_to,
+                                         include_value=include_value,
+                                         reverse=reverse,
+                                         **kwargs)
+                             for s in self.snapshots],
+                            include_value, reverse)
+
+
+class ShardedBackend:
+    """
+    Backend with the interface of py-leveldb's LevelDB over the LevelDB
+    objects shards.
+    """
+
+    def __init__(self, shards, shard_key_fn=None, max_workers=None):
+        self.shards = shards
+        self.shard_key_fn = shard_key_fn
+        self.pool = ThreadPoolExecutor(max_workers or len(shards))
+
+    def shard_index(self, key):
+        if self.shard_key_fn is not None:
+            key = self.shard_key_fn(bytes(key))
+        return zlib.crc32(key) % len(self.shards)
+
+    def shard(self, key):
+        return self.shards[self.shard_index(key)]
+
+    def Get(self, key, **kwargs):
+        return self.shard(key).Get(key, **kwargs)
+
+    def Put(self, key, value, sync=False):
+        self.shard(key).Put(key, value, sync=sync)
+
+    def Delete(self, key, sync=False):
+        self.shard(key).Delete(key, sync=sync)
+
+    def GetMany(self, keys):
+        """
+        Returns the values of keys, read concurrently from each shard.
+        Raises KeyError for a missing key.
+        """
+        groups = {}
+        for i, key in enumerate(keys):
+            groups.setdefault(self.shard_index(key), []).append(i)
+
+        def read(shard_positions):
+            shard, positions = shard_positions
+            return [self.shards[shard].Get(keys[i]) for i in positions]
+
+        values = [None] * len(keys)
+        items = list(groups.items())
+        for (shard, positions), shard_values in zip(items,
+                                                    self.pool.map(read,
+                                                                  items)):
+            for i, value in zip(positions, shard_values):
+                values[i] = value
+        return values
+
+    def WriteBatch(self):
+        return ShardedWriteBatch(self)
+
+    def Write(self, batch, sync=False):
+        """
+        Writes the batch of each shard concurrently.
+        """
+        def write(shard_batch):
+            shard, shard_batch = shard_batch
+            self.shards[shard].Write(shard_batch, sync)
+
+        list(self.pool.map(write, batch.batches.items()))
+
+    def RangeIter(self, key_from=None, key_to=None, include_value=True,
+                  reverse=False, **kwargs):
+        return merge_ranges([shard.RangeIter(key_from=key_from,
+                                             key_to=key_to,
+                                             include_value=include_value,
+                                             reverse=reverse,
+                                             **kwargs)
+                             for shard in self.shards],
+                            include_value, reverse)
+
+    def CreateSnapshot(self):
+        return ShardedSnapshot(self)
+
+    def CompactRange(self, start=None, stop=None):
+        list(self.pool.map(lambda shard: shard.compact(start, stop),
+                           self.shards))
+
+    def GetStats(self):
+        return '\n'.join(shard.GetStats() for shard in self.shards)
+
+    def close(self):
+        self.pool.shutdown()
+        for shard in self.shards:
+            shard.close()
+
+
+class ShardedLevelDB(LevelDB):
+    """
+    A LevelDB hash-sharded across the database directories paths.
+
+    :param shard_key_fn: Function of a (full) key returning the bytes hashed
+        to route it, e.g. key_component(1); by default the whole key.
+
+    :param max_workers: Size of the thread pool running per shard reads and
+        writes (by default, one thread per shard).
+
+    Other arguments are those of LevelDB, used to open each shard.
+    """
+
+    def __init__(self,
+                 paths,
+                 shard_key_fn=None,
+                 leveldb_cls='leveldb.LevelDB',
+                 value_encoding='utf-8',
+                 create_if_missing=False,
+                 max_workers=None,
+                 **db_kwargs):
+        shards = [LevelDB(path,
+                          leveldb_cls,
+                          create_if_missing=create_if_missing,
+                          **db_kwargs)
+                  for path in paths]
+        backend = ShardedBackend(shards, shard_key_fn, max_workers)
+        super().__init__(backend, value_encoding=value_encoding)
+        self.paths = list(paths)
+        self.profile = db_kwargs.get('profile')
+
+    def __copy__(self):
+        """
+        Copy sharing the shards
+        """
+        db = LevelDB.__new__(type(self))
+        LevelDB.__init__(db, self._db, value_encoding=self._get_encoding(None))
+        db.paths, db.profile = self.paths, self.profile
+        return db
+
+    @property
+    def shards(self):
+        return self._db.shards
+
+    def create_snapshot(self):
+        return self._db.CreateSnapshot()
+
+    def close(self):
+        """
+        Stops the thread pool and closes the shards.
+        """
+        self._db.close()
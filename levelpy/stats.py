@@ -0,0 +1,178 @@
+#
+# levelpy/stats.py
+#
+"""
+Structured storage statistics: the compaction table of the backend's stats
+text, disk usage of the sublevels of a database, and their export in the
+Prometheus text format.
+"""
+
+import time
+
+from .leveldb_module_shims import BackendApproximateSize, BackendStats
+
+# columns of the leveldb compaction stats table
+_COLUMNS = ('level', 'files', 'size_mb', 'time_sec', 'read_mb', 'write_mb')
+
+
+def parse_stats(text):
+    """
+    Parses the stats text of leveldb into a dict with the list of 'levels'
+    (files, size and compaction time, read and write in MB of each), their
+    totals, and:
+
+      write_amplification: bytes written by compactions (including memtable
+        flushes to level 0) per byte flushed to level 0.
+      read_amplification: number of table files a point read may consult -
+        every level 0 file plus one per other non-empty level.
+    """
+    levels = []
+    for line in text.splitlines():
+        fields = line.split()
+        if len(fields) != len(_COLUMNS) or not fields[0].isdigit():
+            continue
+        level = dict(zip(_COLUMNS, map(float, fields)))
+        level['level'] = int(level['level'])
+        level['files'] = int(level['files'])
+        levels.append(level)
+
+    stats = {'levels': levels}
+    for column in _COLUMNS[1:]:
+        stats[column] = sum(level[column] for level in levels)
+
+    flushed = sum(level['write_mb'] for level in levels if level['level'] == 0)
+    stats['write_amplification'] = (stats['write_mb'] / flushed
+                                    if flushed else 0.0)
+    stats['read_amplification'] = sum(
+        level['files'] if level['level'] == 0 else 1
+        for level in levels if level['files'])
+    return stats
+
+
+def storage_stats(db):
+    """
+    Returns the parsed stats of the backend database of db.
+    """
+    return parse_stats(BackendStats(db._db))
+
+
+def iter_prefixes(db, delim=b'!'):
+    """
+    Yields the distinct first components (before delim) of the keys of db,
+    seeking past each prefix rather than reading its keys. Keys without a
+    delimiter are skipped.
+    """
+    key_from = None
+    while True:
+        for key in db.RangeIter(key_from=key_from, include_value=False):
+            key = bytes(key)
+            prefix, found, _ = key.partition(delim)
+            if found:
+                yield prefix
+                key_from = prefix + delim + b'\xff' * 8
+            else:
+                key_from = key + b'\x00'
+            break
+        else:
+            return
+
+
+def sublevel_sizes(db, delim=b'!'):
+    """
+    Returns a dict of the approximate disk usage (bytes) of each top level
+    sublevel of db, including its reserved keys.
+    """
+    sizes = {}
+    for prefix in iter_prefixes(db, delim):
+        start = prefix + delim
+        sizes[prefix] = BackendApproximateSize(db._db, start,
+                                               start + b'\xff' * 8)
+    return sizes
+
+
+class SizeReport:
+    """
+    Cache of sublevel_sizes, recomputed when older than max_age seconds.
+    """
+
+    def __init__(self, db, delim=b'!', max_age=300):
+        self.db = db
+        self.delim = delim
+        self.max_age = max_age
+        self.sizes = None
+        self.updated = None
+
+    def refresh(self):
+        self.sizes = sublevel_sizes(self.db, self.delim)
+        self.updated = time.monotonic()
+        return self.sizes
+
+    def get(self):
+        """
+        Returns the (possibly cached) sizes of the sublevels.
+        """
+        if self.sizes is None or \
+                time.monotonic() - self.updated > self.max_age:
+            self.refresh()
+        return self.sizes
+
+    def top(self, n=10):
+        """
+        Returns the n largest sublevels as a list of (prefix, bytes).
+        """
+        sizes = self.get()
+        return sorted(sizes.items(), key=lambda item: -item[1])[:n]
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value))
+                             for name, value in sorted(labels.items()))
+
+
+def _escape(value):
+    if isinstance(value, bytes):
+        value = value.decode('utf8', 'backslashreplace')
+    value = str(value)
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_text(stats, sizes=None, labels=None):
+    """
+    Returns the Prometheus text exposition of storage stats (as returned by
+    parse_stats) and sublevel sizes, with the extra labels on every sample.
+    """
+    labels = dict(labels or {})
+    lines = []
+
+    def metric(name, kind, doc, samples):
+        lines.append('# HELP %s %s' % (name, doc))
+        lines.append('# TYPE %s %s' % (name, kind))
+        for extra, value in samples:
+            lines.append('%s%s %s' % (name, _labels(dict(labels, **extra)),
+                                      repr(float(value))))
+
+    levels = stats['levels']
+    metric('levelpy_level_files', 'gauge', 'Table files per level',
+           [({'level': l['level']}, l['files']) for l in levels])
+    metric('levelpy_level_size_bytes', 'gauge', 'Size of each level',
+           [({'level': l['level']}, l['size_mb'] * 2 ** 20) for l in levels])
+    metric('levelpy_compaction_seconds_total', 'counter',
+           'Time spent compacting', [({}, stats['time_sec'])])
+    metric('levelpy_compaction_read_bytes_total', 'counter',
+           'Bytes read by compactions', [({}, stats['read_mb'] * 2 ** 20)])
+    metric('levelpy_compaction_write_bytes_total', 'counter',
+           'Bytes written by compactions', [({}, stats['write_mb'] * 2 ** 20)])
+    metric('levelpy_write_amplification', 'gauge',
+           'Compaction writes per byte flushed',
+           [({}, stats['write_amplification'])])
+    metric('levelpy_read_amplification', 'gauge',
+           'Table files a point read may consult',
+           [({}, stats['read_amplification'])])
+    if sizes is not None:
+        metric('levelpy_sublevel_size_bytes', 'gauge',
+               'Approximate disk usage of each sublevel',
+               [({'sublevel': prefix}, size)
+                for prefix, size in sorted(sizes.items())])
+    return '\n'.join(lines) + '\n'
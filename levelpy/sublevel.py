@@ -8,6 +8,7 @@ from .db_accessors import (
     LevelWriter,
 )
 from .view import View
+from .handles import handle_of
 
 
 class Sublevel(LevelReader, LevelWriter):
@@ -21,37 +22,156 @@ class Sublevel(LevelReader, LevelWriter):
 
     """
 
+    __slots__ = ('_db', )
+
     def __init__(self, db, prefix, delim='!', value_encoding='utf8'):
         LevelAccessor.__init__(self, prefix, delim, value_encoding)
         self._db = db
+        self._handle = handle_of(db)
+        self._load_compression()
 
     def __copy__(self):
         """
         Simple copy of sublevel - same db, prefix, delimeter, and encoding
         """
         enc = self._get_encoding(None)
-        return Sublevel(self._db, self.prefix, self.delim, enc)
+        sub = Sublevel(self._db, self.prefix, self.delim, enc)
+        sub._accessor_cache = self._accessor_cache
+        return sub
 
     def sublevel(self, key, delim=None, value_encoding=None):
         """
         Return a sublevel of the sublevel
         """
+        delim = self.delim if (delim is None) else delim
+        return self._accessor(Sublevel, key, delim, value_encoding)
+
+    def ttl_sublevel(self, key, default_ttl=None, delim=None,
+                     value_encoding=None):
+        """
+        Return a sublevel of the sublevel whose values expire default_ttl
+        seconds after they are written
+        """
+        from .ttl import TTLSublevel
         prefix = self.key_transform(key)
         delim = self.delim if (delim is None) else delim
         enc = self._get_encoding(value_encoding)
-        return Sublevel(self._db,
-                        prefix,
-                        delim=delim,
-                        value_encoding=enc)
+        return TTLSublevel(self._db,
+                           prefix,
+                           delim=delim,
+                           value_encoding=enc,
+                           default_ttl=default_ttl)
 
     def view(self, key, delim=None, value_encoding=None):
         """
         Return a read-only view of the sublevel
         """
-        prefix = self.key_transform(key)
         delim = self.delim if (delim is None) else delim
-        enc = self._get_encoding(value_encoding)
-        return View(self._db,
-                    prefix,
-                    delim=delim,
-                    value_encoding=enc)
+        return self._accessor(View, key, delim, value_encoding)
+
+    def clear(self, metadata=False, compact=True, background=False,
+              **kwargs):
+        """
+        Deletes every key of this sublevel, returning the number deleted,
+        then compacts the span they occupied. If metadata is true the
+        reserved keys of the sublevel (index entries, aggregate totals,
+        compression dictionary) are deleted too, without updating derived
+        objects. With background, runs in a thread and returns the started
+        levelpy.deletion.RangeDeletion like delete_range. Other keyword
+        arguments are passed to delete_range.
+        """
+        if not metadata:
+            return self.delete_range(compact=compact, background=background,
+                                     **kwargs)
+
+        from .deletion import delete_range, compact_range, RangeDeletion
+
+        start, stop = self._key_prefix, self._span_end
+        kwargs.update(range_iter=self._db.RangeIter,
+                      stop_inclusive=True,
+                      derived=False)
+        if background:
+            deletion = RangeDeletion(self, start, stop, compact,
+                                     on_deleted=self._reset_aggregates,
+                                     **kwargs)
+            deletion.start()
+            return deletion
+
+        deleted = delete_range(self, start, stop, **kwargs)
+        self._reset_aggregates()
+        if compact:
+            compact_range(self, start, stop)
+        return deleted
+
+    def _reset_aggregates(self):
+        """
+        Resets the aggregates of this sublevel and those within it, after
+        their stored totals were deleted.
+        """
+        registry = self._derived_registry()
+        for aggregate in registry.aggregates_within(self._key_prefix):
+            aggregate.reset()
+
+    def write_behind(self, interval=1.0, max_dirty=10000, sync=False,
+                     flush_at_exit=True):
+        """
+        Returns an accessor of this sublevel buffering writes in memory -
+        the latest value of each key - and flushing them in one WriteBatch
+        every interval seconds, when max_dirty keys are dirty, or on flush()
+        and close(). See levelpy.write_behind for the crash semantics.
+        """
+        from .write_behind import WriteBehind
+        return WriteBehind(self, interval, max_dirty, sync, flush_at_exit)
+
+    def add_index(self, name, key_fn):
+        """
+        Adds the secondary index 'name' of the values of this sublevel by
+        key_fn(value), maintained in the same batch as each write of its
+        keys, through any accessor of the database. Returns the Index;
+        values stored before the index was added are indexed by its
+        backfill() method.
+        """
+        from .index import Index
+        index = Index(self, name, key_fn)
+        self._add_derived(index, index=name)
+        return index
+
+    def index(self, name):
+        """
+        Returns the secondary index 'name', for lookups like
+        sub.index('email')['someone@example.com'].
+        """
+        return self._prefix_derived().indexes[name]
+
+    def add_aggregate(self, name, kind='count', field=None, group=None,
+                      flush_interval=0):
+        """
+        Adds the materialized aggregate 'name' of the values of this
+        sublevel - a count, or the sum of field, optionally per group -
+        updated with each write of its keys, through any accessor of the
+        database. Returns the Aggregate; see levelpy.aggregate.Aggregate for
+        the arguments.
+        """
+        from .aggregate import Aggregate
+        aggregate = Aggregate(self, name, kind, field, group, flush_interval)
+        self._add_derived(aggregate, aggregate=name)
+        return aggregate
+
+    def aggregate(self, name):
+        """
+        Returns the aggregate 'name', e.g. sub.aggregate('count').value() or
+        sub.aggregate('per_tenant')['acme'].
+        """
+        return self._prefix_derived().aggregates[name]
+
+    def _prefix_derived(self):
+        return self._derived_registry().of_prefix(self._key_prefix)
+
+    def train_compression(self, sample_size=1000, dict_size=16 * 1024):
+        """
+        Trains a zstd dictionary from a sample of this sublevel's values and
+        stores it in a reserved key; subsequent writes of this object are
+        compressed with it. The value_encoding must be '<encoding>+zstd'.
+        """
+        from .compression import train_dictionary
+        return train_dictionary(self, sample_size, dict_size)
@@ -0,0 +1,178 @@
+#
+# levelpy/transaction.py
+#
+"""
+Optimistic transactions: reads are recorded and writes buffered in a batch;
+at commit the keys touched are locked (striped, in-process locks shared by
+every transaction), the values read are checked to be unchanged, and the
+batch is written. A changed value fails the commit with TransactionConflict
+and the transaction may be retried.
+
+Only transactions take the locks - plain writes of the same keys are not
+serialized with them, although conflicts with such writes are still detected
+if they happen before validation. The values read by scans are validated,
+but not keys inserted into a scanned range after the scan (phantoms), nor
+keys only scanned without their values.
+"""
+
+import time
+import random
+import threading
+from contextlib import contextmanager
+
+from .db_accessors import MISSING
+from .batch_context import BatchContext
+
+
+class TransactionConflict(Exception):
+    """
+    A value read by a transaction was changed before it committed.
+    """
+
+    def __init__(self, key):
+        super().__init__("Value of %r changed during the transaction" % key)
+        self.key = key
+
+
+class LockStripes:
+    """
+    A fixed set of locks, each guarding the keys hashing to it.
+    """
+
+    def __init__(self, count=256):
+        self.locks = [threading.Lock() for _ in range(count)]
+
+    @contextmanager
+    def hold(self, keys):
+        """
+        Holds the locks of keys, acquired in a fixed order to avoid
+        deadlocks.
+        """
+        stripes = sorted({hash(bytes(key)) % len(self.locks) for key in keys})
+        acquired = []
+        try:
+            for stripe in stripes:
+                self.locks[stripe].acquire()
+                acquired.append(stripe)
+            yield
+        finally:
+            for stripe in reversed(acquired):
+                self.locks[stripe].release()
+
+
+class Transaction(BatchContext):
+    """
+    A batch context recording the values it reads, committed only if they
+    are unchanged. Raises TransactionConflict from the with statement
+    otherwise (the batch is then discarded).
+    """
+
+    stripes = LockStripes()
+
+    def __init__(self, db, sync=False):
+        super().__init__(db, sync)
+        self.reads = {}
+
+    def __enter__(self):
+        db = self.BatchDB(self._db, self.pending, self)
+        self._batch_db = db
+        return db
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        if exc_type is not None:
+            return super().__exit__(exc_type, exc_value, exc_tb)
+        with self.stripes.hold(set(self.reads) | set(self.pending.values)):
+            try:
+                self.validate()
+            except TransactionConflict as conflict:
+                super().__exit__(type(conflict), conflict, None)
+                raise
+            super().__exit__(None, None, None)
+
+    def validate(self):
+        """
+        Raises TransactionConflict if a value read has changed.
+        """
+        for key, value in self.reads.items():
+            try:
+                current = bytes(self.stored(key))
+            except KeyError:
+                current = MISSING
+            if current != value:
+                raise TransactionConflict(key)
+
+    def stored(self, key):
+        """
+        Reads the value stored at key, as recorded and validated.
+        """
+        return self._db.Get(key)
+
+    def record(self, key, value):
+        key = bytes(key)
+        if key not in self.reads:
+            self.reads[key] = MISSING if value is MISSING else bytes(value)
+
+    class BatchDB(BatchContext.BatchDB):
+        """
+        Batch accessor recording the values read from the database
+        """
+
+        def __init__(self, db, ctx, transaction):
+            super().__init__(db, ctx)
+            self._transaction = transaction
+
+        def Get(self, key):
+            return self._context.get(key, self._read)
+
+        def _read(self, key):
+            try:
+                value = self._transaction.stored(key)
+            except KeyError:
+                self._transaction.record(key, MISSING)
+                raise
+            self._transaction.record(key, value)
+            return value
+
+        def __contains__(self, key):
+            """
+            A point read, so a key found missing is validated too
+            """
+            try:
+                self.Get(self.key_transform(key))
+            except KeyError:
+                return False
+            return True
+
+        def RangeIter(self, key_from=None, key_to=None, include_value=True,
+                      reverse=False, **kwargs):
+            range_iter = self._db.RangeIter(key_from=key_from,
+                                            key_to=key_to,
+                                            include_value=include_value,
+                                            reverse=reverse,
+                                            **kwargs)
+            if include_value:
+                range_iter = self._recorded(range_iter)
+            return self._context.range(range_iter, key_from, key_to,
+                                       include_value, reverse)
+
+        def _recorded(self, range_iter):
+            for key, value in range_iter:
+                self._transaction.record(key, value)
+                yield key, value
+
+
+def run_transaction(db, fn, retries=10, backoff=0.001, sync=False):
+    """
+    Calls fn with the accessor of a transaction of db and commits it,
+    retrying (up to retries times, after a random exponential backoff
+    starting at backoff seconds) on conflict. Returns the result of fn.
+    """
+    for attempt in range(retries + 1):
+        try:
+            with db.transaction(sync=sync) as txn:
+                result = fn(txn)
+            return result
+        except TransactionConflict:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt) * random.random())
@@ -0,0 +1,459 @@
+#
+# levelpy/ttl.py
+#
+"""
+Sublevels of expiring keys.
+
+Each value is stored after an 8 byte big-endian expiry time (milliseconds
+since the epoch, 0 for values which never expire), and each expiring key has
+an entry - expiry time followed by the key - in a time ordered index under a
+reserved prefix of the sublevel, written in the same batch as the value.
+Expired keys read as missing until a sweep deletes them; sweeps range only
+over the index entries which have expired. The TTLSublevels of a prefix
+share a lock, held by sweeps from reading the expiry of a key until its
+delete is written and by writes from reading the previous expiry until the
+new value is written, so a sweep never deletes a value written meanwhile.
+"""
+
+import time
+import struct
+import asyncio
+import threading
+from collections.abc import Mapping
+
+from .db_accessors import MISSING
+from .iterviews import chunked
+from .sublevel import Sublevel
+from .batch_context import BatchContext
+from .transaction import Transaction
+from .write_behind import WriteBehind
+
+_EXPIRY = struct.Struct('>Q')
+_HEADER_SIZE = _EXPIRY.size
+
+
+def _expiry_of(raw):
+    return _EXPIRY.unpack_from(raw)[0]
+
+
+class ExpiringWriter:
+    """
+    Write methods storing the expiry time of each value and maintaining the
+    expiry index. Classes using it provide _raw_get (a Get ignoring expiry),
+    default_ttl, clock, _expiry_prefix and _write_lock.
+    """
+
+    def _expiry(self, ttl):
+        """
+        Returns the expiry time (ms) of a value written now with ttl seconds
+        to live (the default_ttl if None; 0 if neither is set).
+        """
+        ttl = self.default_ttl if ttl is None else ttl
+        if ttl is None:
+            return 0
+        return int((self.clock() + ttl) * 1000)
+
+    def expiry_key(self, expires, key):
+        return self._expiry_prefix + _EXPIRY.pack(expires) + key
+
+    def put(self, key, value, ttl=None):
+        """
+        Stores value at key, expiring after ttl seconds (by default the
+        default_ttl of the sublevel).
+        """
+        key = self.key_transform(key)
+        self._write_encoded([(key, self.value_encode(value))], [value], ttl)
+
+    def put_many(self, items, chunk_size=None, ttl=None):
+        """
+        Stores many key-value pairs, all expiring after ttl seconds. See
+        LevelWriter.put_many.
+        """
+        if isinstance(items, Mapping):
+            items = items.items()
+        for chunk in chunked(items, chunk_size or self.put_many_chunk_size):
+            keys, values = zip(*chunk)
+            keys = map(self.key_transform, keys)
+            self._write_encoded(zip(keys, self.value_encode_many(values)),
+                                values, ttl)
+
+    def _write_encoded(self, pairs, values=None, ttl=None):
+        expires = self._expiry(ttl)
+        header = _EXPIRY.pack(expires)
+        with self._write_lock():
+            batch = self.WriteBatch()
+            for key, value in self._prepare_derived(batch, pairs, values):
+                self._unindex(batch, key)
+                if expires:
+                    batch.Put(self.expiry_key(expires, key), b'')
+                batch.Put(key, header + value)
+            self._write_batch(batch)
+
+    def __delitem__(self, key):
+        key = self.key_transform(key)
+        with self._write_lock():
+            batch = self.WriteBatch()
+            if self._derived:
+                self._update_derived(batch, [key], [MISSING])
+            self._unindex(batch, key)
+            batch.Delete(key)
+            self._write_batch(batch)
+
+    def _add_deletes(self, batch, keys):
+        """
+        Deletes the expiry index entries of keys along with them.
+        """
+        for key in keys:
+            self._unindex(batch, key)
+            batch.Delete(key)
+
+    def _unindex(self, batch, key):
+        """
+        Deletes the expiry index entry of the value stored at key (if any).
+        """
+        try:
+            expires = _expiry_of(self._raw_get(key))
+        except KeyError:
+            return
+        if expires:
+            batch.Delete(self.expiry_key(expires, key))
+
+    def _stored_values(self, keys):
+        """
+        Previous values include expired values not yet swept, which are
+        still counted by derived objects.
+        """
+        stored = []
+        for key in keys:
+            try:
+                stored.append(self._raw_get(key)[_HEADER_SIZE:])
+            except KeyError:
+                stored.append(None)
+        return stored
+
+
+class ExpiringReader:
+    """
+    Read methods hiding expired values and the expiry time of values.
+    Classes using it provide _raw_get and _raw_range (reads of the stored
+    values) and clock.
+    """
+
+    def _reserved_get(self, key):
+        """
+        Reserved keys (of derived objects) are stored without expiry.
+        """
+        return self._raw_get(key)
+
+    def _reserved_range(self, **kwargs):
+        return self._raw_range(**kwargs)
+
+    def _now(self):
+        return int(self.clock() * 1000)
+
+    def Get(self, key):
+        raw = self._raw_get(key)
+        expires = _expiry_of(raw)
+        if expires and expires <= self._now():
+            raise KeyError(key)
+        return raw[_HEADER_SIZE:]
+
+    def _get_raw_many(self, keys):
+        return [self.Get(key) for key in keys]
+
+    def RangeIter(self, key_from=None, key_to=None, include_value=True,
+                  **kwargs):
+        """
+        Iterates over the unexpired keys (and values, without their expiry)
+        of the range.
+        """
+        now = self._now()
+        range_iter = self._raw_range(key_from=key_from,
+                                     key_to=key_to,
+                                     include_value=True,
+                                     **kwargs)
+        for key, raw in range_iter:
+            expires = _expiry_of(raw)
+            if expires and expires <= now:
+                continue
+            if include_value:
+                yield key, raw[_HEADER_SIZE:]
+            else:
+                yield key
+
+
+class TTLBatchContext(BatchContext):
+    """
+    Batch context of a TTLSublevel
+    """
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        with self._db._write_lock():
+            return super().__exit__(exc_type, exc_value, exc_tb)
+
+    class BatchDB(ExpiringReader, ExpiringWriter, BatchContext.BatchDB):
+
+        def __init__(self, db, ctx, *args):
+            super().__init__(db, ctx, *args)
+            self.default_ttl = db.default_ttl
+            self.clock = db.clock
+            self._expiry_prefix = db._expiry_prefix
+
+        def _raw_get(self, key):
+            return self._context.get(key, self._db._raw_get)
+
+        def _write_lock(self):
+            return self._db._write_lock()
+
+        def _raw_range(self, key_from=None, key_to=None, include_value=True,
+                       reverse=False, **kwargs):
+            range_iter = self._db._raw_range(key_from=key_from,
+                                             key_to=key_to,
+                                             include_value=include_value,
+                                             reverse=reverse,
+                                             **kwargs)
+            return self._context.range(range_iter, key_from, key_to,
+                                       include_value, reverse)
+
+        def write_batch(self):
+            return TTLBatchContext(self)
+
+
+class TTLTransaction(Transaction):
+    """
+    Transaction of a TTLSublevel, recording and validating the stored values
+    with their expiry. Holds the write lock of the sublevel while validating
+    and writing.
+    """
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        with self._db._write_lock():
+            return super().__exit__(exc_type, exc_value, exc_tb)
+
+    def stored(self, key):
+        return self._db._raw_get(key)
+
+    class BatchDB(TTLBatchContext.BatchDB, Transaction.BatchDB):
+
+        def _raw_get(self, key):
+            return self._context.get(key, self._read)
+
+        def _raw_range(self, key_from=None, key_to=None, include_value=True,
+                       reverse=False, **kwargs):
+            range_iter = self._db._raw_range(key_from=key_from,
+                                             key_to=key_to,
+                                             include_value=include_value,
+                                             reverse=reverse,
+                                             **kwargs)
+            if include_value:
+                range_iter = self._recorded(range_iter)
+            return self._context.range(range_iter, key_from, key_to,
+                                       include_value, reverse)
+
+
+class TTLWriteBehind(ExpiringReader, ExpiringWriter, WriteBehind):
+    """
+    Write-behind buffer of a TTLSublevel, buffering values with their
+    expiry and the changes of the expiry index. Flushes hold the write lock
+    of the sublevel.
+    """
+
+    def __init__(self, sub, *args):
+        self.default_ttl = sub.default_ttl
+        self.clock = sub.clock
+        self._expiry_prefix = sub._expiry_prefix
+        super().__init__(sub, *args)
+
+    def _raw_get(self, key):
+        return self._context.get(key, self._stored)
+
+    def _raw_range(self, **kwargs):
+        return WriteBehind.RangeIter(self, **kwargs)
+
+    def _sub_get(self, key):
+        return self._db._raw_get(key)
+
+    def _sub_range(self, **kwargs):
+        return self._db._raw_range(**kwargs)
+
+    def _write_lock(self):
+        return self._db._write_lock()
+
+    def write_batch(self):
+        return TTLBatchContext(self)
+
+    def _write(self, latest):
+        with self._write_lock():
+            super()._write(latest)
+
+    def _derived_values(self, latest):
+        """
+        The expiry index entries do not update derived objects, and values
+        are decoded without their expiry.
+        """
+        sub = self._db
+        expiry = self._expiry_prefix
+        keys = [key for key in latest if not key.startswith(expiry)]
+        values = [MISSING if latest[key] is MISSING
+                  else sub.value_decode(latest[key][_HEADER_SIZE:])
+                  for key in keys]
+        return keys, values
+
+
+class TTLSublevel(ExpiringReader, ExpiringWriter, Sublevel):
+    """
+    A sublevel whose values expire default_ttl seconds (or the ttl given to
+    put) after they are written; values written without either never expire.
+    Expired values read as missing and are deleted by sweep(), or in the
+    background by start_sweeper().
+    """
+
+    # function returning the current time in seconds
+    clock = staticmethod(time.time)
+
+    def __init__(self, db, prefix, delim='!', value_encoding='utf8',
+                 default_ttl=None):
+        super().__init__(db, prefix, delim, value_encoding)
+        self.default_ttl = default_ttl
+        self._expiry_prefix = self.reserved_key('expiry')
+
+    def __copy__(self):
+        enc = self._get_encoding(None)
+        return TTLSublevel(self._db, self.prefix, self.delim, enc,
+                           self.default_ttl)
+
+    def _raw_get(self, key):
+        return self._db.Get(key)
+
+    def _raw_range(self, **kwargs):
+        return self._db.RangeIter(**kwargs)
+
+    def _write_lock(self):
+        """
+        Returns the lock shared by the TTLSublevels of this prefix.
+        """
+        return self._derived_registry().shared(('ttl', self._key_prefix),
+                                               threading.RLock)
+
+    def write_batch(self):
+        return TTLBatchContext(self)
+
+    def delete_range(self, start=None, stop=None, **kwargs):
+        """
+        Deletes the keys (expired or not) from start up to stop with their
+        expiry index entries. See LevelWriter.delete_range.
+        """
+        return super().delete_range(start, stop, range_iter=self._raw_range,
+                                    **kwargs)
+
+    def transaction(self, fn=None, retries=10, backoff=0.001, sync=False):
+        """
+        Returns a TTLTransaction, or runs fn in one; see
+        LevelWriter.transaction.
+        """
+        from .transaction import run_transaction
+        if fn is None:
+            return TTLTransaction(self, sync)
+        return run_transaction(self, fn, retries, backoff, sync)
+
+    def write_behind(self, interval=1.0, max_dirty=10000, sync=False,
+                     flush_at_exit=True):
+        """
+        Returns a TTLWriteBehind buffer of this sublevel; see
+        Sublevel.write_behind.
+        """
+        return TTLWriteBehind(self, interval, max_dirty, sync, flush_at_exit)
+
+    def expires_at(self, key):
+        """
+        Returns the time (seconds since the epoch) the value at key expires,
+        or None if it never does.
+        """
+        expires = _expiry_of(self._raw_get(self.key_transform(key)))
+        return expires / 1000 if expires else None
+
+    def sweep(self, chunk_size=10000, limit=None):
+        """
+        Deletes expired keys, chunk_size per WriteBatch, returning the number
+        deleted. Stops after limit keys if given.
+        """
+        now = self._now()
+        skip = len(self._expiry_prefix) + _HEADER_SIZE
+        stop = self._expiry_prefix + _EXPIRY.pack(now)
+        entries = self._db.RangeIter(key_from=self._expiry_prefix,
+                                     key_to=stop,
+                                     include_value=False)
+        deleted = 0
+        for chunk in chunked(entries, chunk_size):
+            with self._write_lock():
+                deleted += self._sweep_entries(chunk, skip)
+            if limit is not None and deleted >= limit:
+                break
+        return deleted
+
+    def _sweep_entries(self, entries, skip):
+        """
+        Deletes the expiry index entries, and their keys unless overwritten,
+        in one batch; returns the number of keys deleted.
+        """
+        batch = self.WriteBatch()
+        keys = []
+        for entry in entries:
+            entry = bytes(entry)
+            key = entry[skip:]
+            batch.Delete(entry)
+            try:
+                raw = self._raw_get(key)
+            except KeyError:
+                continue
+            # an overwritten key has a new expiry (and index entry)
+            if _expiry_of(raw) == _expiry_of(entry[skip - _HEADER_SIZE:]):
+                keys.append(key)
+        if keys and self._derived:
+            self._update_derived(batch, keys, [MISSING] * len(keys))
+        for key in keys:
+            batch.Delete(key)
+        self._write_batch(batch)
+        return len(keys)
+
+    def start_sweeper(self, interval=1.0, chunk_size=10000):
+        """
+        Starts and returns a Sweeper thread sweeping every interval seconds.
+        """
+        sweeper = Sweeper(self, interval, chunk_size)
+        sweeper.start()
+        return sweeper
+
+    async def sweep_forever(self, interval=1.0, chunk_size=10000):
+        """
+        Coroutine sweeping every interval seconds, in the default executor
+        of the running loop, until cancelled.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await loop.run_in_executor(None, self.sweep, chunk_size)
+            await asyncio.sleep(interval)
+
+
+class Sweeper(threading.Thread):
+    """
+    Daemon thread sweeping a TTLSublevel every interval seconds until
+    stop() is called.
+    """
+
+    def __init__(self, sublevel, interval=1.0, chunk_size=10000):
+        super().__init__(daemon=True)
+        self.sublevel = sublevel
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.deleted = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            self.deleted += self.sublevel.sweep(self.chunk_size)
+            self._stop_event.wait(self.interval)
+
+    def stop(self, timeout=None):
+        self._stop_event.set()
+        self.join(timeout)
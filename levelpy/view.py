@@ -6,6 +6,7 @@ Provides a read-only object accessing a database or sublevel
 """
 
 from .db_accessors import LevelReader
+from .handles import handle_of
 
 
 class View(LevelReader):
@@ -14,27 +15,26 @@ class View(LevelReader):
     (or a sublevel)
     """
 
+    __slots__ = ('_db', )
+
     def __init__(self, db, prefix='', delim='!', value_encoding='utf-8'):
         super().__init__(prefix, delim, value_encoding)
         self._db = db
+        self._handle = handle_of(db)
+        self._load_compression()
 
     def __copy__(self):
         """
         Simple copy of view - same db, prefix, delimeter, and encoding
         """
         enc = self._get_encoding(None)
-        return View(self._db, self.prefix, self.delim, enc)
+        view = View(self._db, self.prefix, self.delim, enc)
+        view._accessor_cache = self._accessor_cache
+        return view
 
     def view(self, key, delim=None, value_encoding=None):
         """
         Return a subview of this view
         """
-        prefix = self.key_transform(key)
         delim = self.delim if (delim is None) else delim
-        enc = self._get_encoding(value_encoding)
-
-        return View(self._db,
-                    prefix,
-                    delim=delim,
-                    value_encoding=enc,
-                    )
+        return self._accessor(View, key, delim, value_encoding)
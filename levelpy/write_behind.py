@@ -0,0 +1,219 @@
+#
+# levelpy/write_behind.py
+#
+"""
+Write-behind buffering of a sublevel: writes only update the latest value
+of each key in memory (reads see them), and the dirty keys are written in
+one WriteBatch periodically, when too many are dirty, or on flush() and
+close() - so a key overwritten many times between flushes is written once.
+
+Writes not yet flushed are lost if the process crashes: at most the last
+interval seconds, or max_dirty keys, of writes. With flush_at_exit the
+buffer is flushed when the interpreter exits normally (buffers holding
+dirty keys are kept alive until flushed), and with sync each flush is
+synced to disk.
+"""
+
+import atexit
+import logging
+import threading
+
+from .db_accessors import MISSING
+from .batch_context import BatchContext, PendingWrites
+
+log = logging.getLogger(__name__)
+
+# the buffers flushed at exit holding dirty keys, kept alive until flushed
+_dirty_buffers = set()
+
+
+class DirtyKeys(PendingWrites):
+    """
+    The latest value (MISSING if deleted) of each key written since the last
+    flush, in key order.
+    """
+
+    def __init__(self):
+        super().__init__(None)
+
+    def Put(self, key, value):
+        self._record(key, value)
+
+    def Delete(self, key):
+        self._record(key, MISSING)
+
+
+class WriteBehind(BatchContext.BatchDB):
+    """
+    Accessor of the sublevel sub buffering its writes, flushed every
+    interval seconds (by a background thread, unless interval is None) and
+    whenever max_dirty keys are dirty.
+    """
+
+    def __init__(self, sub, interval=1.0, max_dirty=10000, sync=False,
+                 flush_at_exit=True):
+        super().__init__(sub, DirtyKeys())
+        # derived objects are updated with the final values when flushing
+        self._derived = ()
+        self.interval = interval
+        self.max_dirty = max_dirty
+        self.sync = sync
+        self.flush_at_exit = flush_at_exit
+        self._flushing = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        if interval is not None:
+            self._thread = threading.Thread(target=self._flush_periodically,
+                                            daemon=True,
+                                            name='levelpy-write-behind')
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    def __len__(self):
+        """
+        Number of dirty keys
+        """
+        return len(self._context.values)
+
+    def Get(self, key):
+        return self._context.get(key, self._stored)
+
+    def _stored(self, key):
+        flushing = self._flushing
+        if flushing is not None:
+            return flushing.get(key, self._sub_get)
+        return self._sub_get(key)
+
+    def _sub_get(self, key):
+        return self._db.Get(key)
+
+    def _sub_range(self, **kwargs):
+        return self._db.RangeIter(**kwargs)
+
+    def RangeIter(self, key_from=None, key_to=None, include_value=True,
+                  reverse=False, **kwargs):
+        range_iter = self._sub_range(key_from=key_from,
+                                     key_to=key_to,
+                                     include_value=include_value,
+                                     reverse=reverse,
+                                     **kwargs)
+        for pending in (self._flushing, self._context):
+            if pending is not None:
+                range_iter = pending.range(range_iter, key_from, key_to,
+                                           include_value, reverse)
+        return range_iter
+
+    def Put(self, key, value):
+        with self._lock:
+            self._context.Put(key, value)
+            self._dirtied()
+        self._check_size()
+
+    def Delete(self, key):
+        with self._lock:
+            self._context.Delete(key)
+            self._dirtied()
+        self._check_size()
+
+    def _dirtied(self):
+        if self.flush_at_exit:
+            _dirty_buffers.add(self)
+
+    def WriteBatch(self):
+        """
+        Writes made through batches are buffered like the others
+        """
+        return self
+
+    def _write_batch(self, batch, sync=False):
+        self._check_size()
+
+    def _check_size(self):
+        if len(self._context.values) >= self.max_dirty:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the dirty keys in one WriteBatch, returning their number. If
+        the write fails, the keys stay dirty.
+        """
+        with self._flush_lock:
+            with self._lock:
+                dirty = self._flushing = self._context
+                self._context = DirtyKeys()
+            try:
+                if dirty.values:
+                    self._write(dirty.values)
+            except BaseException:
+                with self._lock:
+                    for key in dirty.values:
+                        if key not in self._context.values:
+                            self._context._record(key, dirty.values[key])
+                raise
+            finally:
+                self._flushing = None
+            with self._lock:
+                if not self._context.values:
+                    _dirty_buffers.discard(self)
+            return len(dirty.values)
+
+    def _write(self, latest):
+        sub = self._db
+        batch = sub.WriteBatch()
+        if sub._derived:
+            sub._update_derived(batch, *self._derived_values(latest))
+        for key, value in latest.items():
+            if value is MISSING:
+                batch.Delete(key)
+            else:
+                batch.Put(key, value)
+        sub._write_batch(batch, self.sync)
+
+    def _derived_values(self, latest):
+        """
+        Returns the keys of latest updating derived objects, and their
+        decoded values (MISSING if deleted).
+        """
+        sub = self._db
+        values = [MISSING if value is MISSING else sub.value_decode(value)
+                  for value in latest.values()]
+        return list(latest), values
+
+    def _flush_periodically(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                # the keys stay dirty, and are retried at the next interval
+                log.exception("write-behind flush failed")
+
+    def close(self):
+        """
+        Stops the flushing thread and flushes the dirty keys.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+def _flush_all():
+    """
+    Flushes the buffers opened with flush_at_exit holding dirty keys.
+    """
+    for buffer in list(_dirty_buffers):
+        try:
+            buffer.flush()
+        except Exception:
+            log.exception("write-behind flush at exit failed")
+
+
+atexit.register(_flush_all)
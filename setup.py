@@ -15,6 +15,10 @@ REQUIRES = [
 ]
 
 OPTIONAL_REQUIRES = {
+    'numpy': ['numpy'],
+    'pandas': ['numpy', 'pandas'],
+    'zstd': ['zstandard'],
+    'lz4': ['lz4'],
 }
 
 TESTS_REQUIRE = [
@@ -15,3 +15,10 @@ def leveldir(request):
     path = tempfile.mkdtemp(prefix='levelpy-test-')
     request.addfinalizer(lambda: shutil.rmtree(path))
     return path
+
+
+@pytest.fixture
+def db(leveldir):
+    pytest.importorskip('leveldb')
+    from levelpy.leveldb import LevelDB
+    return LevelDB(leveldir, 'leveldb.LevelDB', create_if_missing=True)
@@ -0,0 +1,165 @@
+#
+# tests/test_aggregate.py
+#
+
+import json
+import threading
+from unittest import mock
+
+import pytest
+from fixtures import leveldir, db                                        # noqa
+
+
+@pytest.fixture
+def orders(db):
+    sub = db.sublevel('orders', value_encoding='json')
+    sub.add_aggregate('count')
+    sub.add_aggregate('total', 'sum', field='amount')
+    sub.add_aggregate('per_tenant', group='tenant')
+    return sub
+
+
+def test_aggregates_follow_writes(orders):
+    orders['1'] = {'tenant': 'a', 'amount': 5}
+    orders['2'] = {'tenant': 'b', 'amount': 2.5}
+    orders.put_many([('3', {'tenant': 'a', 'amount': 1})])
+    assert orders.aggregate('count').value() == 3
+    assert orders.aggregate('total').value() == 8.5
+    assert orders.aggregate('per_tenant')['a'] == 2
+
+    orders['1'] = {'tenant': 'b', 'amount': 1}
+    del orders['2']
+    assert orders.aggregate('count').value() == 2
+    assert orders.aggregate('total').value() == 2
+    assert orders.aggregate('per_tenant').groups() == {b'a': 1, b'b': 1}
+
+
+def test_aggregates_are_stored(db, orders):
+    orders['1'] = {'tenant': 'a', 'amount': 5}
+    orders['2'] = {'tenant': 'a', 'amount': 5}
+    reopened = db.sublevel('orders', value_encoding='json')
+    assert reopened.add_aggregate('per_tenant', group='tenant')['a'] == 2
+    assert reopened.add_aggregate('total', 'sum', field='amount').value() == 10
+
+
+def test_aggregates_in_write_batch(orders):
+    with orders.write_batch() as batch:
+        batch['1'] = {'tenant': 'a', 'amount': 1}
+        batch['2'] = {'tenant': 'a', 'amount': 1}
+    assert orders.aggregate('per_tenant')['a'] == 2
+
+    with pytest.raises(RuntimeError):
+        with orders.write_batch() as batch:
+            batch['3'] = {'tenant': 'a', 'amount': 1}
+            raise RuntimeError
+    assert orders.aggregate('per_tenant')['a'] == 2
+
+
+def test_aggregate_flush_interval(db):
+    sub = db.sublevel('events', value_encoding='json')
+    count = sub.add_aggregate('count', flush_interval=3600)
+    sub['1'] = sub['2'] = {}
+    assert count.value() == 2
+
+    reopened = db.sublevel('events', value_encoding='json')
+    assert reopened.add_aggregate('count').value() == 0
+    count.flush()
+    assert reopened.add_aggregate('count').value() == 2
+
+
+def test_aggregate_rebuild(db):
+    sub = db.sublevel('events', value_encoding='json')
+    sub.put_many((str(i), {'kind': 'x' if i % 3 else 'y'}) for i in range(9))
+    kinds = sub.add_aggregate('kinds', group='kind')
+    assert kinds['x'] == 0
+    kinds.rebuild()
+    assert kinds.groups() == {b'x': 6, b'y': 3}
+
+
+def test_aggregate_bad_kind(orders):
+    with pytest.raises(ValueError):
+        orders.add_aggregate('avg', 'mean')
+    with pytest.raises(ValueError):
+        orders.add_aggregate('sum', 'sum')
+
+
+def test_aggregates_maintained_by_other_accessors(db, orders):
+    db.sublevel('orders', value_encoding='json')['1'] = {'tenant': 'a',
+                                                         'amount': 2}
+    db.put('orders!2', '{"tenant": "a", "amount": 3}')
+    count = db.sublevel('orders').aggregate('count')
+    assert count is orders.aggregate('count')
+    assert count.value() == 2
+    assert orders.aggregate('total').value() == 5
+    assert orders.aggregate('per_tenant')['a'] == 2
+
+
+def test_aggregate_failed_write(db, orders):
+    failures = [RuntimeError('write failed')]
+
+    def fail_once(records):
+        if failures:
+            raise failures.pop()
+
+    orders.add_write_hook(fail_once, pre=True)
+    with pytest.raises(RuntimeError):
+        orders['1'] = {'tenant': 'a', 'amount': 5}
+    assert '1' not in orders
+    assert orders.aggregate('count').value() == 0
+    orders['2'] = {'tenant': 'a', 'amount': 5}
+    assert orders.aggregate('count').value() == 1
+    assert db.sublevel('orders').aggregate('count').value() == 1
+    assert json.loads(db.Get(orders.reserved_key('aggregate!count') +
+                             b'\x00')) == 1
+
+
+def test_aggregate_concurrent_writes(db, orders):
+    def write(n):
+        for i in range(50):
+            orders['%d-%d' % (n, i)] = {'tenant': 'a', 'amount': 1}
+
+    threads = [threading.Thread(target=write, args=(n, )) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert orders.aggregate('count').value() == 200
+    stored = db.Get(orders.reserved_key('aggregate!count') + b'\x00')
+    assert json.loads(stored) == 200
+
+
+def test_aggregate_concurrent_writes_of_a_key(db, orders):
+    # each writer waits (a while) for the other to read the previous value
+    barrier = threading.Barrier(2)
+    read = type(orders)._stored_values
+
+    def stored_values(self, keys):
+        stored = read(self, keys)
+        try:
+            barrier.wait(timeout=0.5)
+        except threading.BrokenBarrierError:
+            pass
+        return stored
+
+    def write(amount):
+        orders['1'] = {'tenant': 'a', 'amount': amount}
+
+    threads = [threading.Thread(target=write, args=(n, )) for n in (1, 2)]
+    with mock.patch.object(type(orders), '_stored_values', stored_values):
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert orders.aggregate('count').value() == 1
+    assert orders.aggregate('total').value() == orders['1']['amount']
+
+
+def test_aggregate_failed_update(orders):
+    with pytest.raises(KeyError):
+        orders['1'] = {'tenant': 'a'}
+    writer = threading.Thread(target=orders.put,
+                              args=('2', {'tenant': 'a', 'amount': 1}))
+    writer.start()
+    writer.join(5)
+    assert not writer.is_alive()
+    assert orders.aggregate('count').value() == 1
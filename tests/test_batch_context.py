@@ -7,6 +7,7 @@ from unittest import mock
 import levelpy.batch_context
 import levelpy.leveldb
 from warnings import warn
+from fixtures import leveldir                                            # noqa
 
 
 @pytest.fixture
@@ -22,6 +23,8 @@ def mock_db(mock_write_batch):
     db.Write = mock.Mock()
     db.encode = lambda x: x
     db.decode = lambda x: x
+    db.encode_many = list
+    db.decode_many = list
     return db
 
 
@@ -79,5 +82,71 @@ def test_sync_works(mock_db):
 
 
 def test_write_batch(batchdb, mock_write_batch, mock_db):
-    with pytest.raises(RuntimeError):
-        s = batchdb.write_batch()
+    nested = batchdb.write_batch()
+    assert nested.nested
+    with nested as inner:
+        inner.Put(b'foo', b'bar')
+    mock_write_batch.Put.assert_called_with(b'foo', b'bar')
+    assert not mock_db.Write.called
+
+
+def test_pending_writes_merge():
+    batch = mock.Mock()
+    pending = levelpy.batch_context.PendingWrites(batch)
+    pending.Put(b'b', b'2')
+    pending.Put(b'd', b'4')
+    pending.Delete(b'c')
+    assert pending.get(b'b', None) == b'2'
+    with pytest.raises(KeyError):
+        pending.get(b'c', None)
+    assert pending.get(b'a', lambda key: b'stored') == b'stored'
+    stored = [(b'a', b'1'), (b'c', b'3'), (b'd', b'x'), (b'e', b'5')]
+    assert list(pending.range(iter(stored))) == [
+        (b'a', b'1'), (b'b', b'2'), (b'd', b'4'), (b'e', b'5')]
+    assert list(pending.range(iter([b'd', b'c', b'a']), key_to=b'd',
+                              include_value=False, reverse=True)) == \
+        [b'd', b'b', b'a']
+    pending.Put(b'a0', b'0')
+    assert list(pending.range(iter([]), include_value=False)) == \
+        [b'a0', b'b', b'd']
+    assert batch.Put.call_count == 3 and batch.Delete.call_count == 1
+
+
+def test_batch_reads_its_writes(leveldir):
+    pytest.importorskip('leveldb')
+    db = levelpy.leveldb.LevelDB(leveldir, create_if_missing=True)
+    sub = db.sublevel('s', value_encoding='json')
+    sub.put_many({'a': 1, 'c': 3})
+    with sub.write_batch() as batch:
+        batch['b'] = 2
+        del batch['c']
+        batch['a'] = batch['a'] + 10
+        assert batch['b'] == 2
+        assert 'c' not in batch
+        assert [v for v in batch.values()] == [11, 2]
+        assert batch.get_many(['a', 'b']) == [11, 2]
+        assert [v for v in sub.values()] == [1, 3]
+    assert [v for v in sub.values()] == [11, 2]
+
+
+def test_nested_batches(leveldir):
+    pytest.importorskip('leveldb')
+    db = levelpy.leveldb.LevelDB(leveldir, create_if_missing=True)
+    sub = db.sublevel('s', value_encoding='json')
+    count = sub.add_aggregate('count')
+    with sub.write_batch() as outer:
+        outer['a'] = 1
+        with outer.write_batch() as inner:
+            inner['b'] = 2
+            assert inner['a'] == 1
+            assert [v for v in outer.values()] == [1]
+        assert outer['b'] == 2
+        with pytest.raises(ValueError):
+            with outer.write_batch() as inner:
+                inner['c'] = 3
+                del inner['a']
+                raise ValueError
+        assert 'c' not in outer and outer['a'] == 1
+        assert [v for v in sub.values()] == []
+    assert [v for v in sub.values()] == [1, 2]
+    assert count.value() == 2
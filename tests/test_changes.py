@@ -0,0 +1,190 @@
+#
+# tests/test_changes.py
+#
+
+import pytest
+import threading
+from fixtures import leveldir, db                                        # noqa
+
+
+@pytest.fixture
+def users(db):
+    return db.sublevel('users', value_encoding='json')
+
+
+def test_write_hooks_receive_batches(users):
+    seen = []
+    users.add_write_hook(seen.append)
+    users['a'] = {'n': 1}
+    users.put_many([('b', 2), ('c', 3)])
+    del users['a']
+    assert seen == [
+        [('put', b'users!a', {'n': 1})],
+        [('put', b'users!b', 2), ('put', b'users!c', 3)],
+        [('delete', b'users!a', None)],
+    ]
+
+
+def test_pre_write_hook_runs_before_write(users):
+    seen = []
+    users.add_write_hook(lambda records: seen.append('a' in users), pre=True)
+    users['a'] = 1
+    assert seen == [False]
+
+
+def test_write_hooks_in_batch(users):
+    seen, batch_seen = [], []
+    users.add_write_hook(seen.append)
+    with users.write_batch() as batch:
+        batch.add_write_hook(batch_seen.append)
+        batch['a'] = 1
+        batch['b'] = 2
+        assert seen == []
+    assert seen == batch_seen == [[('put', b'users!a', 1),
+                                   ('put', b'users!b', 2)]]
+
+    with pytest.raises(RuntimeError):
+        with users.write_batch() as batch:
+            batch['c'] = 3
+            raise RuntimeError
+    assert len(seen) == 1
+
+    users['d'] = 4
+    assert len(batch_seen) == 1
+
+
+def test_change_log(db, users):
+    log = users.add_change_log(db.sublevel('changes'))
+    users['a'] = {'n': 1}
+    users['b'] = {'n': 2}
+    del users['a']
+
+    cursor = log.cursor()
+    changes = list(cursor)
+    assert [c.sequence for c in changes] == [1, 2, 3]
+    assert changes[0].op == 'put' and changes[0].value == {'n': 1}
+    assert changes[2] == (3, 'delete', b'users!a', None)
+    assert cursor.position == 3
+
+    users['c'] = {'n': 3}
+    assert [c.key for c in cursor] == [b'users!c']
+
+
+def test_change_log_sequence_continues(db, users):
+    users.add_change_log(db.sublevel('changes'))
+    users['a'] = 1
+    other = db.sublevel('users', value_encoding='json')
+    log = other.add_change_log(db.sublevel('changes'))
+    assert log.last_sequence == 1
+    other['b'] = 2
+    assert [c.sequence for c in log.cursor()] == [1, 2]
+
+
+def test_change_log_named_cursor_and_trim(db, users):
+    log = users.add_change_log(db.sublevel('changes'))
+    users.put_many((str(i), i) for i in range(5))
+    cursor = log.cursor(name='indexer')
+    assert len(cursor.read(limit=3)) == 3
+    cursor.save()
+    assert log.cursor(name='indexer').position == 3
+
+    log.trim(3)
+    assert [c.sequence for c in log.cursor()] == [4, 5]
+    with pytest.raises(ValueError):
+        log.cursor().save()
+
+
+def test_change_log_trimmed_sequence(db, users):
+    log = users.add_change_log(db.sublevel('changes'))
+    users.put_many((str(i), i) for i in range(3))
+    log.trim(3)
+    assert log.read() == []
+    # a reopened log continues after the trimmed records
+    assert log._read_last_sequence() == 3
+
+
+def test_change_log_tail(db, users):
+    log = users.add_change_log(db.sublevel('changes'))
+    done = threading.Event()
+    received = []
+
+    def consume():
+        for change in log.cursor().tail(poll_interval=0.05,
+                                        stop=lambda: len(received) == 3):
+            received.append(change.key)
+        done.set()
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    for key in 'xyz':
+        users[key] = key
+    assert done.wait(5)
+    thread.join()
+    assert received == [b'users!x', b'users!y', b'users!z']
+
+
+def test_write_hooks_see_other_accessors(db, users):
+    seen = []
+    users.add_write_hook(seen.extend)
+    db.sublevel('users', value_encoding='json')['a'] = {'n': 1}
+    db.put('users!b', '2')
+    db.put('other!c', '3')
+    assert seen == [('put', b'users!a', {'n': 1}), ('put', b'users!b', 2)]
+
+
+def test_change_logs_share_sequences(db, users):
+    log = users.add_change_log(db.sublevel('changes'))
+    posts = db.sublevel('posts', value_encoding='json')
+    other = posts.add_change_log(db.sublevel('changes'))
+    users['a'] = 1
+    posts['b'] = 2
+    users['c'] = 3
+    assert other.last_sequence == log.last_sequence == 3
+    assert [c.key for c in log.cursor()] == \
+        [b'users!a', b'posts!b', b'users!c']
+
+
+def test_change_log_concurrent_writes(db, users):
+    log = users.add_change_log(db.sublevel('changes'))
+
+    def write(n):
+        for i in range(50):
+            users['%d-%d' % (n, i)] = i
+
+    threads = [threading.Thread(target=write, args=(n, )) for n in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [c.sequence for c in log.cursor()] == list(range(1, 201))
+
+
+def test_change_log_aborted_batch(db, users):
+    log = users.add_change_log(db.sublevel('changes'))
+    with pytest.raises(ZeroDivisionError):
+        with users.write_batch() as batch:
+            batch.add_write_hook(lambda records: 1 / 0, pre=True)
+            batch['a'] = 1
+    users['b'] = 2
+    assert [(c.sequence, c.key) for c in log.cursor()] == [(1, b'users!b')]
+
+
+def test_failing_write_hook_releases_change_log(db, users):
+    calls = []
+
+    def failing_once(records):
+        calls.append(records)
+        if len(calls) == 1:
+            raise ZeroDivisionError
+
+    users.add_write_hook(failing_once)
+    log = users.add_change_log(db.sublevel('changes'))
+    count = users.add_aggregate('count')
+    with pytest.raises(ZeroDivisionError):
+        users['a'] = 1
+    writer = threading.Thread(target=users.__setitem__, args=('b', 2))
+    writer.start()
+    writer.join(5)
+    assert not writer.is_alive()
+    assert [c.sequence for c in log.cursor()] == [1, 2]
+    assert count.value() == 2
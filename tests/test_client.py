@@ -0,0 +1,159 @@
+#
+# tests/test_client.py
+#
+
+import os
+import time
+import pytest
+from fixtures import leveldir, db                                        # noqa
+from levelpy.leveldb import LevelDB
+from levelpy import protocol
+
+
+@pytest.fixture
+def server(leveldir, tmpdir):
+    pytest.importorskip('leveldb')
+    from levelpy.server import start_server
+    db = LevelDB(leveldir, 'leveldb.LevelDB', create_if_missing=True)
+    server = start_server(db, str(tmpdir.join('db.sock')), chunk_size=7)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def remote(server):
+    from levelpy.client import RemoteLevelDB
+    db = RemoteLevelDB(server.socket_path, value_encoding='json',
+                       chunk_size=5)
+    yield db
+    db.close()
+
+
+def test_fields_roundtrip():
+    fields = [b'a', None, b'', b'x' * 300]
+    assert protocol.unpack_fields(protocol.pack_fields(fields)) == fields
+
+
+def test_get_put_delete(remote):
+    remote['a'] = {'x': 1}
+    assert remote['a'] == {'x': 1}
+    assert 'a' in remote
+    del remote['a']
+    with pytest.raises(KeyError):
+        remote['a']
+
+
+def test_sublevels_and_ranges(remote):
+    users = remote.sublevel('users')
+    users.put_many(('%02d' % i, i) for i in range(23))
+    remote['zzz'] = 0
+    assert [v for v in users.values()] == list(range(23))
+    assert [k for k in users.keys()][-1] == b'users!22'
+    assert [v for v in reversed(users.values())][0] == 22
+    assert users.get_many(['03', '17']) == [3, 17]
+    with pytest.raises(KeyError):
+        users.get_many(['03', 'nope'])
+    view = remote.view('users')
+    assert view['05'] == 5
+
+
+def test_partial_range_is_closed(remote, server):
+    remote.put_many((str(i), i) for i in range(50))
+    for key in remote.keys():
+        break
+    assert all(not cursors._iterators for cursors in server.cursors)
+
+
+def test_cursors_closed_with_connection(remote, server):
+    from levelpy.client import Connection
+    remote.put_many((str(i), i) for i in range(50))
+    conn = Connection(server.socket_path)
+    cursor_id = conn.call(protocol.RANGE_OPEN, None, None, b'1', b'0',
+                          protocol.pack_int(5))[0]
+    assert cursor_id is not None
+    with remote._db.connection() as other:
+        with pytest.raises(KeyError):
+            other.call(protocol.RANGE_NEXT, cursor_id)
+    conn.close()
+    for _ in range(100):
+        if all(not cursors._iterators for cursors in server.cursors):
+            break
+        time.sleep(0.01)
+    assert all(not cursors._iterators for cursors in server.cursors)
+
+
+def test_socket_permissions(server):
+    assert os.stat(server.socket_path).st_mode & 0o777 == 0o600
+
+
+def test_write_batch(remote):
+    with remote.write_batch() as batch:
+        batch['a'] = 1
+        batch['b'] = 2
+        del batch['a']
+        assert 'b' not in remote
+    assert remote['b'] == 2
+    assert 'a' not in remote
+
+
+def test_pipelined_get_many(remote):
+    keys = ['%03d' % i for i in range(40)]
+    remote.put_many((k, k) for k in keys)
+    assert remote.get_many(keys) == keys
+
+
+def test_get_many_larger_than_socket_buffers(remote):
+    # requests and responses both overflow the socket buffers
+    value = 'x' * 4096
+    keys = ['%0100d' % i for i in range(5000)]
+    remote.put_many((key, value) for key in keys)
+    assert remote.get_many(keys) == [value] * len(keys)
+
+
+def test_indexes_through_server(remote):
+    users = remote.sublevel('users')
+    users.add_index('email', lambda u: u['email'])
+    users['a'] = {'email': 'a@example.com'}
+    assert users.index('email')['a@example.com'] == [
+        {'email': 'a@example.com'}]
+
+
+def test_connection_pool(remote):
+    remote['a'] = 1
+    pool = remote._db._idle
+    assert len(pool) == 1
+    it = iter(remote.items())
+    next(it)
+    remote['b'] = 2
+    assert len(pool) == 1
+    list(it)
+
+
+def test_stats(remote):
+    assert 'levels' in remote.storage_stats()
+    remote.compact()
+
+
+def test_server_error(remote):
+    from levelpy.client import RemoteError
+    with remote._db.connection() as conn:
+        with pytest.raises(RemoteError):
+            conn.call(protocol.GET)
+
+
+def test_socket_removed(server):
+    path = server.socket_path
+    assert os.path.exists(path)
+    server.shutdown()
+    server.server_close()
+    assert not os.path.exists(path)
+
+
+def test_server_keeps_other_files(db, tmpdir):
+    from levelpy.server import LevelServer
+    path = tmpdir.join('notes.txt')
+    path.write('keep')
+    with pytest.raises(FileExistsError):
+        LevelServer(db, str(path))
+    assert path.read() == 'keep'
@@ -0,0 +1,79 @@
+#
+# tests/test_columns.py
+#
+
+import pytest
+from fixtures import leveldir, db                                        # noqa
+
+np = pytest.importorskip('numpy')
+columns = pytest.importorskip('levelpy.columns')
+
+
+@pytest.fixture
+def users(db):
+    sub = db.sublevel('users', value_encoding='json')
+    sub.put_many(('%04d' % i, {'id': i, 'score': i / 2, 'name': 'u%d' % i})
+                 for i in range(100))
+    db['zzz'] = 'outside'
+    return sub
+
+
+def test_column_grows_and_promotes():
+    col = columns.Column(capacity=2)
+    col.extend([1, 2, 3])
+    col.extend([4.5])
+    data = col.finish()
+    assert data.dtype == np.float64
+    assert list(data) == [1, 2, 3, 4.5]
+
+
+def test_column_strings_are_objects():
+    col = columns.Column()
+    col.extend(['a'])
+    col.extend(['a much longer string'])
+    assert list(col.finish()) == ['a', 'a much longer string']
+
+
+def test_column_fixed_dtype():
+    col = columns.Column('f4')
+    col.extend([1, None])
+    data = col.finish()
+    assert data.dtype == np.float32 and np.isnan(data[1])
+
+
+def test_empty_column():
+    assert len(columns.Column().finish()) == 0
+
+
+def test_to_arrays_fields(users):
+    arrays = users.to_arrays(key_codec='int',
+                             value_fields=['id', 'score'],
+                             chunk_size=7,
+                             size_hint=4)
+    assert sorted(arrays) == ['id', 'key', 'score']
+    assert np.array_equal(arrays['key'], np.arange(100))
+    assert np.array_equal(arrays['id'], np.arange(100))
+    assert arrays['score'].dtype == np.float64
+    assert arrays['score'][-1] == 49.5
+
+
+def test_to_arrays_values(users):
+    arrays = users.to_arrays(key_codec=None, key_from='0090')
+    assert list(arrays) == ['value']
+    assert len(arrays['value']) == 10
+    assert arrays['value'][0]['name'] == 'u90'
+
+
+def test_to_arrays_dtypes(users):
+    arrays = users.to_arrays(key_codec='utf8',
+                             value_fields=['name'],
+                             dtypes={'name': 'U8', 'key': 'U4'})
+    assert arrays['name'].dtype == np.dtype('U8')
+    assert arrays['key'][3] == '0003'
+
+
+def test_to_frame(users):
+    pytest.importorskip('pandas')
+    frame = users.to_frame(key_codec='int', value_fields=['score'])
+    assert frame.index.name == 'key'
+    assert frame['score'].sum() == sum(i / 2 for i in range(100))
@@ -0,0 +1,124 @@
+#
+# tests/test_compression.py
+#
+
+import pytest
+from unittest import mock
+from fixtures import leveldir, db                                        # noqa
+from levelpy.serializer import Serializer
+import levelpy.compression as compression
+
+
+def record(i):
+    return {'id': i, 'name': 'user-%d' % i, 'email': 'user%d@example.com' % i,
+            'roles': ['reader', 'writer'], 'active': i % 2 == 0}
+
+
+@pytest.mark.parametrize("method", ['zlib', 'zstd', 'lz4'])
+def test_codec_roundtrip(method):
+    if method not in compression.available_methods():
+        pytest.skip("%s is not installed" % method)
+    codec = compression.CompressedCodec('json', method)
+    obj = [record(i) for i in range(10)]
+    data = codec.encode(obj)
+    assert data[:2] == codec._header
+    assert len(data) < len(Serializer.encode['json'](obj))
+    assert codec.decode(data) == obj
+    assert codec.decode(bytearray(data)) == obj
+    assert codec.decode_many(codec.encode_many([obj, 'x'])) == [obj, 'x']
+
+
+def test_small_values_stored_raw():
+    codec = compression.CompressedCodec('json', 'zlib', min_size=32)
+    data = codec.encode(1)
+    assert data == b'\xc1\x001'
+    assert codec.decode(data) == 1
+
+
+def test_binary_legacy_values():
+    pytest.importorskip('msgpack')
+    codec = compression.CompressedCodec('msgpack', 'zlib')
+    # msgpack fixint 1 is not mistaken for a header
+    assert codec.decode(b'\x01') == 1
+    with pytest.raises(ValueError):
+        compression.CompressedCodec('bin', 'zlib').decode(b'\x01')
+    assert compression.CompressedCodec('bin', 'zlib').decode(
+        compression.header(compression.RAW) + b'\x01') == b'\x01'
+
+
+def test_legacy_values():
+    codec = compression.CompressedCodec('json', 'zlib')
+    assert codec.decode(b'{"a": 1}') == {'a': 1}
+    assert codec.decode_many([b'[]', codec.encode(record(1))]) == \
+        [[], record(1)]
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        compression.CompressedCodec('json', 'brotli')
+
+
+def test_value_encoding_string(db):
+    sub = db.sublevel('users', value_encoding='json+zlib')
+    assert 'json+zlib' in Serializer.transform_dict
+    sub['a'] = record(1)
+    assert sub['a'] == record(1)
+    assert db.Get(b'users!a')[:2] == compression.header(compression.ZLIB)
+
+
+def test_unknown_value_encoding(db):
+    with pytest.raises(KeyError):
+        db.sublevel('users', value_encoding='nothing+zlib')
+
+
+def test_train_dictionary(db):
+    pytest.importorskip('zstandard')
+    sub = db.sublevel('users', value_encoding='json+zstd')
+    sub.put_many(('%05d' % i, record(i)) for i in range(500))
+
+    dictionary = sub.train_compression(sample_size=500, dict_size=4096)
+    assert db.Get(sub.reserved_key(compression.DICTIONARY_KEY)) == dictionary
+    assert len([v for v in sub.values()]) == 500
+
+    sub['new'] = record(1000)
+    assert db.Get(b'users!new')[:2] == \
+        compression.header(compression.ZSTD_DICT)
+    assert sub['new'] == record(1000)
+    assert sub['00001'] == record(1)
+
+    # loaded when other accessors of the sublevel are created
+    other = db.sublevel('users', value_encoding='json+zstd')
+    assert other.encode(record(1))[:2] == \
+        compression.header(compression.ZSTD_DICT)
+    assert other['new'] == record(1000)
+    assert db.view('users', value_encoding='json+zstd')['new'] == record(1000)
+    assert other.load_compression()
+    assert not db.sublevel('x', value_encoding='json+zstd').load_compression()
+
+
+def test_dictionary_codec_shared(db):
+    pytest.importorskip('zstandard')
+    sub = db.sublevel('users', value_encoding='json+zstd')
+    sub.put_many(('%05d' % i, record(i)) for i in range(500))
+    sub.train_compression(sample_size=500, dict_size=4096)
+    with mock.patch.object(compression, 'load_dictionary',
+                           wraps=compression.load_dictionary) as load:
+        other = db.sublevel('users', value_encoding='json+zstd')
+        db.sublevel('x', value_encoding='json+zstd')
+        db.sublevel('x', value_encoding='json+zstd')
+    assert load.call_count == 1
+    assert other.encode == sub.encode
+
+
+def test_unknown_dictionary():
+    zstandard = pytest.importorskip('zstandard')
+    samples = [Serializer.encode['json'](record(i)) for i in range(500)]
+    dictionary = zstandard.train_dictionary(1024, samples).as_bytes()
+    data = compression.CompressedCodec('json', 'zstd').with_dictionary(
+        dictionary).encode(record(1))
+    compression._dictionaries.clear()
+    codec = compression.CompressedCodec('json', 'zstd')
+    with pytest.raises(ValueError):
+        codec.decode(data)
+    compression.register_dictionary(dictionary)
+    assert codec.decode(data) == record(1)
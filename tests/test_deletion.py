@@ -0,0 +1,76 @@
+#
+# tests/test_deletion.py
+#
+
+import pytest
+from fixtures import leveldir, db                                        # noqa
+
+
+@pytest.fixture
+def tenant(db):
+    db['before'] = 'x'
+    db['zzz'] = 'x'
+    sub = db.sublevel('tenant', value_encoding='json')
+    sub.put_many(('%03d' % i, i) for i in range(100))
+    return sub
+
+
+def raw_keys(db):
+    return [bytes(k) for k in db.RangeIter(include_value=False)]
+
+
+def test_delete_range(tenant):
+    assert tenant.delete_range('010', '020') == 10
+    keys = [k for k in tenant.keys()]
+    assert len(keys) == 90
+    assert b'tenant!009' in keys and b'tenant!020' in keys
+
+
+def test_delete_range_progress(tenant):
+    seen = []
+    assert tenant.delete_range(chunk_size=30, progress=seen.append) == 100
+    assert seen == [30, 60, 90, 100]
+
+
+def test_clear(db, tenant):
+    assert tenant.clear() == 100
+    assert raw_keys(db) == [b'before', b'zzz']
+
+
+def test_clear_maintains_derived(tenant):
+    count = tenant.add_aggregate('count')
+    count.rebuild()
+    index = tenant.add_index('value', lambda v: v)
+    tenant['x'] = 5
+    assert count.value() == 101
+    tenant.clear(chunk_size=7)
+    assert count.value() == 0
+    assert index.keys(5) == []
+
+
+def test_clear_metadata(db, tenant):
+    tenant.add_aggregate('count')
+    tenant['x'] = 5
+    assert tenant.aggregate('count').value() == 1
+    assert tenant.clear(metadata=True) == 102
+    assert raw_keys(db) == [b'before', b'zzz']
+    assert tenant.aggregate('count').value() == 0
+
+
+def test_clear_metadata_background(db, tenant):
+    tenant.add_aggregate('count')
+    tenant['x'] = 5
+    deletion = tenant.clear(metadata=True, background=True, chunk_size=40)
+    assert deletion.wait(5) == 102
+    assert raw_keys(db) == [b'before', b'zzz']
+    assert tenant.aggregate('count').value() == 0
+
+
+def test_delete_range_background(db, tenant):
+    seen = []
+    deletion = tenant.delete_range(background=True, compact=True,
+                                   chunk_size=40, progress=seen.append)
+    assert deletion.wait(5) == 100
+    assert deletion.deleted == 100
+    assert seen[-1] == 100
+    assert raw_keys(db) == [b'before', b'zzz']
@@ -0,0 +1,94 @@
+#
+# tests/test_dump.py
+#
+
+import io
+import pytest
+from fixtures import leveldir, db                                        # noqa
+from levelpy.leveldb import LevelDB
+from levelpy.io import dumper
+from levelpy.__main__ import main
+
+
+@pytest.fixture
+def target(tmpdir):
+    pytest.importorskip('leveldb')
+    return LevelDB(str(tmpdir.join('target')), 'leveldb.LevelDB',
+                   create_if_missing=True)
+
+
+@pytest.fixture
+def filled_db(db):
+    db.sublevel('a').put_many(('%03d' % i, 'a%d' % i) for i in range(300))
+    db.sublevel('b').put_many(('%03d' % i, 'b%d' % i) for i in range(10))
+    db.Put(b'\xffmeta', b'x')
+    db.Put(b'a!\xffreserved', b'y')
+    return db
+
+
+def raw_items(db):
+    return [(bytes(k), bytes(v)) for k, v in db._db.RangeIter()]
+
+
+@pytest.mark.parametrize('compress', [None, 'zlib', 'zstd'])
+def test_dump_restore(filled_db, target, compress):
+    if compress == 'zstd':
+        pytest.importorskip('zstandard')
+    f = io.BytesIO()
+    count = filled_db.dump(f, compress=compress, frame_size=512)
+    assert count == 312
+    f.seek(0)
+    assert target.restore(f, batch_size=1000) == 312
+    assert raw_items(target) == raw_items(filled_db)
+
+
+def test_dump_sublevel(filled_db, target):
+    f = io.BytesIO()
+    assert filled_db.dump(f, prefix='a', compress='zlib') == 301
+    f.seek(0)
+    target.restore(f)
+    assert target.sublevel('a')['005'] == 'a5'
+    assert target.Get(b'a!\xffreserved') == b'y'
+    assert 'b!000' not in target
+
+
+def test_dump_key_ranges(filled_db):
+    sub = filled_db.sublevel('a')
+    parts = [io.BytesIO(), io.BytesIO()]
+    n0 = sub.dump(parts[0], compress=None, key_to='149')
+    n1 = sub.dump(parts[1], compress=None, key_from='150')
+    assert (n0, n1) == (150, 151)
+    keys = [k for part in parts
+            for k, v in dumper.read_dump(io.BytesIO(part.getvalue()))]
+    assert keys == sorted(keys)
+
+
+def test_dump_is_snapshot(filled_db):
+    class Writer(io.BytesIO):
+        def write(self, data):
+            filled_db['c!new'] = 'x'
+            return super().write(data)
+    f = Writer()
+    assert filled_db.dump(f, compress=None, frame_size=64) == 312
+
+
+@pytest.mark.parametrize('damage', [
+    lambda b: b[:-3],
+    lambda b: b[:30] + bytes([b[30] ^ 1]) + b[31:],
+    lambda b: b'NOTADUMP' + b[8:],
+])
+def test_damaged_dump(filled_db, damage):
+    f = io.BytesIO()
+    filled_db.dump(f, compress='zlib')
+    with pytest.raises(dumper.DumpError):
+        list(dumper.read_dump(io.BytesIO(damage(f.getvalue()))))
+
+
+def test_cli_dump_restore(leveldir, tmpdir):
+    pytest.importorskip('leveldb')
+    path = str(tmpdir.join('db.dump'))
+    target = str(tmpdir.join('target'))
+    LevelDB(leveldir, 'leveldb.LevelDB', create_if_missing=True)['a!001'] = 1
+    main(['dump', leveldir, path, '--compress', 'zlib'])
+    main(['restore', target, path, '--create'])
+    assert LevelDB(target, 'leveldb.LevelDB')['a!001'] == '1'
@@ -0,0 +1,78 @@
+#
+# tests/test_group_commit.py
+#
+
+import pytest
+import threading
+from unittest import mock
+from fixtures import leveldir, db                                        # noqa
+
+
+def test_concurrent_submissions(db):
+    sub = db.sublevel('s', value_encoding='json')
+    count = sub.add_aggregate('count')
+    with sub.group_commit_writer(max_latency=0.01) as writer:
+        with mock.patch.object(type(sub), '_write_batch',
+                               autospec=True,
+                               side_effect=type(sub)._write_batch) as write:
+
+            def work(n):
+                futures = [writer.put('%d-%d' % (n, i), i) for i in range(20)]
+                for future in futures:
+                    future.result(5)
+
+            threads = [threading.Thread(target=work, args=(n, ))
+                       for n in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        assert write.call_count < 160
+        assert write.call_args[0][2] is True
+    assert len([v for v in sub.values()]) == 160
+    assert count.value() == 160
+
+
+def test_last_write_wins_and_flush(db):
+    writer = db.group_commit_writer(sync=False)
+    writer.put('a', 1)
+    writer.put('a', 2)
+    writer.put('b', 1)
+    writer.delete('b')
+    writer.flush(5)
+    assert db['a'] == '2'
+    assert 'b' not in db
+    writer.close()
+    with pytest.raises(RuntimeError):
+        writer.put('c', 1)
+
+
+def test_write_errors_fail_futures(db):
+    with db.group_commit_writer() as writer:
+        with mock.patch.object(type(db), '_write_batch',
+                               side_effect=IOError('disk full')):
+            future = writer.put('a', 1)
+            with pytest.raises(IOError):
+                future.result(5)
+
+
+def test_cancelled_futures_are_dropped(db):
+    writing = threading.Event()
+    release = threading.Event()
+    write_batch = type(db)._write_batch
+
+    def slow_write_batch(self, batch, sync=False):
+        writing.set()
+        release.wait(5)
+        write_batch(self, batch, sync)
+
+    with db.group_commit_writer() as writer:
+        with mock.patch.object(type(db), '_write_batch', slow_write_batch):
+            writer.put('a', 1)
+            assert writing.wait(5)
+            cancelled = writer.put('b', 1)
+            assert cancelled.cancel()
+            release.set()
+            writer.put('c', 1).result(5)
+    assert db['a'] == '1' and db['c'] == '1'
+    assert 'b' not in db
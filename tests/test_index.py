@@ -0,0 +1,131 @@
+#
+# tests/test_index.py
+#
+
+import pytest
+from copy import copy
+from unittest import mock
+from fixtures import leveldir, db                                        # noqa
+
+
+@pytest.fixture
+def users(db):
+    sub = db.sublevel('users', value_encoding='json')
+    sub.add_index('email', lambda user: user.get('email'))
+    return sub
+
+
+def test_index_lookup(users):
+    users['a'] = {'email': 'a@example.com'}
+    users['b'] = {'email': 'b@example.com'}
+    index = users.index('email')
+    assert index['a@example.com'] == [{'email': 'a@example.com'}]
+    assert index.keys('b@example.com') == [b'b']
+    assert 'c@example.com' not in index
+
+
+def test_index_entries_are_not_iterated(users):
+    users['a'] = {'email': 'a@example.com'}
+    assert [key for key in users.keys()] == [b'users!a']
+
+
+def test_index_removes_stale_entries(users):
+    index = users.index('email')
+    users['a'] = {'email': 'old@example.com'}
+    users['a'] = {'email': 'new@example.com'}
+    assert index.keys('old@example.com') == []
+    assert index.keys('new@example.com') == [b'a']
+    del users['a']
+    assert index.keys('new@example.com') == []
+
+
+def test_index_prefix_values_do_not_match(users):
+    users['a'] = {'email': 'ab'}
+    assert users.index('email').keys('a') == []
+
+
+def test_index_slice(users):
+    users.put_many((k, {'email': k + '@example.com'}) for k in 'abcd')
+    assert users.index('email').keys(slice('b', 'd')) == [b'b', b'c']
+    assert len(users.index('email').keys(slice(None, None))) == 4
+
+
+def test_index_multiple_values(db):
+    posts = db.sublevel('posts', value_encoding='json')
+    tags = posts.add_index('tags', lambda post: post['tags'])
+    posts['1'] = {'tags': ['x', 'y']}
+    posts['2'] = {'tags': ['y']}
+    assert tags.keys('y') == [b'1', b'2']
+    posts['1'] = {'tags': ['x']}
+    assert tags.keys('y') == [b'2']
+
+
+def test_index_in_write_batch(users):
+    with users.write_batch() as batch:
+        batch['a'] = {'email': 'a@example.com'}
+        assert users.index('email').keys('a@example.com') == []
+    assert users.index('email').keys('a@example.com') == [b'a']
+
+
+def test_index_backfill(db):
+    users = db.sublevel('users', value_encoding='json')
+    users.put_many(('%03d' % i, {'email': 'u%d' % (i % 10)})
+                   for i in range(55))
+    index = users.add_index('email', lambda user: user['email'])
+    assert index.keys('u3') == []
+    assert not index.backfilled
+    assert index.backfill(chunk_size=10) == 55
+    assert index.backfilled
+    assert len(index.keys('u3')) == 6
+    assert index.backfill() == 0
+
+
+def test_index_backfill_resumes(db):
+    users = db.sublevel('users', value_encoding='json')
+    users.put_many(('%03d' % i, {'email': 'u%d' % i}) for i in range(30))
+    index = users.add_index('email', lambda user: user['email'])
+
+    def interrupt(count):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        index.backfill(chunk_size=10, progress=interrupt)
+    assert index.backfill(chunk_size=10) == 20
+    assert all(index.keys('u%d' % i) == [b'%03d' % i] for i in range(30))
+
+
+def test_index_maintained_by_other_accessors(db, users):
+    db.sublevel('users', value_encoding='json')['a'] = {'email': 'a@x'}
+    copy(users)['b'] = {'email': 'b@x'}
+    db.Put(b'users!c', b'{"email": "c@x"}')
+    db.put('users!d', '{"email": "d@x"}')
+    db.sublevel('users').sublevel('eu')['e'] = '{"email": "e@x"}'
+    index = db.sublevel('users', value_encoding='json').index('email')
+    assert index is users.index('email')
+    assert index.keys('a@x') == [b'a']
+    assert index.keys('b@x') == [b'b']
+    assert index.keys('d@x') == [b'd']
+    assert index.keys('e@x') == [b'eu!e']
+    # raw backend writes bypass derived objects
+    assert index.keys('c@x') == []
+    del db['users!d']
+    assert index.keys('d@x') == []
+    db['other!a'] = '{"email": "a@x"}'
+    assert index.keys('a@x') == [b'a']
+
+
+def test_writes_out_of_scope_do_not_read_previous_values(db, users):
+    db.Put(b'k', b'\xff')
+    root = db.sublevel('', delim='', value_encoding=(bytes, bytes))
+    with mock.patch.object(db, 'Get', wraps=db.Get) as get:
+        db['k'] = 'x'
+        root['k'] = b'\xfe'
+    assert get.call_count == 0
+    db['users!a'] = '{"email": "a@x"}'
+    db['users!a'] = '{"email": "b@x"}'
+    assert users.index('email').keys('a@x') == []
+    assert users.index('email').keys('b@x') == [b'a']
+    # previous values are decoded with the codec of the index's sublevel
+    db.sublevel('users')['a'] = '{"email": "c@x"}'
+    assert users.index('email').keys('b@x') == []
+    assert users.index('email').keys('c@x') == [b'a']
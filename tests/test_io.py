@@ -0,0 +1,96 @@
+#
+# tests/test_io.py
+#
+
+import io
+import json
+import pytest
+from unittest import mock
+from fixtures import leveldir, db                                        # noqa
+from levelpy.leveldb import LevelDB
+from levelpy import io as levelio
+from levelpy.__main__ import main
+
+
+@pytest.fixture
+def records():
+    return [{'id': 'u%03d' % i, 'n': i} for i in range(50)][::-1]
+
+
+@pytest.fixture
+def jsonl(records):
+    lines = [json.dumps(r) for r in records]
+    lines.insert(3, '')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+@pytest.mark.parametrize('processes', [0, 2])
+@pytest.mark.parametrize('encoding', ['json', 'msgpack'])
+def test_import_jsonl(db, jsonl, records, processes, encoding):
+    pytest.importorskip('msgpack')
+    sub = db.sublevel('users', value_encoding=encoding)
+    seen = []
+    stats = levelio.import_jsonl(sub, io.BytesIO(jsonl), 'id',
+                                 processes=processes,
+                                 chunk_size=7,
+                                 batch_size=20,
+                                 progress=lambda s: seen.append(s.rows))
+    assert stats.rows == 50
+    assert stats.batches == 3
+    assert seen == [20, 40, 50]
+    assert sub['u007'] == {'id': 'u007', 'n': 7}
+    assert len([v for v in sub.values()]) == 50
+
+
+def test_import_custom_encoding(db, jsonl):
+    sub = db.sublevel('users',
+                      value_encoding=(lambda v: str(v).encode(),
+                                      lambda b: b.decode()))
+    levelio.import_jsonl(sub, io.BytesIO(jsonl), lambda r: r['id'],
+                         batch_size=100)
+    assert sub['u001'] == "{'id': 'u001', 'n': 1}"
+    with pytest.raises(ValueError):
+        levelio.import_jsonl(sub, io.BytesIO(jsonl), 'id', processes=1)
+
+
+def test_import_csv(db, leveldir, tmpdir):
+    path = str(tmpdir.join('data.csv'))
+    with open(path, 'w') as f:
+        f.write('id,name\n1,"a, b"\n2,c\n')
+    stats = levelio.import_csv(db.sublevel('csv', value_encoding='json'),
+                               path, 'id')
+    assert stats.rows == 2
+    assert db.sublevel('csv', value_encoding='json')['1'] == \
+        {'id': '1', 'name': 'a, b'}
+
+
+def test_import_msgpack(db, records):
+    msgpack = pytest.importorskip('msgpack')
+    data = b''.join(map(msgpack.packb, records))
+    sub = db.sublevel('mp', value_encoding='msgpack')
+    levelio.import_msgpack(sub, io.BytesIO(data), 'id', presort=True)
+    assert sub['u049'] == {'id': 'u049', 'n': 49}
+
+
+def test_presort(db, records):
+    writes = []
+    sub = db.sublevel('s', value_encoding='json')
+    with mock.patch.object(type(sub), '_write_encoded',
+                           lambda self, pairs: writes.append([k for k, v
+                                                              in pairs])):
+        levelio.import_records(sub, records, 'id', batch_size=10,
+                               presort=True)
+    assert all(batch == sorted(batch) for batch in writes)
+    assert writes[0][0] == b's!u040'
+
+
+def test_cli_import(leveldir, jsonl, tmpdir, capsys):
+    pytest.importorskip('leveldb')
+    path = str(tmpdir.join('data.jsonl'))
+    with open(path, 'wb') as f:
+        f.write(jsonl)
+    main(['import', leveldir, path, '--key', 'id', '--sublevel', 'users',
+          '--create', '--processes', '0'])
+    assert '50 rows' in capsys.readouterr().err
+    db = LevelDB(leveldir, 'leveldb.LevelDB')
+    assert db.sublevel('users', value_encoding='json')['u001']['n'] == 1
@@ -5,6 +5,7 @@
 import pytest
 from unittest import mock
 import levelpy.leveldb
+from fixtures import leveldir                                            # noqa
 from levelpy.iterviews import (
     LevelItems,
     LevelValues,
@@ -301,3 +302,89 @@ def test_value_encoding_protocol_buffer():
     s = bytearray(b"foo")
     o = a.decode(s)
     o.ParseFromString.assert_called_with(bytes(s))
+
+
+def test_constructor_profile(db_path, mock_LevelDB):
+    db = levelpy.leveldb.LevelDB(db=db_path,
+                                 leveldb_cls=mock_LevelDB.LevelDB,
+                                 profile='serving',
+                                 block_cache_size=1 << 20)
+    assert db.profile == 'serving'
+    mock_LevelDB.LevelDB.assert_called_with(db_path,
+                                            create_if_missing=False,
+                                            block_cache_size=1 << 20,
+                                            bloom_filter_bits=10,
+                                            paranoid_checks=False)
+
+
+def test_backend_open_options():
+    from levelpy.leveldb_module_shims import BackendOpenOptions
+    options = {'block_cache_size': 1, 'bloom_filter_bits': 10, 'other': 2}
+    assert BackendOpenOptions('leveldb.LevelDB', options) == {
+        'block_cache_size': 1,
+        'other': 2,
+    }
+    assert BackendOpenOptions('plyvel._plyvel.DB', options) == {
+        'lru_cache_size': 1,
+        'bloom_filter_bits': 10,
+        'other': 2,
+    }
+
+
+def test_open_path_shares_backend(leveldir):
+    pytest.importorskip('leveldb')
+    from levelpy import handles
+    a = levelpy.leveldb.LevelDB(leveldir, create_if_missing=True)
+    b = levelpy.leveldb.LevelDB(leveldir)
+    assert a._db is b._db
+    assert handles.refcount(leveldir, a._leveldb_cls) == 2
+    a['k'] = 'v'
+    a.close()
+    assert a._db is None and 'Get' not in vars(a)
+    assert b['k'] == 'v'
+    with b:
+        pass
+    assert handles.refcount(leveldir, b._leveldb_cls) == 0
+    with levelpy.leveldb.LevelDB(leveldir) as c:
+        assert c['k'] == 'v'
+
+
+def test_collected_database_releases_backend(leveldir):
+    pytest.importorskip('leveldb')
+    import gc
+    import shutil
+    from levelpy import handles
+    db = levelpy.leveldb.LevelDB(leveldir, create_if_missing=True)
+    db['k'] = 'v'
+    cls = db._leveldb_cls
+    del db
+    gc.collect()
+    assert handles.refcount(leveldir, cls) == 0
+    shutil.rmtree(leveldir)
+    with levelpy.leveldb.LevelDB(leveldir, create_if_missing=True) as db:
+        assert 'k' not in db
+
+
+def test_reopen_while_sublevel_in_use(leveldir):
+    pytest.importorskip('leveldb')
+    from levelpy import handles
+    sub = levelpy.leveldb.LevelDB(leveldir,
+                                  create_if_missing=True).sublevel('users')
+    sub['a'] = 'x'
+    db = levelpy.leveldb.LevelDB(leveldir)
+    assert db._db is sub._db
+    db.close()
+    with levelpy.leveldb.LevelDB(leveldir) as db:
+        assert db['users!a'] == 'x'
+    assert sub['a'] == 'x'
+    key = handles.handle_key(leveldir, db._leveldb_cls)
+    assert key in handles._handles
+    del sub
+    assert key not in handles._handles
+
+
+def test_cache_accessors(db):
+    assert db.sublevel('a') is not db.sublevel('a')
+    assert db.cache_accessors() is db
+    assert db.sublevel('a') is db.sublevel('a')
+    assert db.sublevel('a').view('b') is db.sublevel('a').view('b')
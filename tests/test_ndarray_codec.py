@@ -0,0 +1,75 @@
+#
+# tests/test_ndarray_codec.py
+#
+
+import pytest
+from fixtures import leveldir, db                                        # noqa
+from levelpy.serializer import Serializer
+
+np = pytest.importorskip('numpy')
+ndarray_codec = pytest.importorskip('levelpy.ndarray_codec')
+
+point = np.dtype([('t', '<i8'), ('x', '<f4'), ('tag', 'S4')])
+
+
+@pytest.mark.parametrize("arr", [
+    np.arange(10, dtype='<f4'),
+    np.arange(12, dtype='>i8').reshape(3, 4),
+    np.arange(12, dtype=np.uint8).reshape(3, 4).T,
+    np.array(3.5),
+    np.zeros(0, dtype='f8'),
+    np.array([(1, 2.5, b'a'), (2, -1, b'bcd')], dtype=point),
+])
+def test_roundtrip(arr):
+    data = ndarray_codec.ndarray_encode(arr)
+    out = ndarray_codec.ndarray_decode(data)
+    assert out.dtype == arr.dtype
+    assert out.shape == arr.shape
+    assert np.array_equal(out, arr)
+
+
+def test_decode_is_zero_copy():
+    data = bytearray(ndarray_codec.ndarray_encode(np.arange(4, dtype='f8')))
+    out = ndarray_codec.ndarray_decode(data)
+    assert out.flags.writeable
+    out[0] = 10
+    assert ndarray_codec.ndarray_decode(data)[0] == 10
+
+
+def test_object_arrays_rejected():
+    with pytest.raises(TypeError):
+        ndarray_codec.ndarray_encode(np.array([{}, []], dtype=object))
+
+
+def test_records_codec():
+    encode, decode, encode_many, decode_many = \
+        ndarray_codec.records_codec(point)
+    rec = (1, 2.5, b'a')
+    assert decode(encode(rec))[0] == np.array(rec, dtype=point)
+    arrs = [np.zeros(3, point), np.ones(1, point), np.zeros(0, point)]
+    out = decode_many(encode_many(arrs))
+    assert [len(a) for a in out] == [3, 1, 0]
+    assert decode_many([]) == []
+
+
+def test_sublevel_value_encoding(db):
+    vecs = db.sublevel('vec', value_encoding='ndarray')
+    assert 'ndarray' in Serializer.transform_dict
+    vecs['vec:1'] = np.linspace(0, 1, 8, dtype='f4')
+    out = vecs['vec:1']
+    assert isinstance(out, np.ndarray)
+    assert np.array_equal(out, np.linspace(0, 1, 8, dtype='f4'))
+
+
+def test_sublevel_records(db):
+    points = db.sublevel('points',
+                         value_encoding=ndarray_codec.records_codec(point))
+    points.put_many({'a': (1, 2, b'x'), 'b': np.zeros(2, point)})
+    a, b = [v for v in points.values()]
+    assert a['t'][0] == 1 and len(b) == 2
+
+
+def test_compressed_ndarray(db):
+    vecs = db.sublevel('vec', value_encoding='ndarray+zlib')
+    vecs['a'] = np.zeros(1000)
+    assert np.array_equal(vecs['a'], np.zeros(1000))
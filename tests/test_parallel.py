@@ -0,0 +1,77 @@
+#
+# tests/test_parallel.py
+#
+
+import pytest
+from operator import add
+from concurrent.futures import Future
+from fixtures import leveldir, db                                        # noqa
+from levelpy import parallel
+
+
+@pytest.fixture
+def users(db):
+    sub = db.sublevel('users', value_encoding='json')
+    sub.put_many(('%04d' % i, {'id': i}) for i in range(500))
+    db['zzz'] = 'outside'
+    return sub
+
+
+def count_ids(items):
+    return sum(value['id'] for key, value in items)
+
+
+def test_interpolate_splits_are_ordered():
+    splits = parallel.interpolate_splits(b'p!0000', b'p!0499', 4)
+    assert len(splits) == 3
+    assert splits == sorted(splits)
+    assert all(b'p!0000' < s <= b'p!0499' for s in splits)
+
+
+@pytest.mark.parametrize('method', ['interpolate', 'sample'])
+def test_shard_ranges_cover_everything(users, method):
+    ranges = parallel.shard_ranges(users, 4, method)
+    assert ranges[0][0] == users.range_begin
+    assert ranges[-1][1] is None
+    keys = [k for r in ranges for k, v in parallel._shard_iter(users, *r)]
+    assert keys == [users.subkey(b'%04d' % i) for i in range(500)]
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_parallel_scan(users, executor):
+    total = users.parallel_scan(count_ids, shards=4, executor=executor,
+                                reduce=add, chunk_size=64)
+    assert total == sum(range(500))
+
+
+def test_parallel_scan_partials(users):
+    results = users.parallel_scan(count_ids, shards=3)
+    assert 1 <= len(results) <= 3
+    assert sum(results) == sum(range(500))
+
+
+def test_parallel_scan_empty(db):
+    assert db.sublevel('empty').parallel_scan(count_ids, reduce=add) is None
+
+
+def test_parallel_scan_bad_executor(users):
+    with pytest.raises(ValueError):
+        users.parallel_scan(count_ids, executor='fiber')
+
+
+def test_map_bounded():
+    submitted = []
+
+    class Executor:
+        def submit(self, fn, *args):
+            submitted.append(args)
+            future = Future()
+            future.set_result(fn(*args))
+            return future
+
+    chunks = ([(b'k%d' % i, b'%d' % i)] for i in range(10))
+    results = parallel._map_bounded(Executor(), chunks, 3, list, 'utf8')
+    first = next(results)
+    assert len(submitted) == 3
+    assert [first] + list(results) == \
+        [[(b'k%d' % i, str(i))] for i in range(10)]
@@ -0,0 +1,88 @@
+#
+# tests/test_partitioned.py
+#
+
+import os
+import pytest
+from levelpy.partitioned import (
+    PartitionedLevelDB,
+    timestamp_key,
+    key_timestamp,
+)
+
+DAY = 86400
+START = 1700000000 // DAY * DAY
+
+
+@pytest.fixture
+def events(tmpdir):
+    pytest.importorskip('leveldb')
+    db = PartitionedLevelDB(str(tmpdir.join('events')), bucket='day',
+                            max_open=2, value_encoding='json')
+    with db.write_batch() as batch:
+        for day in range(4):
+            for i in range(3):
+                batch[timestamp_key(START + day * DAY + i, b'!e')] = [day, i]
+    yield db
+    db.close()
+
+
+def test_timestamp_key_roundtrip():
+    key = timestamp_key(1700000000.25, b'!x')
+    assert key_timestamp(key) == 1700000000.25
+    assert key < timestamp_key(1700000001)
+
+
+def test_one_directory_per_bucket(events):
+    assert events.partitions() == [START + day * DAY for day in range(4)]
+    assert len(os.listdir(events.path)) == 4
+    assert len(events._db._open) == 2
+
+
+def test_reads_and_scans(events):
+    assert events[timestamp_key(START + DAY + 2, b'!e')] == [1, 2]
+    with pytest.raises(KeyError):
+        events[timestamp_key(START - DAY, b'!e')]
+    assert [v for v in events.values()] == [[d, i] for d in range(4)
+                                           for i in range(3)]
+    assert [v for v in reversed(events.values())][0] == [3, 2]
+    lo, hi = timestamp_key(START + DAY), timestamp_key(START + 2 * DAY + 1)
+    assert [key_timestamp(k) - START for k, _ in events[lo:hi]] == \
+        [DAY, DAY + 1, DAY + 2, 2 * DAY]
+
+
+def test_drop_before(events):
+    dropped = events.drop_before(START + 2 * DAY)
+    assert dropped == [START, START + DAY]
+    assert events.partitions() == [START + 2 * DAY, START + 3 * DAY]
+    assert [v for v in events.values()][0] == [2, 0]
+    assert events.retain(DAY, now=START + 5 * DAY) == [START + 2 * DAY,
+                                                       START + 3 * DAY]
+    assert [v for v in events.values()] == []
+
+
+def test_held_partition_outlives_eviction(events):
+    backend = events._db
+    key = timestamp_key(START, b'!e')
+    with backend.hold(START) as held:
+        for day in range(1, 4):
+            events[timestamp_key(START + day * DAY, b'!e')]
+        assert START not in backend._open
+        assert held[key] == '[0, 0]'
+    assert held._db is None
+    assert events[key] == [0, 0]
+
+
+def test_held_partition_outlives_drop(events):
+    backend = events._db
+    key = timestamp_key(START, b'!e')
+    with backend.hold(START) as held:
+        assert events.drop_before(START + DAY) == [START]
+        assert events.partitions() == [START + day * DAY for day in (1, 2, 3)]
+        assert key not in events
+        assert held[key] == '[0, 0]'
+        assert os.path.isdir(backend.bucket_path(START))
+    assert not os.path.exists(backend.bucket_path(START))
+    assert backend._dropped == {}
+    events[key] = [0, 1]
+    assert events[key] == [0, 1]
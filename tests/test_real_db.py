@@ -314,3 +314,46 @@ def test_find_last_matching(filled_db, viewkey, find_this, expected):
     view = db.view(viewkey)
     found = view.find_last_matching(find_this)
     assert found == expected
+
+
+@pytest.mark.parametrize('encoding', ['json', 'msgpack', 'utf8'])
+def test_put_many_get_many(db, encoding):
+    pytest.importorskip('msgpack')
+    sub = db.sublevel('many', value_encoding=encoding)
+    data = {'k%03d' % i: str(i) for i in range(25)}
+    sub.put_many(data, chunk_size=7)
+    assert sub.get_many(['k000', 'k024']) == ['0', '24']
+    expected = [data[k] for k in sorted(data)]
+    assert dict(iter(sub.items())) == {b'many!' + k.encode(): v
+                                       for k, v in data.items()}
+    assert [v for v in sub.values()] == expected
+    assert [v for v in reversed(sub.values())] == expected[::-1]
+
+
+def test_put_many_in_batch(db):
+    with db.write_batch() as batch:
+        batch.put_many([('a', 'x'), ('b', 'y')])
+        assert 'a' not in db
+    assert db.get_many(['a', 'b']) == ['x', 'y']
+
+
+def test_compact_and_approximate_size(db):
+    sub = db.sublevel('sized')
+    sub.put_many(('%03d' % i, 'x' * 100) for i in range(50))
+    db['other'] = 'y'
+    size = sub.approximate_size()
+    assert size >= 50 * 100
+    assert sub.approximate_size('000', '009') < size
+    assert db.approximate_size() > size
+    sub.compact()
+    db.compact(prefix='sized')
+    db.compact()
+    assert sub['049'] == 'x' * 100
+
+
+def test_bulk_load_profile(leveldir):
+    db = LevelDB(leveldir, 'leveldb.LevelDB', create_if_missing=True,
+                 profile='bulk_load')
+    db.put_many(('%03d' % i, 'x') for i in range(10))
+    db.finish_load()
+    assert db['009'] == 'x'
@@ -2,6 +2,9 @@
 # tests/test_serializer.py
 #
 
+import math
+import threading
+
 import pytest
 
 import levelpy.serializer as serializer
@@ -69,7 +72,9 @@ def test_msgpack_encoding(input, output):
 
 
 @pytest.mark.parametrize("format, enc, dec", [
+    ('stdjson', serializer.json_encode, serializer.json_decode),
     ('json', serializer.json_encode, serializer.json_decode),
+    ('fastjson', *serializer.fastest_json()),
     ('utf-8', serializer.utf8_encode, serializer.utf8_decode),
 ])
 def test_Serializer_constructor(format, enc, dec):
@@ -91,3 +96,105 @@ def test_MsgPackSerializer_constructor():
     ser = serializer.MsgPackSerializer()
     assert ser.pack == serializer.MsgPackSerializer.encode
     assert ser.unpack == serializer.MsgPackSerializer.decode
+
+
+@pytest.mark.parametrize("input", [
+    {'a': [1, 2.5, None]},
+    [],
+])
+def test_fastest_json(input):
+    enc, dec = serializer.fastest_json()
+    assert dec(enc(input)) == input
+    assert dec(bytearray(enc(input))) == input
+
+
+@pytest.mark.parametrize("input", [
+    2 ** 70,
+    {'a': [-2 ** 65, 1.5]},
+])
+def test_fastest_json_falls_back_to_json(input):
+    enc, dec = serializer.fastest_json()
+    assert dec(enc(input)) == input
+    assert dec(serializer.json_encode(input)) == input
+
+
+def test_fastest_json_reads_json_nan():
+    enc, dec = serializer.fastest_json()
+    value = dec(serializer.json_encode([float('nan'), float('inf')]))
+    assert math.isnan(value[0]) and value[1] == float('inf')
+
+
+def test_MsgPackSerializer_reuses_packer():
+    pytest.importorskip("msgpack")
+    serializer.MsgPackSerializer.encode(1)
+    packer = serializer.MsgPackSerializer._local.packer
+    serializer.MsgPackSerializer.encode('a')
+    assert serializer.MsgPackSerializer._local.packer is packer
+
+    # each thread has its own
+    packers = []
+
+    def encode():
+        serializer.MsgPackSerializer.encode(2)
+        packers.append(serializer.MsgPackSerializer._local.packer)
+
+    thread = threading.Thread(target=encode)
+    thread.start()
+    thread.join()
+    assert packers and packers[0] is not packer
+
+
+def test_Serializer_register():
+    trans = (str.encode, bytes.decode)
+    serializer.Serializer.register('mock-register', *trans)
+    assert serializer.Serializer.transform_dict['mock-register'] == trans
+    assert serializer.Serializer.encode['mock-register'] is str.encode
+    assert serializer.Serializer.decode['mock-register'] is bytes.decode
+
+
+def test_Serializer_register_non_callable():
+    with pytest.raises(TypeError):
+        serializer.Serializer.register('bad', 1, 2)
+
+
+@pytest.mark.parametrize("format", ['json', 'stdjson', 'fastjson', 'msgpack',
+                                    'utf8'])
+def test_Serializer_many(format):
+    if format == 'msgpack':
+        pytest.importorskip("msgpack")
+    objs = ['a', 'bc', ''] if format == 'utf8' else [{'a': 1}, [1, 2], 'x']
+    ser = serializer.Serializer(format)
+    encoded = ser.pack_many(objs)
+    assert encoded == [ser.pack(o) for o in objs]
+    assert ser.unpack_many(encoded) == objs
+    assert ser.unpack_many([]) == []
+
+
+@pytest.mark.parametrize("format, values", [
+    ('json', [b'1', b'2,3', b'4']),
+    ('fastjson', [b'1', b'{"a": 1},{"b": 2}']),
+    ('msgpack', [b'\x01', b'\x02\x03', b'\x04']),
+    ('msgpack', [b'\x01', b'', b'\x04']),
+])
+def test_Serializer_many_checks_count(format, values):
+    if format == 'msgpack':
+        pytest.importorskip("msgpack")
+    with pytest.raises(ValueError):
+        serializer.Serializer(format).unpack_many(values)
+
+
+def test_each():
+    assert serializer.each(str.upper)(['a', 'b']) == ['A', 'B']
+
+
+def test_Serializer_register_many():
+    def decode_many(byte_strs):
+        return [b.decode() + '!' for b in byte_strs]
+    serializer.Serializer.register('mock-many', str.encode, bytes.decode,
+                                   decode_many=decode_many)
+    assert serializer.Serializer.decode_many['mock-many'] is decode_many
+    assert serializer.Serializer.encode_many['mock-many'](['a']) == [b'a']
+
+    # re-registering without batch functions falls back to per-item calls
+    serializer.Serializer.register('mock-many', str.encode, bytes.decode)
+    assert serializer.Serializer.decode_many['mock-many']([b'a']) == ['a']
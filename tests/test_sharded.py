@@ -0,0 +1,65 @@
+#
+# tests/test_sharded.py
+#
+
+import pytest
+from levelpy.sharded import ShardedLevelDB, key_component
+
+
+@pytest.fixture
+def sharded(tmpdir):
+    pytest.importorskip('leveldb')
+    paths = [str(tmpdir.join('shard%d' % i)) for i in range(3)]
+    db = ShardedLevelDB(paths, value_encoding='json', create_if_missing=True)
+    yield db
+    db.close()
+
+
+def test_get_put_delete(sharded):
+    sharded['a'] = {'x': 1}
+    assert sharded['a'] == {'x': 1}
+    del sharded['a']
+    with pytest.raises(KeyError):
+        sharded['a']
+
+
+def test_keys_are_spread_and_merged_in_order(sharded):
+    users = sharded.sublevel('users')
+    users.put_many(('%02d' % i, i) for i in range(30))
+    assert all(any(True for _ in shard.RangeIter(include_value=False))
+               for shard in sharded.shards)
+    assert [v for v in users.values()] == list(range(30))
+    assert [v for v in reversed(users.values())][0] == 29
+    assert users.get_many(['03', '17', '29']) == [3, 17, 29]
+    with pytest.raises(KeyError):
+        users.get_many(['03', 'nope'])
+
+
+def test_batch_is_split_per_shard(sharded):
+    with sharded.write_batch() as batch:
+        for i in range(10):
+            batch['k%d' % i] = i
+    assert sorted(sharded['k%d' % i] for i in range(10)) == list(range(10))
+
+
+def test_key_component_routes_together(tmpdir):
+    pytest.importorskip('leveldb')
+    paths = [str(tmpdir.join('shard%d' % i)) for i in range(4)]
+    db = ShardedLevelDB(paths, shard_key_fn=key_component(1),
+                        create_if_missing=True)
+    for i in range(20):
+        db[b'tenants!acme!%d' % i] = 'x'
+    index = db._db.shard_index(b'tenants!acme!0')
+    assert sum(1 for _ in db.shards[index].RangeIter()) == 20
+    assert key_component(1)(b'plain') == b'plain'
+    db.close()
+
+
+def test_snapshot_and_compact(sharded):
+    sharded.put_many(('k%d' % i, i) for i in range(10))
+    snapshot = sharded.create_snapshot()
+    sharded['k0'] = 'changed'
+    assert snapshot.Get(b'k0') == b'0'
+    assert len(list(snapshot.RangeIter())) == 10
+    sharded.compact()
+    assert sharded.storage_stats()['levels'] is not None
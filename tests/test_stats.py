@@ -0,0 +1,67 @@
+#
+# tests/test_stats.py
+#
+
+from fixtures import leveldir, db                                        # noqa
+from levelpy import stats
+
+STATS = """
+                               Compactions
+Level  Files Size(MB) Time(sec) Read(MB) Write(MB)
+--------------------------------------------------
+  0        2        4         1        0         8
+  1        5       10         2       12        12
+  3        0        0         0        0         0
+"""
+
+
+def test_parse_stats():
+    parsed = stats.parse_stats(STATS)
+    assert [l['level'] for l in parsed['levels']] == [0, 1, 3]
+    assert parsed['levels'][1] == {'level': 1, 'files': 5, 'size_mb': 10,
+                                   'time_sec': 2, 'read_mb': 12,
+                                   'write_mb': 12}
+    assert parsed['files'] == 7
+    assert parsed['size_mb'] == 14
+    assert parsed['write_amplification'] == 2.5
+    assert parsed['read_amplification'] == 3
+
+
+def test_parse_empty_stats():
+    parsed = stats.parse_stats('')
+    assert parsed['levels'] == []
+    assert parsed['write_amplification'] == 0
+
+
+def test_prometheus_text():
+    text = stats.prometheus_text(stats.parse_stats(STATS),
+                                 {b'users': 2048, b'a"b': 1},
+                                 labels={'db': 'main'})
+    assert '# TYPE levelpy_level_files gauge' in text
+    assert 'levelpy_level_files{db="main",level="1"} 5.0' in text
+    assert 'levelpy_sublevel_size_bytes{db="main",sublevel="users"} 2048.0' \
+        in text
+    assert 'sublevel="a\\"b"' in text
+
+
+def test_storage_stats(db):
+    db.put_many(('%05d' % i, 'x' * 100) for i in range(5000))
+    db.compact()
+    parsed = db.storage_stats()
+    assert parsed['files'] >= 1
+    assert 'levelpy_level_files' in db.prometheus_metrics(sizes=False)
+
+
+def test_sublevel_sizes(db):
+    db.sublevel('big').put_many(('%04d' % i, 'x' * 100) for i in range(100))
+    db.sublevel('small')['a'] = 'x'
+    db['root'] = 'y'
+    assert list(stats.iter_prefixes(db)) == [b'big', b'small']
+    sizes = db.sublevel_sizes()
+    assert sizes[b'big'] > sizes[b'small'] > 0
+    assert db.top_sublevels(1) == [(b'big', sizes[b'big'])]
+
+    db.sublevel('huge').put_many(('%04d' % i, 'x' * 1000) for i in range(99))
+    assert db.top_sublevels(1)[0][0] == b'big'
+    assert db.top_sublevels(1, max_age=0)[0][0] == b'huge'
+    assert 'sublevel="huge"' in db.prometheus_metrics()
@@ -210,3 +210,37 @@ def test_custom_encoder(db, key, delim, k_d):
     db.Get.return_value = b'f42'
     twenty = sub['bar']
     assert twenty == 42.0 and isinstance(twenty, float)
+
+
+def test_sublevel_has_no_dict(sub):
+    assert not hasattr(sub, '__dict__')
+
+
+def test_accessor_cache(db):
+    from levelpy.accessor_cache import AccessorCache
+    root = Sublevel(db, b'root', b'!')
+    root._accessor_cache = AccessorCache(maxsize=2)
+    users = root.sublevel('users')
+    assert root.sublevel('users') is users
+    assert users.sublevel('acme') is root.sublevel('users').sublevel('acme')
+    assert root.sublevel('users', value_encoding='json') is not users
+    assert root.view('users') is root.view('users')
+    assert root.view('users') is not users
+    assert Sublevel(db, b'root', b'!').sublevel('users') is not users
+
+
+def test_accessor_cache_is_bounded(db):
+    import gc
+    from levelpy.accessor_cache import AccessorCache
+    cache = AccessorCache(maxsize=2)
+    root = Sublevel(db, b'root', b'!')
+    root._accessor_cache = cache
+    for i in range(10):
+        root.sublevel('tenant%d' % i)
+    gc.collect()
+    assert len(cache) == 2
+    kept = root.sublevel('x')
+    for i in range(10):
+        root.sublevel('tenant%d' % i)
+    gc.collect()
+    assert root.sublevel('x') is kept
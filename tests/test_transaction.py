@@ -0,0 +1,87 @@
+#
+# tests/test_transaction.py
+#
+
+import pytest
+import threading
+from fixtures import leveldir, db                                        # noqa
+from levelpy.transaction import TransactionConflict, LockStripes
+
+
+@pytest.fixture
+def counters(db):
+    sub = db.sublevel('counters', value_encoding='json')
+    sub['a'] = 0
+    return sub
+
+
+def test_commit(counters):
+    with counters.transaction() as txn:
+        txn['a'] = txn['a'] + 1
+        assert 'b' not in txn
+        txn['b'] = 1
+        assert 'b' in txn
+    assert counters['a'] == 1 and counters['b'] == 1
+
+
+def test_conflict(counters):
+    with pytest.raises(TransactionConflict):
+        with counters.transaction() as txn:
+            txn['a'] = txn['a'] + 1
+            counters['a'] = 10
+    assert counters['a'] == 10
+
+
+def test_conflict_on_missing_key(counters):
+    with pytest.raises(TransactionConflict):
+        with counters.transaction() as txn:
+            assert 'new' not in txn
+            txn['new'] = 1
+            counters['new'] = 2
+    assert counters['new'] == 2
+
+
+def test_scanned_values_are_validated(counters):
+    with pytest.raises(TransactionConflict):
+        with counters.transaction() as txn:
+            txn['total'] = sum(txn.values())
+            counters['a'] = 5
+
+
+def test_retry_on_conflict(counters):
+    attempts = []
+
+    def increment(txn):
+        attempts.append(1)
+        value = txn['a']
+        if len(attempts) == 1:
+            counters['a'] = 100
+        txn['a'] = value + 1
+        return value + 1
+
+    assert counters.transaction(increment) == 101
+    assert len(attempts) == 2
+
+
+def test_concurrent_increments(counters):
+    def increment(txn):
+        txn['a'] = txn['a'] + 1
+
+    def work():
+        for _ in range(25):
+            counters.transaction(increment, retries=1000)
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counters['a'] == 200
+
+
+def test_lock_stripes_release():
+    stripes = LockStripes(4)
+    with pytest.raises(ValueError):
+        with stripes.hold([b'a', b'b']):
+            raise ValueError
+    assert not any(lock.locked() for lock in stripes.locks)
@@ -0,0 +1,240 @@
+#
+# tests/test_ttl.py
+#
+
+import pytest
+import asyncio
+import threading
+from fixtures import leveldir, db                                        # noqa
+
+
+class Clock:
+    now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return Clock()
+
+
+@pytest.fixture
+def sessions(db, clock):
+    sub = db.ttl_sublevel('sessions', default_ttl=10, value_encoding='json')
+    sub.clock = clock
+    return sub
+
+
+def test_expired_keys_read_as_missing(sessions, clock):
+    sessions['a'] = {'user': 1}
+    sessions.put('b', {'user': 2}, ttl=100)
+    assert sessions['a'] == {'user': 1}
+    assert sessions.expires_at('a') == 1010
+
+    clock.now += 20
+    with pytest.raises(KeyError):
+        sessions['a']
+    assert 'a' not in sessions
+    assert [k for k in sessions.keys()] == [b'sessions!b']
+    assert [v for v in sessions.values()] == [{'user': 2}]
+
+
+def test_no_ttl_never_expires(db, clock):
+    sub = db.ttl_sublevel('forever', value_encoding='json')
+    sub.clock = clock
+    sub['a'] = 1
+    clock.now += 1e9
+    assert sub['a'] == 1
+    assert sub.expires_at('a') is None
+    assert sub.sweep() == 0
+
+
+def test_sweep_deletes_expired(db, sessions, clock):
+    sessions.put_many((str(i), i) for i in range(25))
+    sessions.put('keep', 1, ttl=1000)
+    clock.now += 20
+    assert sessions.sweep(chunk_size=10) == 25
+    assert sessions.sweep() == 0
+    raw = [k for k in db.RangeIter(include_value=False)]
+    assert raw[0] == b'sessions!keep'
+    assert len(raw) == 2
+
+
+def test_overwrite_moves_expiry(sessions, clock):
+    sessions['a'] = 1
+    clock.now += 5
+    sessions['a'] = 2
+    clock.now += 6
+    assert sessions.sweep() == 0
+    assert sessions['a'] == 2
+    clock.now += 5
+    assert sessions.sweep() == 1
+
+
+def test_delete_removes_expiry_entry(db, sessions):
+    sessions['a'] = 1
+    del sessions['a']
+    assert [k for k in db.RangeIter(include_value=False)] == []
+
+
+def test_delete_range_removes_expiry_entries(db, sessions, clock):
+    sessions['a'] = 1
+    sessions.put('b', 2, ttl=100)
+    sessions['c'] = 3
+    clock.now += 20
+    assert sessions.delete_range('a', 'c') == 2
+    assert [k for k in db.RangeIter(include_value=False)] == [
+        b'sessions!c', sessions.expiry_key(1010000, b'sessions!c')]
+    assert sessions.clear() == 1
+    assert [k for k in db.RangeIter(include_value=False)] == []
+
+
+def test_sweep_does_not_delete_overwritten_value(sessions, clock):
+    sessions['a'] = 1
+    clock.now += 20
+    raw_get = sessions._raw_get
+    writer = threading.Thread(target=sessions.__setitem__, args=('a', 2))
+
+    def overwriting_get(key):
+        # the overwrite waits for the sweep of the value read
+        value = raw_get(key)
+        if writer.ident is None:
+            writer.start()
+            writer.join(0.1)
+        return value
+
+    sessions._raw_get = overwriting_get
+    sessions.sweep()
+    writer.join()
+    assert sessions['a'] == 2
+
+
+def test_ttl_in_write_batch(sessions, clock):
+    with sessions.write_batch() as batch:
+        batch['a'] = 1
+        batch.put('b', 2, ttl=100)
+    clock.now += 20
+    assert 'a' not in sessions
+    assert sessions['b'] == 2
+    assert sessions.sweep() == 1
+
+
+def test_write_batch_reads_its_writes(sessions, clock):
+    sessions['a'] = 1
+    with sessions.write_batch() as batch:
+        batch.put('b', 2, ttl=1)
+        batch['a'] = batch['a'] + 1
+        assert [v for v in batch.values()] == [2, 2]
+        clock.now += 5
+        assert [v for v in batch.values()] == [2]
+    assert sessions['a'] == 2
+
+
+def test_nested_write_batch(sessions, clock):
+    with sessions.write_batch() as outer:
+        with outer.write_batch() as inner:
+            inner.put('a', 1, ttl=5)
+        assert outer['a'] == 1
+    clock.now += 10
+    assert 'a' not in sessions
+    assert sessions.sweep() == 1
+
+
+def test_sweep_updates_aggregates(sessions, clock):
+    count = sessions.add_aggregate('count')
+    sessions['a'] = sessions['b'] = 1
+    clock.now += 20
+    sessions['b'] = 1
+    assert count.value() == 2
+    sessions.sweep()
+    assert count.value() == 1
+
+
+def test_sweeper_thread(sessions, clock):
+    sessions['a'] = 1
+    clock.now += 20
+    sweeper = sessions.start_sweeper(interval=0.01)
+    sweeper.stop(timeout=5)
+    assert sweeper.deleted == 1
+
+
+def test_sweep_forever_task(sessions, clock):
+    sessions['a'] = 1
+    clock.now += 20
+
+    async def run():
+        task = asyncio.ensure_future(sessions.sweep_forever(interval=0.01))
+        await asyncio.sleep(0.1)
+        task.cancel()
+
+    asyncio.new_event_loop().run_until_complete(run())
+    assert sessions.sweep() == 0
+    with pytest.raises(KeyError):
+        sessions._raw_get(sessions.key_transform('a'))
+
+
+def test_index_and_aggregate_of_ttl_sublevel(sessions, clock):
+    index = sessions.add_index('user', lambda session: session['user'])
+    count = sessions.add_aggregate('count', group=lambda s: s['user'])
+    sessions['a'] = {'user': 'x'}
+    sessions['b'] = {'user': 'x'}
+    sessions.put('c', {'user': 'y'}, ttl=100)
+    count.flush()
+    count.reset()
+    assert index['x'] == [{'user': 'x'}, {'user': 'x'}]
+    assert count.groups() == {b'x': 2, b'y': 1}
+    clock.now += 20
+    assert sessions.sweep() == 2
+    assert index.keys('x') == []
+    assert index['y'] == [{'user': 'y'}]
+    assert count.value('x') == 0
+    count.rebuild()
+    assert count.groups() == {b'y': 1}
+
+
+def test_transaction(sessions, clock):
+    from levelpy.transaction import TransactionConflict
+    sessions['a'] = 1
+    with sessions.transaction() as txn:
+        txn.put('b', txn['a'] + 1, ttl=100)
+    assert sessions['b'] == 2
+    assert sessions.expires_at('b') == 1100
+
+    with pytest.raises(TransactionConflict):
+        with sessions.transaction() as txn:
+            txn['c'] = txn['a']
+            sessions['a'] = 5
+    assert 'c' not in sessions
+
+    def increment(txn):
+        txn['a'] = txn['a'] + 1
+    sessions.transaction(increment)
+    assert sessions['a'] == 6
+    clock.now += 20
+    assert sessions.sweep() == 1
+    assert [k for k in sessions.keys()] == [b'sessions!b']
+
+
+def test_write_behind(db, sessions, clock):
+    count = sessions.add_aggregate('count')
+    with sessions.write_behind(interval=None, flush_at_exit=False) as buf:
+        buf['a'] = 1
+        buf['a'] = 2
+        buf.put('b', 3, ttl=100)
+        assert buf['a'] == 2
+        assert 'a' not in sessions
+        assert [v for v in buf.values()] == [2, 3]
+        assert buf.flush() == 4
+        assert sessions['a'] == 2
+        assert count.value() == 2
+        buf['a'] = 4
+        del buf['b']
+    assert sessions['a'] == 4
+    assert 'b' not in sessions
+    assert count.value() == 1
+    clock.now += 20
+    assert sessions.sweep() == 1
+    assert [k for k in db.RangeIter(include_value=False)
+            if not k.startswith(b'sessions!\xffaggregate')] == []
@@ -57,7 +57,6 @@ def test_constructor_with_premade_backend(backend):
     assert lvl.Put == backend.put
     assert lvl.Get == backend.get
     assert lvl.Delete == backend.delete
-    assert lvl.Write is None
 
     # this needs to be figured out
     assert lvl.path is None
@@ -66,3 +65,19 @@ def test_constructor_with_premade_backend(backend):
 
 def test_backend_package(backend_package):
     assert backend_package is not None
+
+
+def test_bulk_writes(leveldir, backend_class_str):
+    import io
+    from levelpy.io.dumper import dump, restore
+    lvl = LevelDB(leveldir, backend_class_str, create_if_missing=True)
+    lvl.put_many((b'%d' % i, b'v') for i in range(10))
+    assert [k for k, v in lvl.RangeIter(key_from=b'8')] == [b'8', b'9']
+    assert lvl.delete_range(b'5') == 5
+    dumped = io.BytesIO()
+    assert dump(lvl, dumped) == 5
+    lvl.delete_range()
+    dumped.seek(0)
+    assert restore(lvl, dumped, sync=True) == 5
+    assert lvl.Get(b'4') == b'v' and lvl.Get(b'5') is None
+    assert lvl.create_snapshot().Get(b'0') == b'v'
@@ -0,0 +1,108 @@
+#
+# tests/test_write_behind.py
+#
+
+import time
+import pytest
+from unittest import mock
+from fixtures import leveldir                                            # noqa
+from levelpy.leveldb import LevelDB
+
+
+@pytest.fixture
+def sub(leveldir):
+    pytest.importorskip('leveldb')
+    db = LevelDB(leveldir, 'leveldb.LevelDB', create_if_missing=True)
+    return db.sublevel('hits', value_encoding='json')
+
+
+def test_reads_see_buffered_writes(sub):
+    sub['old'] = 1
+    with sub.write_behind(interval=None, flush_at_exit=False) as buffered:
+        for i in range(100):
+            buffered['a'] = i
+        del buffered['old']
+        buffered.put_many({'b': 1, 'c': 2})
+        assert buffered['a'] == 99
+        assert 'old' not in buffered
+        assert [v for v in buffered.values()] == [99, 1, 2]
+        assert len(buffered) == 4
+        assert sub['old'] == 1 and 'a' not in sub
+    assert [v for v in sub.values()] == [99, 1, 2]
+
+
+def test_one_batch_per_flush(sub):
+    count = sub.add_aggregate('count')
+    buffered = sub.write_behind(interval=None, flush_at_exit=False)
+    with mock.patch.object(type(sub), '_write_batch', autospec=True,
+                           side_effect=type(sub)._write_batch) as write:
+        for i in range(50):
+            buffered['k%d' % (i % 5)] = i
+        assert buffered.flush() == 5
+        assert buffered.flush() == 0
+    assert write.call_count == 1
+    assert count.value() == 5
+    assert sub['k4'] == 49
+    buffered.close()
+
+
+def test_size_threshold(sub):
+    buffered = sub.write_behind(interval=None, max_dirty=3,
+                                flush_at_exit=False)
+    buffered['a'] = 1
+    buffered['b'] = 2
+    assert 'a' not in sub
+    buffered['c'] = 3
+    assert sub['a'] == 1 and len(buffered) == 0
+
+
+def test_periodic_flush(sub):
+    buffered = sub.write_behind(interval=0.01, flush_at_exit=False)
+    buffered['a'] = 1
+    for _ in range(100):
+        if 'a' in sub:
+            break
+        time.sleep(0.01)
+    assert sub['a'] == 1
+    buffered.close()
+
+
+def test_failed_flush_keeps_keys_dirty(sub):
+    buffered = sub.write_behind(interval=None, flush_at_exit=False)
+    buffered['a'] = 1
+    with mock.patch.object(type(sub), '_write_batch',
+                           side_effect=IOError('disk full')):
+        with pytest.raises(IOError):
+            buffered.flush()
+    assert buffered['a'] == 1 and len(buffered) == 1
+    buffered.close()
+    assert sub['a'] == 1
+
+
+def test_nested_batch(sub):
+    buffered = sub.write_behind(interval=None, flush_at_exit=False)
+    with buffered.write_batch() as batch:
+        batch['a'] = 1
+    assert buffered['a'] == 1 and 'a' not in sub
+    buffered.close()
+    assert sub['a'] == 1
+
+
+def test_dirty_buffers_kept_alive_until_flushed(sub):
+    import gc
+    import weakref
+    from levelpy import write_behind
+    buffered = sub.write_behind(interval=None)
+    buffered['a'] = 1
+    ref = weakref.ref(buffered)
+    del buffered
+    gc.collect()
+    assert ref() is not None
+    write_behind._flush_all()
+    assert sub['a'] == 1
+    gc.collect()
+    assert ref() is None
+    closed = sub.write_behind(interval=None)
+    closed['b'] = 2
+    closed.close()
+    assert closed not in write_behind._dirty_buffers